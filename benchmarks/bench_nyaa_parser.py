@@ -0,0 +1,104 @@
+"""Benchmark for the Nyaa HTML listing parser.
+
+Parses the saved result pages in benchmarks/fixtures/nyaa (a full 75-row page,
+a short last page and an empty page) plus a large multi-page set built from
+them, and reports rows per second and allocations for the legacy per-row XPath
+parser and parse_nyaa_html.
+
+    python benchmarks/bench_nyaa_parser.py [--pages 40]
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from lxml import html
+
+from services.nyaa_html import (
+    TELEGRAM_FILE_LIMIT_BYTES, HtmlTorrent, _extract_resolution, _parse_size_to_bytes,
+    is_likely_bundle, parse_nyaa_html,
+)
+
+FIXTURES = ROOT / "benchmarks" / "fixtures" / "nyaa"
+
+
+def legacy_parse(text: str) -> list[HtmlTorrent]:
+    # The parser as it was before the single-pass extractor, kept for comparison
+    doc = html.fromstring(text)
+    results = []
+    for tr in doc.xpath("//table[contains(@class,'torrent-list')]//tbody//tr"):
+        title_links = tr.xpath(".//td[2]//a[not(contains(@class,'comments'))]")
+        if not title_links: continue
+        title_text = title_links[-1].text_content().strip()
+        magnet_link = tr.xpath(".//a[starts-with(@href,'magnet:')]/@href")
+        if not magnet_link: continue
+        size_str = tr.xpath(".//td[4]/text()")[0].strip() if tr.xpath(".//td[4]/text()") else "Unknown"
+        seeders_text = tr.xpath(".//td[6]/text()")
+        seeders = int(seeders_text[0].strip()) if seeders_text else 0
+        size_bytes = _parse_size_to_bytes(size_str)
+        is_too_large = (size_bytes is None) or (size_bytes > TELEGRAM_FILE_LIMIT_BYTES)
+        if is_too_large and not is_likely_bundle(title_text):
+            continue
+        results.append(HtmlTorrent(
+            title=title_text, magnet=magnet_link[0], size_str=size_str,
+            size_bytes=size_bytes, resolution=_extract_resolution(title_text),
+            is_too_large=is_too_large, seeders=seeders
+        ))
+    return results
+
+
+def run(label: str, parser, pages: list[str], rounds: int) -> None:
+    rows = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for page in pages:
+            rows += len(parser(page))
+    elapsed = time.perf_counter() - start
+
+    # Keep the parsed rows alive so the snapshot shows what a result set costs
+    tracemalloc.start()
+    kept = [parser(page) for page in pages]
+    retained, peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+    del kept
+
+    print(
+        f"  {label:<8} {rows / elapsed:>10,.0f} rows/s   peak {peak / 1024:>8,.0f} KiB"
+        f"   retained {retained / 1024:>8,.0f} KiB in {blocks:>7,} blocks"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=40, help="pages in the large multi-page set")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    full = (FIXTURES / "search_page_full.html").read_text(encoding="utf-8")
+    last = (FIXTURES / "search_page_last.html").read_text(encoding="utf-8")
+    empty = (FIXTURES / "search_page_empty.html").read_text(encoding="utf-8")
+
+    for legacy, current in zip(legacy_parse(full), parse_nyaa_html(full).torrents):
+        assert legacy == current, (legacy, current)
+
+    sets = {
+        "75-row page": [full],
+        "short + empty pages": [last, empty],
+        f"{args.pages}-page set": [full] * (args.pages - 1) + [last],
+    }
+    for name, pages in sets.items():
+        rounds = max(1, args.rounds // len(pages))
+        print(f"{name}:")
+        run("legacy", legacy_parse, pages, rounds)
+        run("current", lambda page: parse_nyaa_html(page).torrents, pages, rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Corpus check and throughput benchmark for utils.release_title.
+
+Every line of benchmarks/fixtures/release_titles.tsv is a Nyaa release name
+followed by the fields the tokenizer must extract; any mismatch is reported
+and makes the script exit non-zero. Throughput is then measured with a cold
+cache, a warm cache, and against the separate regex helpers the handlers
+used before.
+
+    python benchmarks/bench_release_title.py
+"""
+from __future__ import annotations
+
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from tests.release_titles import load_corpus, render
+from utils.release_title import parse_release_title
+
+
+def check(rows: list[tuple[str, dict[str, str]]]) -> int:
+    failures = 0
+    for title, expected in rows:
+        info = parse_release_title(title)
+        diff = {
+            field: (want, render(getattr(info, field)))
+            for field, want in expected.items() if render(getattr(info, field)) != want
+        }
+        if diff:
+            failures += 1
+            print(f"MISMATCH {title}\n  " + ", ".join(f"{k}: want {w!r} got {g!r}" for k, (w, g) in diff.items()))
+    print(f"corpus: {len(rows) - failures}/{len(rows)} titles parsed as expected")
+    return failures
+
+
+def legacy_features(title: str) -> tuple:
+    # The separate passes the handlers and parser used to run on each title
+    lower = title.lower()
+    batch = re.search(r'(\d{1,4})\s*[-~]\s*\d{1,4}', lower)
+    ep = int(batch.group(1)) if batch else None
+    if ep is None:
+        m = re.search(r'(?i)(?:e|ep|episode\s?|\s-\s)(\d{1,4})', lower)
+        ep = int(m.group(1)) if m else 9999
+    normalized = re.sub(r'\[[^\]]+\]', '', lower)
+    normalized = re.sub(r'\(.*?\)|v\d', '', normalized)
+    normalized = re.sub(r'\.\w+$', '', normalized).strip()
+    group = re.search(r'\[([^\]]+)\]', title)
+    res = re.search(r"(?i)(2160p|1440p|1080p|720p|480p)", title)
+    bundle = any(k in lower for k in ["batch", "season", "complete", "s0", "episodes"]) or bool(
+        re.search(r'\d{1,4}\s*[-~]\s*\d{1,4}', lower))
+    dub = any(k in lower for k in ["dub", "dubbed", "dual audio"])
+    return (normalized, ep), group, res, bundle, dub
+
+
+def throughput(label: str, fn, titles: list[str], rounds: int, before=None) -> None:
+    count = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        if before:
+            before()
+        for title in titles:
+            fn(title)
+            count += 1
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<22} {count / elapsed:>12,.0f} titles/s")
+
+
+def main() -> None:
+    rows = load_corpus()
+    failures = check(rows)
+
+    # Make every title unique per round so the cold run never hits the cache
+    titles = [title.replace("]", f" {i}]", 1) for i in range(50) for title, _ in rows]
+    print(f"throughput over {len(titles)} titles:")
+    throughput("legacy regex helpers", legacy_features, titles, rounds=5)
+    throughput("tokenizer, cold cache", parse_release_title, titles, rounds=5, before=parse_release_title.cache_clear)
+    throughput("tokenizer, warm cache", parse_release_title, titles[:4000], rounds=20)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Micro-benchmark: SeaDex "did you mean" lookup, old per-call path vs SeadexIndex.
+
+Run from the repository root:
+
+    python benchmarks/bench_seadex.py
+"""
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import pandas as pd
+from fuzzywuzzy import process
+
+from services.seadex import SEADEX_INDEX_PATH, SeadexIndex
+
+QUERIES = [
+    "shingeki no kyojin", "frieren", "kaguya sama love is war", "toaru kagaku no railgun",
+    "steins gate", "made in abys", "violet evergarden", "one punch man", "mob psycho",
+    "hunter x hunter 2011", "monogatari", "bocchi the rock", "spy family", "86 eighty six",
+]
+
+
+def legacy_lookup(query: str) -> tuple[str, int]:
+    # The previous handler path: re-read the CSV and score every title in Python per call
+    df = pd.read_csv(ROOT / SEADEX_INDEX_PATH, header=1)
+    df.set_index(df.columns[0], inplace=True)
+    all_titles = pd.concat([df["Title"], df["Alternate Title"]]).dropna().tolist()
+    return process.extractOne(query, all_titles)
+
+
+def bench(label: str, fn, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query in QUERIES:
+            fn(query)
+    elapsed = time.perf_counter() - start
+    per_call = elapsed / (rounds * len(QUERIES)) * 1000
+    print(f"{label:<28} {per_call:8.3f} ms/lookup")
+    return per_call
+
+
+def main() -> None:
+    start = time.perf_counter()
+    index = SeadexIndex.from_csv(str(ROOT / SEADEX_INDEX_PATH))
+    print(f"index build: {(time.perf_counter() - start) * 1000:.1f} ms, {len(index)} choices")
+
+    legacy = bench("legacy (csv + extractOne)", legacy_lookup, rounds=1)
+    indexed = bench("SeadexIndex.suggest top-3", lambda q: index.suggest(q, 3), rounds=20)
+    print(f"speed-up: {legacy / indexed:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
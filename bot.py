@@ -4,10 +4,12 @@ import os
 import traceback
 import html
 import json
+from functools import partial
 from telegram import Update
 from telegram.constants import ParseMode
 from telegram.helpers import escape_markdown
 
+import asyncio
 import httpx
 from dotenv import load_dotenv
 from telegram.ext import (
@@ -22,12 +24,52 @@ from telegram.ext import (
 
 from handlers.search import on_message_search, on_title_selected
 from handlers.nyaa_search import on_nyaa_pick
-from handlers.download import on_download_request
+from handlers.download import DOWNLOADS_DIR, on_aria_event, on_download_request, on_file_pick
+from services import anilist, aria
+from services.aria_events import AriaEventListener
+from services.nyaa import search_cache_stats
+from services.seadex import get_index as load_seadex_index
+from config import DOWNLOAD_CACHE_BYTES, FILE_ID_CACHE_PATH, STATS_LOG_INTERVAL, TELEGRAM_API_URL, TELEGRAM_LOCAL_MODE
+from utils.disk_cache import DiskCache
+from utils.file_id_cache import FileIdCache
 
 async def _post_init(app: Application) -> None:
     app.bot_data["http_session"] = httpx.AsyncClient(headers={"User-Agent": "animedlbot/0.1"})
+    app.bot_data["file_id_cache"] = await asyncio.to_thread(FileIdCache, FILE_ID_CACHE_PATH)
+    # Build the SeaDex suggestion index up front instead of on the first AniList miss
+    await asyncio.to_thread(load_seadex_index)
+    # Indexing the download cache walks its whole tree
+    app.bot_data["disk_cache"] = await asyncio.to_thread(DiskCache, DOWNLOADS_DIR / "cache", DOWNLOAD_CACHE_BYTES)
+    aria.protected_dirs.add(app.bot_data["disk_cache"].root)
+    listener = AriaEventListener(partial(on_aria_event, app))
+    listener.start()
+    app.bot_data["aria_events"] = listener
+    if STATS_LOG_INTERVAL > 0 and app.job_queue:
+        app.job_queue.run_repeating(_log_stats_job, STATS_LOG_INTERVAL, first=STATS_LOG_INTERVAL, name="log_stats")
+
+def _log_stats(app: Application) -> None:
+    logger = logging.getLogger(__name__)
+    logger.info("Nyaa search cache stats: %s", search_cache_stats())
+    logger.info("AniList cache stats: search %s, details %s", anilist.search_cache.stats(), anilist.details_cache.stats())
+    uploads = app.bot_data.get("uploads")
+    if uploads is not None:
+        logger.info("Upload stats: %s", uploads.stats())
+    disk_cache = app.bot_data.get("disk_cache")
+    if disk_cache is not None:
+        logger.info("Download disk cache: %s", disk_cache.stats())
+
+async def _log_stats_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    _log_stats(context.application)
 
 async def _post_shutdown(app: Application) -> None:
+    _log_stats(app)
+    listener = app.bot_data.pop("aria_events", None)
+    if listener is not None:
+        await listener.stop()
+    await aria.client.close()
+    file_ids = app.bot_data.pop("file_id_cache", None)
+    if file_ids is not None:
+        file_ids.close()
     client = app.bot_data.pop("http_session", None)
     if client is not None:
         await client.aclose()
@@ -49,6 +91,11 @@ def build_application() -> Application:
     logger = logging.getLogger(__name__)
 
     builder = ApplicationBuilder().token(bot_token)
+    if TELEGRAM_API_URL:
+        # Self-hosted Bot API server; its file downloads live under /file/bot<token>
+        base_url = TELEGRAM_API_URL.rstrip("/")
+        builder = builder.base_url(base_url).base_file_url(base_url.removesuffix("/bot") + "/file/bot")
+        builder = builder.local_mode(TELEGRAM_LOCAL_MODE)
     try:
         from telegram.ext import AIORateLimiter
         builder = builder.rate_limiter(AIORateLimiter())
@@ -89,6 +136,7 @@ Just type an anime title to get started 📥
     app.add_handler(CallbackQueryHandler(on_title_selected, pattern=r"^t::"))
     app.add_handler(CallbackQueryHandler(on_nyaa_pick, pattern=r"^(xs::|rq::|qu::|ra::|rp::|rm::|info|cancel_dl)"))
     app.add_handler(CallbackQueryHandler(on_download_request, pattern=r"^dl::"))
+    app.add_handler(CallbackQueryHandler(on_file_pick, pattern=r"^fs::"))
 
     # --- NEW, MORE ROBUST ERROR HANDLER ---
     async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import os
+
+from dotenv import load_dotenv
+
+# Settings are read once at import; .env is loaded here so modules that read
+# them at import time see the same values as build_application().
+load_dotenv()
+
+# Nyaa search backend: "html" scrapes the listing page, "rss" reads the RSS feed
+NYAA_BACKEND = os.getenv("NYAA_BACKEND", "html").strip().lower()
+NYAA_BASE_URL = os.getenv("NYAA_BASE_URL", "https://nyaa.si/")
+
+# aria2c JSON-RPC endpoint; download notifications come over a WebSocket on the same port
+ARIA2_HOST = os.getenv("ARIA2_HOST", "http://127.0.0.1")
+ARIA2_PORT = int(os.getenv("ARIA2_PORT", "6800"))
+ARIA2_SECRET = os.getenv("ARIA2_SECRET", "")
+
+# SQLite store of Telegram file_ids of already uploaded torrent files
+FILE_ID_CACHE_PATH = os.getenv("FILE_ID_CACHE_PATH", "data/file_ids.sqlite3")
+
+# Download admission: aria2 jobs running at once, overall and per user, and
+# disk space to keep free in the downloads directory
+MAX_ACTIVE_DOWNLOADS = int(os.getenv("MAX_ACTIVE_DOWNLOADS", "3"))
+MAX_DOWNLOADS_PER_USER = int(os.getenv("MAX_DOWNLOADS_PER_USER", "1"))
+DOWNLOADS_MIN_FREE_BYTES = int(os.getenv("DOWNLOADS_MIN_FREE_BYTES", str(1024 ** 3)))
+
+# Telegram uploads in flight at once across all chats, and retries per file
+MAX_CONCURRENT_UPLOADS = int(os.getenv("MAX_CONCURRENT_UPLOADS", "2"))
+UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", "3"))
+
+# Telegram Bot API server: empty for api.telegram.org, or a self-hosted
+# telegram-bot-api such as "http://127.0.0.1:8081/bot". With TELEGRAM_LOCAL_MODE
+# (server started with --local on this machine's filesystem) uploads are sent as
+# file paths the server reads itself, and files up to 2000 MB are accepted.
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "").strip()
+TELEGRAM_LOCAL_MODE = os.getenv("TELEGRAM_LOCAL_MODE", "").strip().lower() in ("1", "true", "yes")
+TELEGRAM_FILE_LIMIT_BYTES = int(os.getenv("TELEGRAM_FILE_LIMIT_BYTES", str(2000 * 1024 ** 2)))
+# Files over the limit go up in parts of this size, kept under it to leave room for the multipart overhead
+SPLIT_PART_BYTES = int(os.getenv("SPLIT_PART_BYTES", str(1990 * 1024 ** 2)))
+
+# Finished torrent files kept in downloads/cache for repeat requests; 0 deletes them after upload
+DOWNLOAD_CACHE_BYTES = int(os.getenv("DOWNLOAD_CACHE_BYTES", str(10 * 1024 ** 3)))
+
+# Cache, upload and disk cache stats are logged this often (seconds) as well as at shutdown; 0 logs them only at shutdown
+STATS_LOG_INTERVAL = int(os.getenv("STATS_LOG_INTERVAL", "3600"))
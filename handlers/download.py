@@ -2,16 +2,81 @@ from __future__ import annotations
 import asyncio
 import os
 import logging
+import time
+import hashlib
 import html
+import shlex
 from pathlib import Path
-from telegram import Update
-from telegram.ext import ContextTypes
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup, InputFile, Update
+from telegram.error import BadRequest, TelegramError
+from telegram.ext import Application, ContextTypes
+from config import (
+    DOWNLOAD_CACHE_BYTES, DOWNLOADS_MIN_FREE_BYTES, MAX_ACTIVE_DOWNLOADS, MAX_CONCURRENT_UPLOADS, MAX_DOWNLOADS_PER_USER,
+    SPLIT_PART_BYTES, TELEGRAM_FILE_LIMIT_BYTES, UPLOAD_RETRIES,
+)
 from services import aria
-from services.nyaa_html import HtmlTorrent
+from services.aria_events import COMPLETE, ERROR
+from services.nyaa_html import is_likely_bundle
+from utils.admission import ACTIVE, QUEUED, AdmissionScheduler, Ticket
+from utils.disk_cache import DiskCache, DiskFile
+from utils.file_id_cache import CachedFile, FileIdCache, info_hash_from_magnet
+from utils.release_title import parse_release_title
+from utils.result_store import get_result_store
+from utils.split import hash_part, open_part, split_parts
+from utils.text import format_bytes
+from utils.uploads import FileSlice, UploadScheduler
 
 DOWNLOADS_DIR = Path("downloads")
 VIDEO_EXTENSIONS = {".mkv", ".mp4", ".avi", ".mov"}
-TELEGRAM_FILE_LIMIT_BYTES = 2147483648
+# Completion is pushed by aria2 notifications; this only paces the progress message edits
+PROGRESS_INTERVAL = 15
+PROGRESS_JOB_NAME = "aria_progress"
+# A magnet that has not produced its metadata by then is dropped, freeing its admission slot
+METADATA_TIMEOUT = 600
+# Files selected in aria2 at once; the next one is added as each is uploaded, so episodes arrive in order
+STREAM_WINDOW = 2
+# Pause between aria2 reporting a file complete and reading it, for its disk cache to flush
+FILE_SETTLE_DELAY = 2
+# Bundles: how long the file picker waits for the user, and files per picker page
+FILE_PICK_TIMEOUT = 600
+FILE_PICK_PAGE_SIZE = 10
+# Split uploads: the manifest is sent in messages of at most this many characters
+MANIFEST_CHUNK_CHARS = 3500
+
+def _active_downloads(application: Application) -> dict[str, dict]:
+    """GID -> job context of every download still being watched."""
+    return application.bot_data.setdefault("active_downloads", {})
+
+def _scheduler(application: Application) -> AdmissionScheduler:
+    scheduler = application.bot_data.get("admission")
+    if scheduler is None:
+        # The disk cache shares DOWNLOADS_DIR's disk and yields space to downloads
+        scheduler = application.bot_data["admission"] = AdmissionScheduler(
+            MAX_ACTIVE_DOWNLOADS, MAX_DOWNLOADS_PER_USER, DOWNLOADS_DIR, DOWNLOADS_MIN_FREE_BYTES,
+            reclaimable=_disk_cache(application).reclaimable,
+        )
+    return scheduler
+
+def _disk_cache(application: Application) -> DiskCache:
+    disk = application.bot_data.get("disk_cache")
+    if disk is None:
+        disk = application.bot_data["disk_cache"] = DiskCache(DOWNLOADS_DIR / "cache", DOWNLOAD_CACHE_BYTES)
+        aria.protected_dirs.add(disk.root)
+    return disk
+
+def _pickers(application: Application) -> dict[str, dict]:
+    """Picker token -> job context of every file picker waiting for its user."""
+    return application.bot_data.setdefault("file_pickers", {})
+
+def _uploads(application: Application) -> UploadScheduler:
+    uploads = application.bot_data.get("uploads")
+    if uploads is None:
+        uploads = application.bot_data["uploads"] = UploadScheduler(MAX_CONCURRENT_UPLOADS, UPLOAD_RETRIES)
+    return uploads
+
+def _disk_need(sizes: list[int]) -> int:
+    """Most bytes a download keeps on disk at once: files are deleted after upload, so its STREAM_WINDOW largest."""
+    return sum(sorted(sizes, reverse=True)[:STREAM_WINDOW])
 
 async def on_download_request(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     q = update.callback_query
@@ -21,122 +86,727 @@ async def on_download_request(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     prefix, token = q.data.split("::", 1)
     
-    it_dict = context.chat_data.get("nyaa_items", {}).get(token)
-    if not it_dict:
+    torrent = get_result_store(context.chat_data).get(int(token)) if token.isdigit() else None
+    if not torrent:
         await q.edit_message_text("❓ Download selection has expired. Please search again.")
         return
 
-    torrent = HtmlTorrent.model_validate(it_dict)
-    download = aria.add_magnet(torrent.magnet)
-    if not download:
-        await q.edit_message_text("❗️ Failed to send download to aria2c. Is the daemon running?")
+    chat_id = update.effective_chat.id
+    info_hash = info_hash_from_magnet(torrent.magnet)
+    file_ids: FileIdCache | None = context.application.bot_data.get("file_id_cache")
+    cached = await asyncio.to_thread(file_ids.lookup, info_hash) if file_ids and info_hash else None
+    delivered: set[str] = set()
+    if cached:
+        await q.edit_message_text(f"⚡ <b>Sending from cache:</b>\n<code>{html.escape(torrent.title)}</code>", parse_mode="HTML")
+        rejected, failed = await _send_cached(context.bot, chat_id, cached)
+        if not rejected and not failed:
+            await q.edit_message_text(f"✅ <b>Sent from cache:</b>\n<code>{html.escape(torrent.title)}</code>", parse_mode="HTML")
+            return
+        # Telegram no longer accepts some ids: forget them. Those and any that failed to send are fetched again
+        for file_key in rejected:
+            await asyncio.to_thread(file_ids.invalidate, info_hash, file_key)
+        delivered = {f.file_key for f in cached} - rejected - failed
+
+    # Files still on disk from an earlier request go straight to upload, without aria2
+    disk = _disk_cache(context.application)
+    on_disk = await disk.complete(info_hash) if info_hash else None
+    if on_disk:
+        # Until _send_from_disk is done with them, eviction must leave them alone
+        disk.pin(info_hash, [f.file_key for f in on_disk])
+        try:
+            status_msg = await q.edit_message_text(f"💾 <b>Sending from disk cache:</b>\n<code>{html.escape(torrent.title)}</code>", parse_mode="HTML")
+        except Exception:
+            disk.unpin(info_hash, [f.file_key for f in on_disk])
+            raise
+        job_context = {
+            "chat_id": chat_id,
+            "message_id": status_msg.message_id,
+            "torrent_name": torrent.title,
+            "info_hash": info_hash,
+            "delivered": delivered,
+            "likely_bundle": is_likely_bundle(torrent.title),
+        }
+        context.application.create_task(_send_from_disk(context.application, job_context, on_disk))
         return
-    
+
+    # Until the file list is known, assume the worst case: STREAM_WINDOW files of the Telegram limit
+    size = torrent.size_bytes or TELEGRAM_FILE_LIMIT_BYTES * STREAM_WINDOW
+    ticket = _scheduler(context.application).submit(update.effective_user.id, min(size, TELEGRAM_FILE_LIMIT_BYTES * STREAM_WINDOW))
+
     initial_text = f"✅ **Download queued:**\n<code>{html.escape(torrent.title)}</code>"
     status_msg = await q.edit_message_text(initial_text, parse_mode="HTML")
     
     job_context = {
-        "chat_id": update.effective_chat.id,
+        "chat_id": chat_id,
         "message_id": status_msg.message_id,
-        "gid": download.gid,
-        "torrent_name": torrent.title
+        "gid": None,
+        "torrent_name": torrent.title,
+        "info_hash": info_hash,
+        "delivered": delivered,
+        "likely_bundle": is_likely_bundle(torrent.title),
+        "ticket": ticket,
     }
-    
-    context.job_queue.run_once(_monitor_download, 5, data=job_context, name=f"monitor_{download.gid}")
+    if ticket.state == ACTIVE:
+        await _start_download(context.application, job_context, torrent.magnet)
+    else:
+        context.application.create_task(_wait_for_admission(context.application, job_context, torrent.magnet))
 
-async def _monitor_download(context: ContextTypes.DEFAULT_TYPE) -> None:
-    job_context = context.job.data
-    chat_id = job_context["chat_id"]
-    message_id = job_context["message_id"]
-    gid = job_context["gid"]
-    torrent_name = job_context["torrent_name"]
+async def _wait_for_admission(application: Application, job_context: dict, magnet: str) -> None:
+    if await _await_admission(application, job_context):
+        await _start_download(application, job_context, magnet)
 
-    download = aria.get_download(gid)
+async def _await_admission(application: Application, job_context: dict) -> bool:
+    """Keep a queued request's status message showing its place in line; True once it gets a slot."""
+    ticket: Ticket = job_context["ticket"]
+    shown = None
+    while ticket.state == QUEUED:
+        if ticket.position != shown:
+            shown = ticket.position
+            try:
+                await application.bot.edit_message_text(
+                    f"🕒 <b>Waiting for a download slot:</b>\n<code>{html.escape(job_context['torrent_name'])}</code>\n\n"
+                    f"└─ <b>Position in queue:</b> <code>{shown}</code>",
+                    chat_id=job_context["chat_id"], message_id=job_context["message_id"], parse_mode="HTML"
+                )
+            except BadRequest as e:
+                logging.warning(f"Error updating queue position for {job_context['torrent_name']}: {e}")
+        ticket.changed.clear()
+        await ticket.changed.wait()
+
+    if ticket.state == ACTIVE:
+        return True
+    await application.bot.edit_message_text(
+        f"❗️ <b>Not enough free disk space for:</b>\n<code>{html.escape(job_context['torrent_name'])}</code>",
+        chat_id=job_context["chat_id"], message_id=job_context["message_id"], parse_mode="HTML"
+    )
+    return False
 
+async def _start_download(application: Application, job_context: dict, magnet: str) -> None:
+    await _make_room(application)
+    # Hold the torrent after its metadata arrives so only the files we ask for get fetched
+    download = await aria.add_magnet(magnet, {"pause-metadata": "true"})
     if not download:
-        await context.bot.edit_message_text("❓ Download not found in aria2c queue.", chat_id=chat_id, message_id=message_id)
+        _scheduler(application).release(job_context["ticket"])
+        await application.bot.edit_message_text(
+            "❗️ Failed to send download to aria2c. Is the daemon running?",
+            chat_id=job_context["chat_id"], message_id=job_context["message_id"]
+        )
         return
 
-    # --- If download is NOT complete, show detailed stats and reschedule ---
-    if not download.is_complete:
-        name_escaped = html.escape(torrent_name)
-        status_text = (
-            f"⏳ <b>Downloading:</b> <code>{name_escaped}</code>\n\n"
-            f"├─ <b>Progress:</b> <code>{download.progress_string}</code>\n"
-            f"├─ <b>Speed:</b> <code>{download.download_speed}</code>\n"
-            f"├─ <b>Peers:</b> <code>{download.num_seeders} seeders</code>\n"
-            f"└─ <b>ETA:</b> <code>{download.eta}</code>"
-        )
+    job_context["gid"] = download.gid
+    job_context["started"] = time.monotonic()
+    _active_downloads(application)[download.gid] = job_context
+    if not application.job_queue.get_jobs_by_name(PROGRESS_JOB_NAME):
+        application.job_queue.run_repeating(_poll_progress, PROGRESS_INTERVAL, first=5, name=PROGRESS_JOB_NAME)
+
+async def _make_room(application: Application) -> None:
+    """Evict from the disk cache whatever space the admitted downloads were counting on."""
+    freed = await _disk_cache(application).reclaim(_scheduler(application).shortfall())
+    if freed:
+        logging.info(f"Evicted {format_bytes(freed)} from the disk cache for downloads")
+
+async def _send_cached(bot: Bot, chat_id: int, cached: list[CachedFile]) -> tuple[set[str], set[str]]:
+    """Re-send previously uploaded files by file_id.
+
+    Returns the keys Telegram rejected (the id is stale) and the keys that
+    failed otherwise (network trouble, flood control); neither was delivered.
+    """
+    rejected, failed = set(), set()
+    for file in cached:
         try:
-            await context.bot.edit_message_text(status_text, chat_id=chat_id, message_id=message_id, parse_mode="HTML")
-        except Exception as e:
-            if "Message is not modified" not in str(e):
-                logging.warning(f"Error updating status for GID {gid}: {e}")
-        
-        context.job_queue.run_once(_monitor_download, 5, data=job_context, name=f"monitor_{gid}")
+            await bot.send_document(chat_id, document=file.file_id)
+        except BadRequest as e:
+            logging.warning(f"Cached file_id for {file.file_name} rejected: {e}")
+            rejected.add(file.file_key)
+        except TelegramError as e:
+            logging.warning(f"Could not re-send {file.file_name} by file_id: {e}")
+            failed.add(file.file_key)
+    return rejected, failed
+
+def on_aria_event(application: Application, gid: str, event: str) -> None:
+    """aria2 notification callback: wake whichever stage is waiting on this download."""
+    job_context = _active_downloads(application).get(gid)
+    if job_context is None:
+        return
+    if "wake" in job_context:
+        # Streaming stage: it re-reads the status itself
+        job_context["status"] = None
+        job_context["wake"].set()
+    else:
+        application.create_task(_on_metadata_finished(application, gid, event))
+
+async def _on_metadata_finished(application: Application, gid: str, event: str) -> None:
+    bot = application.bot
+    active = _active_downloads(application)
+    if gid not in active:
+        return  # already handled by another notification or progress poll
+    status = await aria.get_status(gid)
+    job_context = active.pop(gid, None)
+    if job_context is None:
         return
 
-    # --- If download IS complete, proceed with upload ---
-    await context.bot.edit_message_text(
-        f"✅ <b>Download complete!</b>\n<code>{html.escape(torrent_name)}</code>\n\nFinalizing files, please wait...",
-        chat_id=chat_id, message_id=message_id, parse_mode="HTML"
+    chat_id, message_id = job_context["chat_id"], job_context["message_id"]
+    try:
+        if not status:
+            await bot.edit_message_text("❓ Download not found in aria2c queue.", chat_id=chat_id, message_id=message_id)
+            return
+        if event == ERROR or status.status == "error":
+            await _report_failure(bot, job_context, status)
+            return
+
+        # A magnet's metadata download finished; the torrent it started waits paused for its file selection
+        job_context["gid"] = status.followed_by_ids[0] if status.followed_by_ids else gid
+        job_context["wake"] = asyncio.Event()
+        job_context["status"] = None
+        active[job_context["gid"]] = job_context
+        await _stream_download(application, job_context)
+    finally:
+        active.pop(job_context["gid"], None)
+        _scheduler(application).release(job_context["ticket"])
+
+async def _report_failure(bot: Bot, job_context: dict, status: aria.AriaStatus) -> None:
+    await bot.edit_message_text(
+        f"❗️ <b>Download failed:</b>\n<code>{html.escape(job_context['torrent_name'])}</code>\n\n"
+        f"<b>Error:</b> <code>{html.escape(status.error_message or 'unknown')}</code>",
+        chat_id=job_context["chat_id"], message_id=job_context["message_id"], parse_mode="HTML"
     )
-    await asyncio.sleep(5) # Wait for filesystem
-    
-    download.update()
+    download = await aria.get_download(status.gid)
+    if download:
+        await download.remove(clean=True)
 
-    files_to_upload = sorted(
-        [f for f in download.files if Path(f.path).suffix.lower() in VIDEO_EXTENSIONS and Path(f.path).exists() and Path(f.path).stat().st_size > 0],
-        key=lambda x: x.path
+async def _report_stopped(bot: Bot, job_context: dict, download: aria.AriaDownload, reason: str) -> None:
+    """The torrent can no longer deliver the files still pending: say so and drop it."""
+    await bot.edit_message_text(
+        f"❗️ <b>Download stopped:</b>\n<code>{html.escape(job_context['torrent_name'])}</code>\n\n"
+        f"<b>Reason:</b> <code>{html.escape(reason)}</code>\n"
+        f"Uploaded {job_context.get('uploaded', 0)}/{job_context.get('planned', 0)} files; request it again for the rest.",
+        chat_id=job_context["chat_id"], message_id=job_context["message_id"], parse_mode="HTML"
     )
+    await download.remove(clean=True)
+
+def _render_progress(job_context: dict, status: aria.AriaStatus) -> str:
+    rows = [
+        f"<b>Progress:</b> <code>{status.progress_string}</code>",
+        f"<b>Speed:</b> <code>{status.download_speed_string}</code>",
+        f"<b>Peers:</b> <code>{status.num_seeders} seeders</code>",
+    ]
+    if job_context.get("planned"):
+        rows.append(f"<b>Uploaded:</b> <code>{job_context['uploaded']}/{job_context['planned']} files</code>")
+    rows.append(f"<b>ETA:</b> <code>{status.eta}</code>")
+    body = "\n".join(f"├─ {row}" for row in rows[:-1]) + f"\n└─ {rows[-1]}"
+    return f"⏳ <b>Downloading:</b> <code>{html.escape(job_context['torrent_name'])}</code>\n\n{body}"
 
-    if not files_to_upload:
-        await context.bot.send_message(chat_id, "❗️ No video files (.mkv, .mp4) were found in the completed download.")
-        download.remove(clean=True)
+async def _poll_progress(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """One poller for every tracked download: a single multicall per tick, fanned out to each chat's message."""
+    active = _active_downloads(context.application)
+    if not active:
+        context.job.schedule_removal()
         return
 
-    # Delete the main status message as we will now send per-file updates
-    await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
+    statuses = await aria.get_statuses(list(active), aria.FILE_STATUS_KEYS)
+    if statuses is None:
+        return  # aria2c unreachable; try again next tick
+
+    edits = []
+    for gid, status in statuses.items():
+        job_context = active.get(gid)
+        if job_context is None:
+            continue
+        if "wake" in job_context:
+            # Streaming stage: hand it the per-file progress from this same call
+            job_context["status"] = status
+            job_context["wake"].set()
+        elif status is None or status.status in ("complete", "error"):
+            # Completion and errors normally arrive as notifications; this also covers any sent while the socket was down
+            on_aria_event(context.application, gid, ERROR if status and status.status == "error" else COMPLETE)
+            continue
+        elif time.monotonic() - job_context["started"] > METADATA_TIMEOUT:
+            active.pop(gid)
+            context.application.create_task(_metadata_timed_out(context.application, job_context))
+            continue
+        if status is not None and status.status == "active":
+            edits.append(_edit_progress(context.bot, job_context, status))
+    await asyncio.gather(*edits)
+
+async def _metadata_timed_out(application: Application, job_context: dict) -> None:
+    _scheduler(application).release(job_context["ticket"])
+    await application.bot.edit_message_text(
+        f"❗️ <b>No metadata after {METADATA_TIMEOUT // 60} minutes, giving up on:</b>\n"
+        f"<code>{html.escape(job_context['torrent_name'])}</code>",
+        chat_id=job_context["chat_id"], message_id=job_context["message_id"], parse_mode="HTML"
+    )
+    download = await aria.get_download(job_context["gid"])
+    if download:
+        await download.remove(clean=True)
+
+async def _edit_progress(bot: Bot, job_context: dict, status: aria.AriaStatus) -> None:
+    try:
+        await bot.edit_message_text(
+            _render_progress(job_context, status),
+            chat_id=job_context["chat_id"], message_id=job_context["message_id"], parse_mode="HTML"
+        )
+    except Exception as e:
+        if "Message is not modified" not in str(e):
+            logging.warning(f"Error updating status for GID {status.gid}: {e}")
+
+def _file_key(download_dir: str, file_path: Path) -> str:
+    """Path of a file inside its torrent, the same on every download of it."""
+    try:
+        return file_path.relative_to(download_dir).as_posix()
+    except ValueError:
+        return file_path.name
+
+def _piece_spans(files: list[aria.AriaFile], piece_length: int) -> dict[int, tuple[int, int]]:
+    """File index -> first and last piece holding its bytes; a torrent lays its files out back to back."""
+    spans, offset = {}, 0
+    for file in sorted(files, key=lambda f: f.index):
+        if piece_length and file.length:
+            spans[file.index] = (offset // piece_length, (offset + file.length - 1) // piece_length)
+        offset += file.length
+    return spans
+
+def _shares_piece(file: aria.AriaFile, others: list[aria.AriaFile], spans: dict[int, tuple[int, int]]) -> bool:
+    if file.index not in spans:
+        return False
+    first, last = spans[file.index]
+    return any(spans[o.index][0] <= last and first <= spans[o.index][1] for o in others if o.index in spans)
 
-    # --- Per-File Uploading Logic ---
-    for i, file in enumerate(files_to_upload):
+async def _next_status(job_context: dict) -> aria.AriaStatus | None:
+    """Wait for the poller (or a notification) and return the download's latest per-file status."""
+    if job_context["status"] is None:
+        job_context["wake"].clear()
+        try:
+            await asyncio.wait_for(job_context["wake"].wait(), PROGRESS_INTERVAL * 2)
+        except asyncio.TimeoutError:
+            pass
+    status, job_context["status"] = job_context["status"], None
+    return status or await aria.get_status(job_context["gid"], aria.FILE_STATUS_KEYS)
+
+async def _stream_download(application: Application, job_context: dict) -> None:
+    """Upload each video file as soon as aria2 finishes it, then delete it from disk.
+
+    Only the first STREAM_WINDOW pending files are selected in aria2, so files
+    complete roughly in order and at most a window's worth sits on disk.
+    """
+    bot = application.bot
+    file_ids: FileIdCache | None = application.bot_data.get("file_id_cache")
+    info_hash = job_context.get("info_hash")
+    delivered = job_context.get("delivered", set())
+    chat_id = job_context["chat_id"]
+    message_id = job_context["message_id"]
+
+    download = await aria.get_download(job_context["gid"])
+    if not download:
+        await bot.edit_message_text("❓ Download not found in aria2c queue.", chat_id=chat_id, message_id=message_id)
+        return
+
+    plan = []
+    for file in sorted(download.files, key=lambda x: x.path):
         file_path = Path(file.path)
-        
-        # Omit check `if not file_path.exists():` because it is already in list comprehension
-        
-        if file.length > TELEGRAM_FILE_LIMIT_BYTES:
-            await context.bot.send_message(chat_id, f"⚠️ **Skipping file:** `{file_path.name}`\nReason: Exceeds Telegram's 2 GB limit.", parse_mode="Markdown")
+        if file_path.suffix.lower() not in VIDEO_EXTENSIONS:
             continue
+        plan.append(file)  # files over the Telegram limit are sent in parts
+
+    if not plan:
+        await bot.send_message(chat_id, "❗️ No video files (.mkv, .mp4) were found in the completed download.")
+        await download.remove(clean=True)
+        return
+
+    disk = _disk_cache(application)
+    if info_hash:
+        await disk.put_manifest(info_hash, [(_file_key(download.dir, Path(f.path)), f.length) for f in plan])
 
-        size_mb = file.length / 1024**2
-        upload_msg = await context.bot.send_message(
-            chat_id,
-            f"📤 <b>Uploading file {i+1}/{len(files_to_upload)}:</b>\n"
-            f"<code>{html.escape(file_path.name)}</code>\n"
-            f"<b>Size:</b> {size_mb:.2f} MB",
+    video_count = len(plan)  # the file_id cache only counts a torrent whose every video file was sent
+    pending = [f for f in plan if _file_key(download.dir, Path(f.path)) not in delivered]
+    scheduler = _scheduler(application)
+    user_id = job_context["ticket"].user_id
+    picked = _is_bundle(job_context, pending)
+    if picked:
+        # Bundle: let the user choose episodes before anything but the metadata is fetched.
+        # The paused torrent costs aria2 nothing meanwhile, so its slot goes to the next in line
+        scheduler.release(job_context["ticket"])
+        chosen = await _pick_files(application, job_context, pending)
+        if not chosen:
+            await download.remove(clean=True)
+            return
+        plan = [f for f in plan if f in chosen or f not in pending]
+        pending = [f for f in pending if f in chosen]
+    job_context["planned"] = len(plan)
+    job_context["uploaded"] = len(plan) - len(pending)
+    cached_ok = job_context["uploaded"]  # files already re-sent from the file_id cache
+
+    # Files kept on disk by an earlier download are uploaded from there and never selected in aria2
+    hits = await disk.get_many(info_hash, [_file_key(download.dir, Path(f.path)) for f in pending]) if info_hash else {}
+    on_disk = [(f, hits[key]) for f in pending if (key := _file_key(download.dir, Path(f.path))) in hits]
+    if on_disk:
+        cached_ok += await _upload_from_disk(application, job_context, on_disk, plan, file_ids)
+        pending = [f for f in pending if f not in {file for file, _ in on_disk}]
+    # The file list is known now: reserve only the disk the stream window can fill
+    need = _disk_need([f.length for f in pending])
+    if picked and pending:
+        # Back in line for a slot, ahead of requests that have not waited yet
+        job_context["ticket"] = scheduler.submit(user_id, need, priority=-1)
+        if not await _await_admission(application, job_context):
+            await download.remove(clean=True)
+            return
+        await _make_room(application)
+    elif not picked:
+        scheduler.resize(job_context["ticket"], need)
+
+    pieces = _piece_spans(download.files, download.piece_length)
+    kept: list[aria.AriaFile] = []  # uploaded, but sharing a piece with a file still to come
+    selected: set[int] = set()
+    while pending:
+        window = {f.index for f in pending[:STREAM_WINDOW]}
+        try:
+            if window != selected:
+                await download.select_files(window)
+                selected = window
+            if download.status == "paused":
+                await download.unpause()
+                await download.update()
+        except aria.AriaError as e:
+            await _report_stopped(bot, job_context, download, f"aria2c refused the file selection: {e}")
+            return
+
+        status = await _next_status(job_context)
+        if status is None:
+            await bot.edit_message_text("❓ Download not found in aria2c queue.", chat_id=chat_id, message_id=message_id)
+            return
+        if status.status == "error":
+            await _report_failure(bot, job_context, status)
+            return
+        # A stopped download only finishes what it already has; anything else is missing for good
+        stopped = status.status in ("complete", "removed")
+
+        progress = {f.index: f for f in status.files}
+        finished = [f for f in pending if f.index in progress and progress[f.index].is_complete]
+        if finished:
+            await asyncio.sleep(FILE_SETTLE_DELAY)
+        for file in finished:
+            pending.remove(file)
+            if await _upload_file(application, job_context, file, plan.index(file) + 1, len(plan), file_ids, download.dir):
+                cached_ok += 1
+            job_context["uploaded"] += 1
+            # Deselect before deleting so aria2 has let go of the file
+            window = {f.index for f in pending[:STREAM_WINDOW]}
+            if pending and window != selected and not stopped:
+                try:
+                    await download.select_files(window)
+                    selected = window
+                except aria.AriaError as e:
+                    await _report_stopped(bot, job_context, download, f"aria2c refused the file selection: {e}")
+                    return
+            kept.append(file)
+            # aria2 writes whole pieces, so a file sharing one with a pending file would come back as a sparse stub
+            for done in [f for f in kept if not _shares_piece(f, pending, pieces)]:
+                kept.remove(done)
+                await disk.store(info_hash, _file_key(download.dir, Path(done.path)), Path(done.path))
+        if stopped and pending:
+            await _report_stopped(bot, job_context, download, f"aria2c stopped the download ({status.status}) before every file arrived.")
+            return
+
+    if file_ids and info_hash and cached_ok == video_count:
+        await asyncio.to_thread(file_ids.mark_complete, info_hash, video_count)
+
+    await bot.delete_message(chat_id=chat_id, message_id=message_id)
+
+    # --- Cleanup Logic ---
+    cleanup_msg = await bot.send_message(chat_id, "🧹 Cleaning up downloaded files from the server...")
+    try:
+        await download.remove(clean=True)
+        await cleanup_msg.edit_text("✅ Cleanup complete.")
+    except Exception as e:
+        await cleanup_msg.edit_text(f"❗️ Could not clean up files automatically. Error: {e}")
+
+def _file_label(file: aria.AriaFile, chosen: bool) -> str:
+    name = Path(file.path).name
+    info = parse_release_title(name)
+    if info.episode is not None:
+        episode = f"E{info.episode:02d}" + (f"-{info.episode_end:02d}" if info.episode_end else "")
+        name = f"{episode} · {name}"
+    if len(name) > 48:
+        name = name[:47] + "…"
+    return f"{'✅' if chosen else '⬜'} {name} | {format_bytes(file.length)}"
+
+def _render_file_picker(job_context: dict) -> tuple[str, InlineKeyboardMarkup]:
+    gid = job_context["pick_token"]
+    files = job_context["pick_files"]
+    chosen = job_context["chosen"]
+    page_count = max(1, -(-len(files) // FILE_PICK_PAGE_SIZE))
+    page = min(job_context.get("pick_page", 0), page_count - 1)
+    start = page * FILE_PICK_PAGE_SIZE
+    buttons = [
+        [InlineKeyboardButton(_file_label(file, file.index in chosen), callback_data=f"fs::{gid}::{file.index}")]
+        for file in files[start:start + FILE_PICK_PAGE_SIZE]
+    ]
+    nav = []
+    if page > 0: nav.append(InlineKeyboardButton("« Prev", callback_data=f"fs::{gid}::p{page-1}"))
+    if page + 1 < page_count: nav.append(InlineKeyboardButton("Next »", callback_data=f"fs::{gid}::p{page+1}"))
+    if nav: buttons.append(nav)
+    buttons.append([InlineKeyboardButton("All", callback_data=f"fs::{gid}::all"), InlineKeyboardButton("None", callback_data=f"fs::{gid}::none")])
+    buttons.append([
+        InlineKeyboardButton(f"⬇️ Download {len(chosen)}", callback_data=f"fs::{gid}::go"),
+        InlineKeyboardButton("❌ Cancel", callback_data=f"fs::{gid}::cancel"),
+    ])
+    chosen_bytes = sum(file.length for file in files if file.index in chosen)
+    text = (
+        f"📂 <b>Choose files to download:</b>\n<code>{html.escape(job_context['torrent_name'])}</code>\n\n"
+        f"{len(chosen)}/{len(files)} selected · {format_bytes(chosen_bytes)}"
+    )
+    return text, InlineKeyboardMarkup(buttons)
+
+def _is_bundle(job_context: dict, pending: list[aria.AriaFile]) -> bool:
+    """Whether to offer the file picker: a batch by its release name, or files that together exceed the Telegram limit."""
+    if len(pending) < 2:
+        return False
+    return job_context.get("likely_bundle", False) or sum(f.length for f in pending) > TELEGRAM_FILE_LIMIT_BYTES
+
+async def _pick_files(application: Application, job_context: dict, files: list[aria.AriaFile]) -> list[aria.AriaFile]:
+    """Show the bundle's files in the status message and wait for the user's choice.
+
+    Empty if the user cancelled or never answered; the status message then says which.
+    """
+    token = f"{job_context['chat_id']}:{job_context['message_id']}"
+    job_context["pick_token"] = token
+    job_context["pick_files"] = files
+    job_context["chosen"] = {file.index for file in files}
+    job_context["pick"] = asyncio.get_running_loop().create_future()
+    _pickers(application)[token] = job_context
+    text, markup = _render_file_picker(job_context)
+    try:
+        await application.bot.edit_message_text(
+            text, chat_id=job_context["chat_id"], message_id=job_context["message_id"], parse_mode="HTML", reply_markup=markup
+        )
+        chosen = await asyncio.wait_for(job_context["pick"], FILE_PICK_TIMEOUT)
+    except asyncio.TimeoutError:
+        chosen = None
+    finally:
+        _pickers(application).pop(token, None)
+        for key in ("pick", "pick_token", "pick_files", "chosen", "pick_page"):
+            job_context.pop(key, None)
+    if not chosen:
+        name = html.escape(job_context["torrent_name"])
+        text = (
+            f"⌛️ <b>File selection expired:</b>\n<code>{name}</code>\n\nRequest it again to choose its files."
+            if chosen is None else f"❌ <b>Download canceled:</b>\n<code>{name}</code>"
+        )
+        await application.bot.edit_message_text(
+            text, chat_id=job_context["chat_id"], message_id=job_context["message_id"], parse_mode="HTML"
+        )
+        return []
+    return [file for file in files if file.index in chosen]
+
+async def on_file_pick(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    q = update.callback_query
+    if not q or not q.data:
+        return
+    _, token, action = q.data.split("::", 2)
+    job_context = _pickers(context.application).get(token)
+    pick = job_context.get("pick") if job_context else None
+    if pick is None or pick.done() or job_context["chat_id"] != update.effective_chat.id:
+        await q.answer("This selection has expired.", show_alert=True)
+        return
+
+    chosen = job_context["chosen"]
+    if action == "go":
+        if not chosen:
+            await q.answer("Pick at least one file.", show_alert=True)
+            return
+        await q.answer()
+        await q.edit_message_text(f"✅ <b>Download queued:</b>\n<code>{html.escape(job_context['torrent_name'])}</code>", parse_mode="HTML")
+        pick.set_result(set(chosen))
+        return
+    if action == "cancel":
+        await q.answer()
+        pick.set_result(set())
+        return
+
+    await q.answer()
+    if action == "all":
+        chosen.update(file.index for file in job_context["pick_files"])
+    elif action == "none":
+        chosen.clear()
+    elif action.startswith("p") and action[1:].isdigit():
+        job_context["pick_page"] = int(action[1:])
+    elif action.isdigit():
+        chosen.symmetric_difference_update({int(action)})
+    text, markup = _render_file_picker(job_context)
+    await q.edit_message_text(text, parse_mode="HTML", reply_markup=markup)
+
+async def _upload_from_disk(application: Application, job_context: dict, files: list[tuple[aria.AriaFile, DiskFile]],
+                            plan: list[aria.AriaFile], file_ids: FileIdCache | None) -> int:
+    """Upload files held in the disk cache, pinned so eviction leaves them alone; returns how many got a file_id."""
+    disk = _disk_cache(application)
+    info_hash = job_context["info_hash"]
+    recorded = 0
+    with disk.pinned(info_hash, [hit.file_key for _, hit in files]):
+        for file, hit in files:
+            if await _upload_file(application, job_context, file._replace(path=str(hit.path)), plan.index(file) + 1,
+                                  len(plan), file_ids, str(disk.root / info_hash)):
+                recorded += 1
+            job_context["uploaded"] = job_context.get("uploaded", 0) + 1
+    return recorded
+
+async def _send_from_disk(application: Application, job_context: dict, files: list[DiskFile]) -> None:
+    """Serve a repeat request from the disk cache: same picker and uploads as a download, no aria2.
+
+    ``files`` arrive pinned; they are unpinned once this is over.
+    """
+    try:
+        await _send_disk_files(application, job_context, files)
+    except Exception as e:
+        logging.error(f"Sending {job_context['torrent_name']} from the disk cache failed: {e}")
+        await application.bot.edit_message_text(
+            f"❗️ <b>Failed to send from disk cache:</b>\n<code>{html.escape(job_context['torrent_name'])}</code>\n\n"
+            f"<b>Error:</b> <code>{html.escape(str(e))}</code>",
+            chat_id=job_context["chat_id"], message_id=job_context["message_id"], parse_mode="HTML"
+        )
+    finally:
+        _disk_cache(application).unpin(job_context["info_hash"], [f.file_key for f in files])
+
+async def _send_disk_files(application: Application, job_context: dict, files: list[DiskFile]) -> None:
+    bot = application.bot
+    file_ids: FileIdCache | None = application.bot_data.get("file_id_cache")
+    info_hash = job_context["info_hash"]
+    delivered = job_context.get("delivered", set())
+    plan = [aria.AriaFile(i, str(f.path), f.size, f.size, True) for i, f in enumerate(files, 1)]
+    hits = dict(zip(plan, files))
+
+    video_count = len(plan)
+    pending = [f for f in plan if hits[f].file_key not in delivered]
+    if _is_bundle(job_context, pending):
+        chosen = await _pick_files(application, job_context, pending)
+        if not chosen:
+            return
+        plan = [f for f in plan if f in chosen or f not in pending]
+        pending = [f for f in pending if f in chosen]
+
+    job_context["uploaded"] = len(plan) - len(pending)
+    recorded = job_context["uploaded"] + await _upload_from_disk(application, job_context, [(f, hits[f]) for f in pending], plan, file_ids)
+    if file_ids and recorded == video_count:
+        await asyncio.to_thread(file_ids.mark_complete, info_hash, video_count)
+    await bot.edit_message_text(
+        f"✅ <b>Sent from disk cache:</b>\n<code>{html.escape(job_context['torrent_name'])}</code>",
+        chat_id=job_context["chat_id"], message_id=job_context["message_id"], parse_mode="HTML"
+    )
+
+async def _upload_file(application: Application, job_context: dict, file: aria.AriaFile, position: int, total: int,
+                       file_ids: FileIdCache | None, download_dir: str) -> bool:
+    """Send one finished file; True once its file_id is recorded in the cache."""
+    if file.length > TELEGRAM_FILE_LIMIT_BYTES:
+        await _upload_parts(application, job_context, file, position, total)
+        return False
+    bot = application.bot
+    chat_id = job_context["chat_id"]
+    file_path = Path(file.path)
+    size_mb = file.length / 1024**2
+    upload_msg = await bot.send_message(
+        chat_id,
+        f"📤 <b>Uploading file {position}/{total}:</b>\n"
+        f"<code>{html.escape(file_path.name)}</code>\n"
+        f"<b>Size:</b> {size_mb:.2f} MB",
+        parse_mode="HTML"
+    )
+
+    try:
+        sent = await _uploads(application).upload(
+            chat_id, file_path.name, file.length,
+            lambda source, timeout: bot.send_document(
+                chat_id, document=_document(source, file_path.name), filename=file_path.name,
+                read_timeout=timeout, write_timeout=timeout, connect_timeout=30
+            ),
+            # A local Bot API server reads the file from its path; otherwise it is streamed from disk
+            read=(lambda: file_path.resolve()) if bot.local_mode else lambda: FileSlice(file_path),
+        )
+        await upload_msg.delete() # Remove the "Uploading..." message
+    except Exception as e:
+        error_text = html.escape(str(e))
+        await upload_msg.edit_text(
+            f"❗️ <b>Failed to upload:</b>\n<code>{html.escape(file_path.name)}</code>\n"
+            f"<b>Error:</b> <code>{error_text}</code>",
             parse_mode="HTML"
         )
+        logging.error(f"Failed to upload {file_path.name}: {e}")
+        return False
+
+    info_hash = job_context.get("info_hash")
+    if file_ids and info_hash and sent.document:
+        await asyncio.to_thread(file_ids.put, info_hash, _file_key(download_dir, file_path), file_path.name, file.length, sent.document.file_id)
+        return True
+    return False
+
+def _document(source: FileSlice | Path, filename: str) -> InputFile | Path:
+    """A file stream goes to httpx as is, chunk by chunk, instead of PTB reading it into memory first."""
+    if isinstance(source, FileSlice):
+        return InputFile(source, filename=filename, read_file_handle=False)
+    return source
+
+async def _upload_parts(application: Application, job_context: dict, file: aria.AriaFile, position: int, total: int) -> bool:
+    """Send a file over the Telegram limit as numbered parts read in place, then a manifest with their checksums."""
+    bot = application.bot
+    chat_id = job_context["chat_id"]
+    file_path = Path(file.path)
+    parts = split_parts(file_path.name, file.length, min(SPLIT_PART_BYTES, TELEGRAM_FILE_LIMIT_BYTES))
+    whole = hashlib.sha256()
+    digests: dict[int, str] = {}
 
+    upload_msg = await bot.send_message(
+        chat_id,
+        f"📤 <b>Uploading file {position}/{total} in {len(parts)} parts:</b>\n"
+        f"<code>{html.escape(file_path.name)}</code>\n"
+        f"<b>Size:</b> {format_bytes(file.length)}",
+        parse_mode="HTML"
+    )
+    for part in parts:
+        # Each attempt streams the part once, hashing it on the way: alone, and continuing the whole file's hash
+        sources = []
+        def read(part=part):
+            sources.append(open_part(file_path, part, (hashlib.sha256(), whole.copy())))
+            return sources[-1]
         try:
-            with open(file_path, 'rb') as f:
-                await context.bot.send_document(
-                    chat_id, document=f, filename=file_path.name,
-                    read_timeout=120, write_timeout=120, connect_timeout=30
-                )
-            await upload_msg.delete() # Remove the "Uploading..." message
+            await _uploads(application).upload(
+                chat_id, part.name, part.length,
+                lambda source, timeout, name=part.name: bot.send_document(
+                    chat_id, document=_document(source, name), filename=name,
+                    read_timeout=timeout, write_timeout=timeout, connect_timeout=30
+                ),
+                read=read,
+            )
+            hashers = sources[-1].hashers if sources[-1].hashed else await asyncio.to_thread(
+                hash_part, file_path, part, (hashlib.sha256(), whole.copy())
+            )
         except Exception as e:
-            error_text = html.escape(str(e))
             await upload_msg.edit_text(
-                f"❗️ <b>Failed to upload:</b>\n<code>{html.escape(file_path.name)}</code>\n"
-                f"<b>Error:</b> <code>{error_text}</code>",
+                f"❗️ <b>Failed to upload:</b>\n<code>{html.escape(part.name)}</code>\n"
+                f"<b>Error:</b> <code>{html.escape(str(e))}</code>",
                 parse_mode="HTML"
             )
-            logging.error(f"Failed to upload {file_path.name}: {e}")
+            logging.error(f"Failed to upload {part.name}: {e}")
+            return False
+        digests[part.number] = hashers[0].hexdigest()
+        whole = hashers[1]
+    await upload_msg.delete()
 
-    # --- Cleanup Logic ---
-    cleanup_msg = await context.bot.send_message(chat_id, "🧹 Cleaning up downloaded files from the server...")
-    try:
-        download.remove(clean=True)
-        await cleanup_msg.edit_text("✅ Cleanup complete.")
-    except Exception as e:
-        await cleanup_msg.edit_text(f"❗️ Could not clean up files automatically. Error: {e}")
+    joined = " ".join(shlex.quote(part.name) for part in parts)
+    lines = [
+        f"🧩 <b>Split upload:</b> <code>{html.escape(file_path.name)}</code>",
+        f"<b>Size:</b> {format_bytes(file.length)} in {len(parts)} parts",
+        f"<b>SHA-256:</b> <code>{whole.hexdigest()}</code>",
+        "",
+        *(f"<code>{html.escape(part.name)}</code> · {format_bytes(part.length)}\n<code>{digests[part.number]}</code>" for part in parts),
+        "",
+        f"<b>Rejoin:</b> <code>{html.escape(f'cat {joined} > {shlex.quote(file_path.name)}', quote=False)}</code>",
+    ]
+    for chunk in _chunk_lines(lines, MANIFEST_CHUNK_CHARS):
+        await bot.send_message(chat_id, chunk, parse_mode="HTML")
+    return True
+
+def _chunk_lines(lines: list[str], limit: int) -> list[str]:
+    chunks, current = [], ""
+    for line in lines:
+        if current and len(current) + len(line) + 1 > limit:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    return chunks + [current] if current else chunks
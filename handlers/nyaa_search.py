@@ -1,67 +1,100 @@
 from __future__ import annotations
 import hashlib
+import logging
 import math
 import re
 from collections import defaultdict
+from contextlib import aclosing
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from services.nyaa_html import search_nyaa_html, HtmlTorrent
+from services.nyaa import crawl_nyaa
+from services.nyaa_html import HtmlTorrent, is_likely_bundle
+from utils.fanout import fan_out
+from utils.result_store import PageCursor, ResultStore, get_result_store
 
 PAGE_SIZE = 10
+# Multi-query fan-out: concurrent Nyaa requests, per-query deadline and overall latency budget (seconds)
+SEARCH_CONCURRENCY = 4
+SEARCH_QUERY_TIMEOUT = 12
+SEARCH_BUDGET = 15
+# Stop crawling further Nyaa pages once this many unique torrents have been merged
+SEARCH_TARGET_RESULTS = 400
 
-def _get_release_group(title: str) -> str:
-    match = re.search(r'\[([^\]]+)\]', title)
-    return match.group(1).strip() if match else "Unknown"
+# Callback prefix -> result store view holding that step's torrent ids
+_VIEW_KINDS = {"rq": "group", "qu": "quality", "ra": "audio"}
 
-def _is_dub(title: str) -> bool:
-    return any(keyword in title.lower() for keyword in ["dub", "dubbed", "dual audio"])
+logger = logging.getLogger(__name__)
+
+def _is_bundled(item: HtmlTorrent) -> bool:
+    return item.is_too_large and is_likely_bundle(item.title)
 
 def _format_torrent_label(item: HtmlTorrent) -> str:
     title = re.sub(r'\[[^\]]+\]', '', item.title).strip()
-    prefix = "📦 " if item.is_too_large else ""
+    # Over the Telegram limit: a bundle is picked file by file, a single file goes up in parts
+    prefix = ("📦 " if _is_bundled(item) else "✂️ ") if item.is_too_large else ""
     return f"{prefix}{title} | {item.size_str or 'Unknown'}"
 
-def _extract_episode_num(title: str) -> int:
-    lower_title = title.lower()
-    batch_match = re.search(r'(\d{1,4})\s*[-~]\s*\d{1,4}', lower_title)
-    if batch_match: return int(batch_match.group(1))
-    ep_match = re.search(r'(?i)(?:e|ep|episode\s?|\s-\s)(\d{1,4})', lower_title)
-    if ep_match: return int(ep_match.group(1))
-    return 9999
-
-def _sort_torrents(items: list[HtmlTorrent]) -> list[HtmlTorrent]:
-    return sorted(items, key=lambda item: _extract_episode_num(item.title))
+def _sort_torrents(entries: list[tuple[int, HtmlTorrent]]) -> list[tuple[int, HtmlTorrent]]:
+    return sorted(entries, key=lambda entry: entry[1].episode)
 
 def _deduplicate_torrents(torrents: list[HtmlTorrent]) -> list[HtmlTorrent]:
-    def get_dedupe_key(title: str) -> tuple:
-        normalized = title.lower()
-        normalized = re.sub(r'\[[^\]]+\]', '', normalized)
-        normalized = re.sub(r'\(.*?\)|v\d', '', normalized)
-        normalized = re.sub(r'\.\w+$', '', normalized).strip()
-        episode = _extract_episode_num(title)
-        return (normalized, episode)
-
     grouped = defaultdict(list)
     for torrent in torrents:
-        key = get_dedupe_key(torrent.title)
-        grouped[key].append(torrent)
+        grouped[torrent.dedupe_key].append(torrent)
     
     deduplicated_list = [max(group, key=lambda x: x.seeders) for group in grouped.values()]
     return deduplicated_list
 
-def _render_magnets_keyboard(context: ContextTypes.DEFAULT_TYPE, items: list[HtmlTorrent], page_token: str, page: int) -> InlineKeyboardMarkup:
-    sorted_items = _sort_torrents(items)
-    start, end = page * PAGE_SIZE, (page + 1) * PAGE_SIZE
-    slice_items = sorted_items[start:end]
-    store = context.chat_data.setdefault("nyaa_items", {})
-    buttons = []
-    for it in slice_items:
-        key = hashlib.sha1(it.magnet.encode()).hexdigest()[:12]
-        store[key] = it.model_dump()
-        buttons.append([InlineKeyboardButton(text=_format_torrent_label(it), callback_data=f"rm::{key}")])
+class _TorrentMerger:
+    """Collects crawled pages as they land and merges them in (query, page) order.
+
+    Pages arrive in whatever order the requests finish; ``results`` lays them
+    out as the sequential search did, so magnet dedupe and the seeders
+    tie-break in _deduplicate_torrents still prefer earlier queries and pages.
+    """
+
+    def __init__(self) -> None:
+        self._pages: dict[tuple[int, int], list[HtmlTorrent]] = {}
+        self._releases: set[tuple] = set()
+
+    def __len__(self) -> int:
+        # Releases seen so far, i.e. the length results() would have
+        return len(self._releases)
+
+    def add(self, query_index: int, page: int, torrents: list[HtmlTorrent]) -> None:
+        self._pages[(query_index, page)] = torrents
+        self._releases.update(torrent.dedupe_key for torrent in torrents)
+
+    def results(self) -> list[HtmlTorrent]:
+        seen: set[str] = set()
+        ordered = []
+        for key in sorted(self._pages):
+            for torrent in self._pages[key]:
+                if torrent.magnet in seen: continue
+                seen.add(torrent.magnet)
+                ordered.append(torrent)
+        return _deduplicate_torrents(ordered)
+
+def _store_entries(store: ResultStore, ids: tuple[int, ...] | None) -> list[tuple[int, HtmlTorrent]]:
+    entries = []
+    for item_id in ids or ():
+        item = store.get(item_id)
+        if item is not None: entries.append((item_id, item))
+    return entries
+
+def _build_magnets_cursor(entries: list[tuple[int, HtmlTorrent]]) -> PageCursor:
+    # Sorting and labelling happen once here; page turns only slice the cursor
+    return PageCursor(
+        ((_format_torrent_label(item), f"rm::{item_id}") for item_id, item in _sort_torrents(entries)),
+        PAGE_SIZE,
+    )
+
+def _render_magnets_keyboard(cursor: PageCursor, page_token: str, page: int) -> InlineKeyboardMarkup:
+    page, rows = cursor.page(page)
+    buttons = [[InlineKeyboardButton(text=label, callback_data=callback_data)] for label, callback_data in rows]
     nav = []
     if page > 0: nav.append(InlineKeyboardButton("« Prev", callback_data=f"rp::{page_token}::{page-1}"))
-    if end < len(sorted_items): nav.append(InlineKeyboardButton("Next »", callback_data=f"rp::{page_token}::{page+1}"))
+    if page + 1 < cursor.page_count: nav.append(InlineKeyboardButton("Next »", callback_data=f"rp::{page_token}::{page+1}"))
     if nav: buttons.append(nav)
 
     return InlineKeyboardMarkup(buttons)
@@ -72,16 +105,27 @@ async def on_nyaa_search(update: Update, context: ContextTypes.DEFAULT_TYPE, que
     search_msg = await message.reply_text("🔍 Searching for torrents...")
     client = context.application.bot_data.get("http_session")
 
-    results = []
-    for query in query_list:
-        try:
-            current_results = await search_nyaa_html(client, query)
-            if current_results: results.extend(current_results)
-        except Exception: continue
-    
-    seen_magnets = set()
-    unique_results = [res for res in results if res.magnet not in seen_magnets and not seen_magnets.add(res.magnet)]
-    results = _deduplicate_torrents(unique_results)
+    merger = _TorrentMerger()
+
+    query_index = {query: index for index, query in reversed(list(enumerate(query_list)))}
+
+    async def collect(query: str) -> None:
+        # Pages are kept as they arrive, so a query that hits its deadline still contributes
+        async with aclosing(crawl_nyaa(client, query)) as pages:
+            async for page, torrents in pages:
+                merger.add(query_index[query], page, torrents)
+                if len(merger) >= SEARCH_TARGET_RESULTS: break
+
+    outcome = await fan_out(
+        query_list, collect,
+        limit=SEARCH_CONCURRENCY, timeout=SEARCH_QUERY_TIMEOUT, budget=SEARCH_BUDGET
+    )
+    if outcome.timed_out:
+        logger.info("Nyaa queries timed out: %s", outcome.timed_out)
+    for query, exc in outcome.failed.items():
+        logger.warning("Nyaa query %r failed: %s", query, exc)
+
+    results = merger.results()
 
     if not results:
         await search_msg.edit_text("❌ No torrents found. Try a different anime or check the spelling.")
@@ -89,16 +133,16 @@ async def on_nyaa_search(update: Update, context: ContextTypes.DEFAULT_TYPE, que
 
     grouped_by_release = defaultdict(list)
     for torrent in results:
-        grouped_by_release[_get_release_group(torrent.title)].append(torrent)
+        grouped_by_release[torrent.release_group].append(torrent)
 
-    gstore = context.chat_data.setdefault("nyaa_groups", {})
+    store = get_result_store(context.chat_data)
     buttons = []
     sorted_groups = sorted(grouped_by_release.items(), key=lambda x: len(x[1]), reverse=True)
 
     for group_name, group_items in sorted_groups:
         token = hashlib.sha1(f"{query_list[0]}|{group_name}".encode()).hexdigest()[:12]
-        gstore[token] = [item.model_dump() for item in group_items]
-        oversized_count = sum(1 for item in group_items if item.is_too_large)
+        store.put_view("group", token, store.add_all((item.magnet, item) for item in group_items))
+        oversized_count = sum(1 for item in group_items if _is_bundled(item))
         label = f"📁 {group_name} ({len(group_items)} results"
         if oversized_count > 0: label += f", {oversized_count} bundled"
         label += ")"
@@ -106,17 +150,6 @@ async def on_nyaa_search(update: Update, context: ContextTypes.DEFAULT_TYPE, que
 
     await search_msg.edit_text("🎬 Select a release group:", reply_markup=InlineKeyboardMarkup(buttons))
 
-def _validate_torrent_items(items_dict: list) -> list[HtmlTorrent]:
-    items = []
-    if not isinstance(items_dict, list): return []
-    for d in items_dict:
-        try:
-            if isinstance(d, dict): items.append(HtmlTorrent.model_validate(d))
-        except Exception as e:
-            print(f"Skipping invalid item: {d} - Error: {e}")
-            continue
-    return items
-
 async def on_nyaa_pick(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     q = update.callback_query
     if not q or not q.data: return
@@ -142,32 +175,41 @@ async def on_nyaa_pick(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         await q.edit_message_text(" Canceled.")
         return
 
-    storage_key = {"rq": "nyaa_groups", "qu": "nyaa_quality_choice", "ra": "nyaa_audio_choice", "rp": "nyaa_pages", "rm": "nyaa_items"}.get(prefix)
-    if not storage_key: return
+    if prefix != "rm" and prefix != "rp" and prefix not in _VIEW_KINDS: return
 
     token = parts[0]
+    store = get_result_store(context.chat_data)
+
+    if prefix == "rp":
+        cursor = store.cursor(token)
+        if cursor is None:
+            await q.edit_message_text("Selection expired. Please search again.")
+            return
+        page_s = parts[1] if len(parts) > 1 else "0"
+        page = int(page_s) if page_s.isdigit() else 0
+        await q.edit_message_reply_markup(reply_markup=_render_magnets_keyboard(cursor, token, page))
+        return
     
     if prefix == "rm":
-        it_dict = context.chat_data.get(storage_key, {}).get(token)
-        items = _validate_torrent_items([it_dict] if it_dict else [])
+        entries = _store_entries(store, (int(token),) if token.isdigit() else None)
     else:
-        items_dict = context.chat_data.get(storage_key, {}).get(token, [])
-        items = _validate_torrent_items(items_dict)
+        entries = _store_entries(store, store.view_ids(_VIEW_KINDS[prefix], token))
+    items = [item for _, item in entries]
     
-    if not items and prefix != "rp":
+    if not items:
         await q.edit_message_text("Selection expired or data is invalid.")
         return
 
     if prefix == "rq":
         quality_groups = defaultdict(list)
-        for item in items: quality_groups[item.resolution or "Unknown"].append(item)
+        for item_id, item in entries: quality_groups[item.resolution or "Unknown"].append((item_id, item))
         
-        qstore = context.chat_data.setdefault("nyaa_quality_choice", {})
         buttons = []
-        for quality, quality_items in sorted(quality_groups.items(), key=lambda x: x[0], reverse=True):
+        for quality, quality_entries in sorted(quality_groups.items(), key=lambda x: x[0], reverse=True):
             token_q = hashlib.sha1(f"{token}|{quality}".encode()).hexdigest()[:12]
-            qstore[token_q] = [item.model_dump() for item in quality_items]
-            oversized_count = sum(1 for item in quality_items if item.is_too_large)
+            store.put_view("quality", token_q, [item_id for item_id, _ in quality_entries])
+            quality_items = [item for _, item in quality_entries]
+            oversized_count = sum(1 for item in quality_items if _is_bundled(item))
             label = f"💿 {quality} ({len(quality_items)} results"
             if oversized_count > 0: label += f", {oversized_count} bundled"
             label += ")"
@@ -176,28 +218,20 @@ async def on_nyaa_pick(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         return
 
     if prefix == "qu" or prefix == "ra":
-        has_sub = any(not _is_dub(item.title) for item in items)
-        has_dub = any(_is_dub(item.title) for item in items)
+        has_sub = any(not item.is_dub for item in items)
+        has_dub = any(item.is_dub for item in items)
         if prefix == "qu" and has_sub and has_dub:
             sub_token = hashlib.sha1(f"{token}|sub".encode()).hexdigest()[:12]
             dub_token = hashlib.sha1(f"{token}|dub".encode()).hexdigest()[:12]
-            astore = context.chat_data.setdefault("nyaa_audio_choice", {})
-            original_items_dict = context.chat_data.get("nyaa_quality_choice", {}).get(token, [])
-            astore[sub_token] = [d for d in original_items_dict if not _is_dub(d['title'])]
-            astore[dub_token] = [d for d in original_items_dict if _is_dub(d['title'])]
+            store.put_view("audio", sub_token, [item_id for item_id, item in entries if not item.is_dub])
+            store.put_view("audio", dub_token, [item_id for item_id, item in entries if item.is_dub])
             buttons = [InlineKeyboardButton("Sub", callback_data=f"ra::{sub_token}"), InlineKeyboardButton("Dub", callback_data=f"ra::{dub_token}")]
             await q.edit_message_text("🎤 Select audio type:", reply_markup=InlineKeyboardMarkup([buttons]))
         else:
             page_token = hashlib.sha1(f"{token}|p".encode()).hexdigest()[:12]
-            original_items_dict = context.chat_data.get(storage_key, {}).get(token, [])
-            context.chat_data.setdefault("nyaa_pages", {})[page_token] = original_items_dict
-            await q.edit_message_text(f"🔍 Found {len(items)} torrents:", reply_markup=_render_magnets_keyboard(context, items, page_token, 0))
-        return
-
-    if prefix == "rp":
-        page_s = parts[1]
-        page = int(page_s) if page_s.isdigit() else 0
-        await q.edit_message_reply_markup(reply_markup=_render_magnets_keyboard(context, items, token, max(0, page)))
+            cursor = _build_magnets_cursor(entries)
+            store.put_cursor(page_token, cursor)
+            await q.edit_message_text(f"🔍 Found {len(items)} torrents:", reply_markup=_render_magnets_keyboard(cursor, page_token, 0))
         return
 
     if prefix == "rm":
@@ -1,20 +1,15 @@
 from __future__ import annotations
+import asyncio
 import hashlib
-import pandas as pd
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from services.anilist import search_titles, fetch_details
+from services.seadex import get_index
 from fuzzywuzzy import process
 from utils.text import normalize_query, escape_html, sanitize_description
 
-# The load_index function is now defined here to fix the import error
-def load_index(csv_path: str) -> pd.DataFrame:
-    try:
-        df = pd.read_csv(csv_path, header=1)
-        df.set_index(df.columns[0], inplace=True)
-        return df
-    except FileNotFoundError:
-        return pd.DataFrame({'Title': [], 'Alternate Title': []})
+SUGGESTION_LIMIT = 3
+SUGGESTION_MIN_SCORE = 81
 
 async def on_message_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.message or not update.message.text: return
@@ -25,33 +20,30 @@ async def on_message_search(update: Update, context: ContextTypes.DEFAULT_TYPE)
         results = await search_titles(client, query)
 
         if not results:
-            try:
-                df = load_index("nyaabag/index_seadex.csv")
-                all_titles = pd.concat([df['Title'], df['Alternate Title']]).dropna().tolist()
-                suggestion, score = process.extractOne(query, all_titles)
-                
-                if score > 80:
-                    button = InlineKeyboardButton(
-                        text=f"Search for: {suggestion}",
-                        switch_inline_query_current_chat=suggestion
-                    )
-                    await update.message.reply_text(
-                        "No results found. Did you mean:",
-                        reply_markup=InlineKeyboardMarkup([[button]])
-                    )
-                else:
-                    await update.message.reply_text("No results found.")
-            except (FileNotFoundError, ValueError):
-                 await update.message.reply_text("No results found.")
+            # Matching runs off the event loop; the index itself is built once
+            suggestions = await asyncio.to_thread(
+                lambda: get_index().suggest(query, SUGGESTION_LIMIT, SUGGESTION_MIN_SCORE)
+            )
+            if suggestions:
+                buttons = [
+                    [InlineKeyboardButton(text=f"Search for: {title}", switch_inline_query_current_chat=title)]
+                    for title, _ in suggestions
+                ]
+                await update.message.reply_text(
+                    "No results found. Did you mean:",
+                    reply_markup=InlineKeyboardMarkup(buttons)
+                )
+            else:
+                await update.message.reply_text("No results found.")
             return
 
         items = []
         for m in results:
             display = m.title.english or m.title.romaji or m.title.native or str(m.id)
             candidates = list(filter(None, [m.title.english, m.title.romaji, m.title.native] + (m.synonyms or [])))
-            items.append((display, candidates))
+            items.append((display, candidates, m.id))
 
-        titles = [d for d, _ in items]
+        titles = [d for d, _, _ in items]
         choice, _ = process.extractOne(query, titles, score_cutoff=60) or (None, 0)
 
         if choice and choice in titles:
@@ -60,9 +52,9 @@ async def on_message_search(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
         store = context.chat_data.setdefault("title_tokens", {})
         buttons = []
-        for display, candidates in items[:10]:
+        for display, candidates, media_id in items[:10]:
             token = hashlib.sha1(display.encode("utf-8")).hexdigest()[:12]
-            store[token] = {"display": display, "queries": candidates}
+            store[token] = {"display": display, "queries": candidates, "media_id": media_id}
             buttons.append([InlineKeyboardButton(text=display, callback_data=f"t::{token}")])
         
         await update.message.reply_text("Select a title:", reply_markup=InlineKeyboardMarkup(buttons))
@@ -85,13 +77,16 @@ async def on_title_selected(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     await query.edit_message_text(f"Fetching details for: {display_title}…")
     client = context.application.bot_data.get("http_session")
-    ani = await search_titles(client, display_title)
-    media = ani[0] if ani else None
-    if not media:
+    media_id = token_entry.get("media_id")
+    if media_id is None:
+        # Tokens created before the id was stored alongside the title
+        ani = await search_titles(client, display_title)
+        media_id = ani[0].id if ani else None
+    if media_id is None:
         await query.edit_message_text("Could not fetch details. Please try another title.")
         return
 
-    details = await fetch_details(client, media.id)
+    details = await fetch_details(client, media_id)
     if not details:
         await query.edit_message_text("No details found.")
         return
@@ -105,7 +100,7 @@ async def on_title_selected(update: Update, context: ContextTypes.DEFAULT_TYPE)
     base_info_lines = [
         f"🎬 <b>{name}</b>",
         f"🗂️ Format: {escape_html(details.format or 'N/A')} | 📺 Status: {escape_html(details.status or 'N/A')}",
-        f"🎞️ Episodes: {details.episodes or 'N/A'} | ⏱️ Duration: {details.duration or 'N/A')} min",
+        f"🎞️ Episodes: {details.episodes or 'N/A'} | ⏱️ Duration: {details.duration or 'N/A'} min",
         f"📅 Season: {escape_html(details.season or 'N/A')} {details.seasonYear or ''}",
         f"⭐ Score: {details.averageScore or details.meanScore or 'N/A'}",
         f"🏷️ Genres: {escape_html(genres)}" if genres else "",
@@ -125,7 +120,7 @@ async def on_title_selected(update: Update, context: ContextTypes.DEFAULT_TYPE)
     info_lines = [
         f"🎬 <b>{name}</b>",
         f"🗂️ Format: {escape_html(details.format or 'N/A')} | 📺 Status: {escape_html(details.status or 'N/A')}",
-        f"🎞️ Episodes: {details.episodes or 'N/A'} | ⏱️ Duration: {details.duration or 'N/A')} min",
+        f"🎞️ Episodes: {details.episodes or 'N/A'} | ⏱️ Duration: {details.duration or 'N/A'} min",
         f"📅 Season: {escape_html(details.season or 'N/A')} {details.seasonYear or ''}",
         f"⭐ Score: {details.averageScore or details.meanScore or 'N/A'}",
         f"🏷️ Genres: {escape_html(genres)}" if genres else "",
@@ -1,14 +1,105 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import logging
 import httpx
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from pydantic import TypeAdapter
 
 from models import AniMedia, AniTitle, AniMediaDetails
+from utils.cache import TTLCache
+from utils.ratelimit import TokenBucket, parse_retry_after
 
 
 ANILIST_GRAPHQL_URL = "https://graphql.anilist.co"
+# AniList allows ~90 requests per minute; keep bursts small so spikes queue instead of 429ing
+ANILIST_RATE_PER_MINUTE = 90
+ANILIST_BURST = 10
+ANILIST_MAX_RETRIES = 3
+# Media(id:) lookups per aliased details query, well inside AniList's query complexity limit
+ANILIST_DETAILS_BATCH = 25
+
+# Search results change as new shows are added; details are stable for hours
+SEARCH_CACHE_TTL = 600
+DETAILS_CACHE_TTL = 6 * 3600
+
+search_cache: TTLCache[Tuple[str, bool], List[AniMedia]] = TTLCache(1024, SEARCH_CACHE_TTL)
+details_cache: TTLCache[int, AniMediaDetails] = TTLCache(4096, DETAILS_CACHE_TTL)
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_key(user_input: str, with_details: bool) -> Tuple[str, bool]:
+    # A search without details must not answer a later request that expects them cached
+    return " ".join(user_input.lower().split()), with_details
+
+
+class GraphQLScheduler:
+    """Sends GraphQL requests through a shared token bucket.
+
+    Identical requests that are already in flight share a single call, 429s are
+    retried after ``Retry-After`` instead of failing, and the rate-limit headers
+    of every response keep the bucket in sync with the server.
+    """
+
+    def __init__(
+        self, url: str, rate_per_minute: float = ANILIST_RATE_PER_MINUTE,
+        burst: int = ANILIST_BURST, max_retries: int = ANILIST_MAX_RETRIES
+    ) -> None:
+        self.url = url
+        self.bucket = TokenBucket(rate_per_minute / 60, burst)
+        self.max_retries = max_retries
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def execute(self, client: httpx.AsyncClient, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        key = json.dumps([query, variables], sort_keys=True)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._post(client, query, variables))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._inflight.pop(key, None) if self._inflight.get(key) is t else None)
+        return await asyncio.shield(task)
+
+    async def _post(self, client: httpx.AsyncClient, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        payload = {"query": query, "variables": variables}
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            resp = await client.post(self.url, json=payload, timeout=20)
+            self.bucket.observe(resp.headers)
+            if resp.status_code == 429 and attempt < self.max_retries:
+                attempt += 1
+                delay = parse_retry_after(resp.headers.get("Retry-After"), default=60)
+                logger.warning("AniList rate limit hit, retrying in %.1fs (attempt %d)", delay, attempt)
+                self.bucket.block_for(delay)
+                continue
+            resp.raise_for_status()
+            return resp.json()
+
+
+scheduler = GraphQLScheduler(ANILIST_GRAPHQL_URL)
+
+
+MEDIA_FIELDS = """
+    id
+    title { romaji english native }
+    synonyms
+    description(asHtml: false)
+    coverImage { large medium color }
+    bannerImage
+    siteUrl
+    format
+    status
+    episodes
+    duration
+    season
+    seasonYear
+    averageScore
+    meanScore
+    genres
+"""
 
 
 SEARCH_QUERY = """
@@ -23,14 +114,31 @@ query ($search: String) {
 }
 """
 
+# Batched mode: the same page with the details fields, so the title picker and
+# the details card for every candidate come from one round-trip.
+SEARCH_WITH_DETAILS_QUERY = """
+query ($search: String) {
+  Page(page: 1, perPage: 10) {
+    media(type: ANIME, search: $search, sort: [SEARCH_MATCH, POPULARITY_DESC]) {%s}
+  }
+}
+""" % MEDIA_FIELDS
+
 
-async def search_titles(client: httpx.AsyncClient, user_input: str) -> List[AniMedia]:
-    payload = {"query": SEARCH_QUERY, "variables": {"search": user_input}}
-    resp = await client.post(ANILIST_GRAPHQL_URL, json=payload, timeout=20)
-    resp.raise_for_status()
-    data = resp.json()
+async def search_titles(client: httpx.AsyncClient, user_input: str, with_details: bool = True) -> List[AniMedia]:
+    return await search_cache.fetch(_cache_key(user_input, with_details), lambda: _search_titles(client, user_input, with_details))
+
+
+async def _search_titles(client: httpx.AsyncClient, user_input: str, with_details: bool) -> List[AniMedia]:
+    query = SEARCH_WITH_DETAILS_QUERY if with_details else SEARCH_QUERY
+    data = await scheduler.execute(client, query, {"search": user_input})
     raw = data.get("data", {}).get("Page", {}).get("media", [])
 
+    if with_details:
+        for m in raw:
+            if m.get("id") is not None:
+                details_cache.set(m["id"], AniMediaDetails.model_validate(m))
+
     adapter = TypeAdapter(list[AniMedia])
     return adapter.validate_python([
         {
@@ -42,36 +150,85 @@ async def search_titles(client: httpx.AsyncClient, user_input: str) -> List[AniM
     ])
 
 
-DETAILS_QUERY = """
-query ($id: Int) {
-  Media(id: $id, type: ANIME) {
-    id
-    title { romaji english native }
-    description(asHtml: false)
-    coverImage { large medium color }
-    bannerImage
-    siteUrl
-    format
-    status
-    episodes
-    duration
-    season
-    seasonYear
-    averageScore
-    meanScore
-    genres
-  }
-}
-"""
+def details_alias(media_id: int) -> str:
+    return f"m{int(media_id)}"
+
+
+def build_details_batch_query(media_ids: List[int]) -> str:
+    """One GraphQL document with an aliased ``Media(id:)`` lookup per id."""
+    lookups = "".join(
+        f"  {details_alias(media_id)}: Media(id: {int(media_id)}, type: ANIME) {{{MEDIA_FIELDS}  }}\n"
+        for media_id in media_ids
+    )
+    return "query {\n" + lookups + "}\n"
+
+
+class _NoDetails(Exception):
+    """AniList returned no media; raised out of the loader so nothing is cached for the id."""
+
+
+class DetailsBatcher:
+    """Folds the details lookups made in one event-loop tick into aliased queries.
+
+    The first miss schedules a flush; every other id requested before it runs
+    joins the same document, up to ``batch_size`` ids per request. The flush
+    uses the first caller's client, which is the bot's shared session.
+    """
+
+    def __init__(self, batch_size: int = ANILIST_DETAILS_BATCH) -> None:
+        self.batch_size = batch_size
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._flushes: set = set()
+
+    async def fetch(self, client: httpx.AsyncClient, media_id: int) -> AniMediaDetails:
+        future = self._pending.get(media_id)
+        if future is None:
+            if not self._pending:
+                task = asyncio.create_task(self._flush(client))
+                self._flushes.add(task)
+                task.add_done_callback(self._flushes.discard)
+            future = self._pending[media_id] = asyncio.get_running_loop().create_future()
+        return await future
+
+    async def _flush(self, client: httpx.AsyncClient) -> None:
+        pending, self._pending = self._pending, {}
+        ids = list(pending)
+        for start in range(0, len(ids), self.batch_size):
+            chunk = ids[start:start + self.batch_size]
+            try:
+                response = await scheduler.execute(client, build_details_batch_query(chunk), {})
+            except Exception as e:
+                for media_id in chunk:
+                    _settle(pending[media_id], error=e)
+                continue
+            data = response.get("data") or {}
+            for media_id in chunk:
+                raw = data.get(details_alias(media_id))
+                if not raw:
+                    _settle(pending[media_id], error=_NoDetails(media_id))
+                    continue
+                try:
+                    # Pydantic validation to our model
+                    _settle(pending[media_id], AniMediaDetails.model_validate(raw))
+                except ValueError as e:
+                    _settle(pending[media_id], error=e)
+
+
+def _settle(future: asyncio.Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+    if future.done():
+        return  # the caller gave up
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+details_batcher = DetailsBatcher()
 
 
 async def fetch_details(client: httpx.AsyncClient, media_id: int) -> Optional[AniMediaDetails]:
-    payload = {"query": DETAILS_QUERY, "variables": {"id": media_id}}
-    resp = await client.post(ANILIST_GRAPHQL_URL, json=payload, timeout=20)
-    resp.raise_for_status()
-    data = resp.json().get("data", {}).get("Media")
-    if not data:
+    try:
+        return await details_cache.fetch(media_id, lambda: details_batcher.fetch(client, media_id))
+    except _NoDetails:
+        # Often a transient API hiccup; the next selection asks again instead of reading a cached miss for hours
         return None
-    # Pydantic validation to our model
-    return AniMediaDetails.model_validate(data)
-
@@ -1,96 +1,377 @@
 from __future__ import annotations
-import aria2p
-from typing import List, Optional
+import asyncio
+import itertools
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import httpx
+
+from config import ARIA2_HOST, ARIA2_PORT, ARIA2_SECRET
+from utils.text import format_bytes, format_duration
+
+logger = logging.getLogger(__name__)
+
+ARIA2_RPC_URL = f"{ARIA2_HOST}:{ARIA2_PORT}/jsonrpc"
+# Per-request deadline and keep-alive pool for the aria2c JSON-RPC connection
+RPC_TIMEOUT = 10.0
+RPC_MAX_CONNECTIONS = 4
+
+# tellStatus keys needed for progress messages and completion checks
+STATUS_KEYS = ["gid", "status", "totalLength", "completedLength", "downloadSpeed", "numSeeders", "errorMessage", "followedBy"]
+# ...plus per-file progress, for pipelines that act on each file as it completes
+FILE_STATUS_KEYS = STATUS_KEYS + ["dir", "files"]
+
+# Folders inside the download dir that belong to the bot, not to a torrent (the disk cache): cleanup never removes them
+protected_dirs: set = set()
+
+class AriaError(Exception):
+    """aria2c answered with a JSON-RPC error, or could not be reached."""
+    def __init__(self, message: str, code: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+
+class AriaClient:
+    """Async aria2c JSON-RPC client over one keep-alive connection pool.
+
+    Calls issued in the same event loop iteration are sent together as one
+    JSON-RPC batch, so concurrent callers share a round-trip.
+    """
+    def __init__(self, url: str = ARIA2_RPC_URL, secret: str = "", *, timeout: float = RPC_TIMEOUT, max_connections: int = RPC_MAX_CONNECTIONS):
+        self.url = url
+        self.secret = secret
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._http: Optional[httpx.AsyncClient] = None
+        self._ids = itertools.count(1)
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._flush_scheduled = False
+        self._sending: set = set()
+
+    def _session(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+        return self._http
+
+    def _params(self, method: str, params: Sequence[Any]) -> List[Any]:
+        params = list(params)
+        if self.secret:
+            token = f"token:{self.secret}"
+            if method.startswith("aria2."):
+                params.insert(0, token)
+            elif method == "system.multicall":
+                params = [[{**call, "params": [token, *call.get("params", [])]} for call in params[0]]]
+        return params
+
+    async def call(self, method: str, *params: Any) -> Any:
+        """Call one aria2 method and return its result; raises AriaError."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        request = {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": self._params(method, params)}
+        self._pending.append((request, future))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            loop.call_soon(self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, []
+        task = asyncio.create_task(self._send(pending))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, pending: List[Tuple[dict, asyncio.Future]]) -> None:
+        payload = [request for request, _ in pending] if len(pending) > 1 else pending[0][0]
+        error = AriaError("aria2c RPC aborted")
+        try:
+            # aria2c reports RPC errors with a 4xx status and a JSON body, so the status code is not checked
+            response = await self._session().post(self.url, json=payload)
+            replies = response.json()
+            by_id = {reply.get("id"): reply for reply in (replies if isinstance(replies, list) else [replies])}
+            for request, future in pending:
+                if future.done():
+                    continue  # the caller gave up
+                reply = by_id.get(request["id"])
+                if reply is None:
+                    future.set_exception(AriaError(f"No reply to {request['method']}"))
+                elif "error" in reply:
+                    future.set_exception(AriaError(reply["error"].get("message", "unknown error"), reply["error"].get("code")))
+                else:
+                    future.set_result(reply.get("result"))
+        except (httpx.HTTPError, ValueError) as e:
+            error = AriaError(f"aria2c RPC failed: {e!r}")
+        finally:
+            # Whatever went wrong, cancellation included, no caller is left waiting on its future
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(error)
+
+    async def close(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
 
 # Setup the connection to the aria2c RPC server
-# This assumes the bot and aria2c are running on the same machine.
-# If they are on different machines, change 'host' and 'port' accordingly.
-api = aria2p.API(
-    aria2p.Client(
-        host="http://127.0.0.1",
-        port=6800,
-        secret=""
-    )
-)
+# Defaults to an aria2c on the same machine; set ARIA2_HOST/ARIA2_PORT otherwise.
+client = AriaClient(ARIA2_RPC_URL, ARIA2_SECRET)
+
+class AriaFile(NamedTuple):
+    index: int
+    path: str
+    length: int
+    completed_length: int
+    selected: bool
+
+    @classmethod
+    def from_struct(cls, struct: dict) -> "AriaFile":
+        return cls(
+            index=int(struct.get("index", 0)),
+            path=struct.get("path", ""),
+            length=int(struct.get("length", 0)),
+            completed_length=int(struct.get("completedLength", 0)),
+            selected=struct.get("selected", "true") == "true",
+        )
+
+    @property
+    def is_complete(self) -> bool:
+        return self.length > 0 and self.completed_length >= self.length
+
+class AriaStatus(NamedTuple):
+    """Immutable copy of one ``tellStatus`` reply."""
+    gid: str
+    status: str
+    total_length: int
+    completed_length: int
+    download_speed: int
+    num_seeders: int
+    error_message: str
+    followed_by_ids: Tuple[str, ...]
+    dir: str = ""
+    files: Tuple[AriaFile, ...] = ()
+
+    @classmethod
+    def from_struct(cls, struct: dict) -> "AriaStatus":
+        return cls(
+            gid=struct.get("gid", ""),
+            status=struct.get("status", ""),
+            total_length=int(struct.get("totalLength", 0)),
+            completed_length=int(struct.get("completedLength", 0)),
+            download_speed=int(struct.get("downloadSpeed", 0)),
+            num_seeders=int(struct.get("numSeeders", 0)),
+            error_message=struct.get("errorMessage") or "",
+            followed_by_ids=tuple(struct.get("followedBy", ())),
+            dir=struct.get("dir", ""),
+            files=tuple(AriaFile.from_struct(f) for f in struct.get("files", ())),
+        )
+
+    @property
+    def is_complete(self) -> bool:
+        return self.status == "complete"
+
+    @property
+    def progress(self) -> float:
+        return self.completed_length / self.total_length * 100 if self.total_length else 0.0
+
+    @property
+    def progress_string(self) -> str:
+        return f"{self.progress:.2f}%"
+
+    @property
+    def download_speed_string(self) -> str:
+        return format_bytes(self.download_speed, "/s")
+
+    @property
+    def eta(self) -> str:
+        """Human-readable ETA, ``-`` while nothing is being received."""
+        if not self.download_speed:
+            return "-"
+        return format_duration((self.total_length - self.completed_length) // self.download_speed)
 
 class AriaDownload:
-    """A class to represent and manage an aria2 download."""
-    def __init__(self, download: aria2p.Download):
-        self._download = download
+    """A class to represent and manage an aria2 download.
+
+    Properties read the state fetched by the last ``update()``; call it to refresh.
+    """
+    def __init__(self, struct: dict, rpc: AriaClient = client):
+        self._struct = struct
+        self._rpc = rpc
 
-    def update(self):
+    async def update(self):
         """Refreshes the download object with the latest data from aria2c."""
-        self._download.update()
+        self._struct = await self._rpc.call("aria2.tellStatus", self.gid)
+
+    async def snapshot(self, keys: Sequence[str] = STATUS_KEYS) -> AriaStatus:
+        """Fetch only ``keys`` in a single tellStatus call."""
+        return AriaStatus.from_struct(await self._rpc.call("aria2.tellStatus", self.gid, list(keys)))
 
     @property
     def gid(self) -> str:
-        return self._download.gid
+        return self._struct["gid"]
 
     @property
     def name(self) -> str:
-        return self._download.name
+        info = self._struct.get("bittorrent", {}).get("info")
+        if info and info.get("name"):
+            return info["name"]
+        files = self.files
+        return Path(files[0].path).name if files and files[0].path else self.gid
+
+    @property
+    def dir(self) -> str:
+        return self._struct.get("dir", "")
+
+    @property
+    def status(self) -> str:
+        """aria2 status: active, waiting, paused, error, complete or removed."""
+        return self._struct.get("status", "")
 
     @property
     def is_complete(self) -> bool:
-        self.update()
-        return self._download.is_complete
+        return self.status == "complete"
 
     @property
     def progress(self) -> float:
-        self.update()
-        return self._download.progress
+        return AriaStatus.from_struct(self._struct).progress
 
     @property
     def progress_string(self) -> str:
-        self.update()
-        return self._download.progress_string()
+        return AriaStatus.from_struct(self._struct).progress_string
 
     @property
     def eta(self) -> str:
         """Human-readable ETA string for the download."""
-        self.update()
-        try:
-            return self._download.eta_string()
-        except Exception:
-            return "unknown"
-            
+        return AriaStatus.from_struct(self._struct).eta
+
     @property
     def download_speed(self) -> str:
         """Human-readable download speed string."""
-        self.update()
-        return self._download.download_speed_string()
+        return AriaStatus.from_struct(self._struct).download_speed_string
 
     @property
     def num_seeders(self) -> int:
         """Number of seeders connected to the download."""
-        self.update()
-        return self._download.num_seeders
+        return int(self._struct.get("numSeeders", 0))
+
+    @property
+    def files(self) -> List[AriaFile]:
+        return [AriaFile.from_struct(f) for f in self._struct.get("files", [])]
+
+    @property
+    def piece_length(self) -> int:
+        """Torrent piece size in bytes, 0 before the metadata is known."""
+        return int(self._struct.get("pieceLength", 0))
+
+    @property
+    def followed_by_ids(self) -> List[str]:
+        """GIDs started from this one, e.g. the real torrent after a magnet's metadata."""
+        return list(self._struct.get("followedBy", []))
 
     @property
-    def files(self) -> List[aria2p.File]:
-        self.update()
-        return self._download.files
+    def error_message(self) -> str:
+        return self._struct.get("errorMessage") or ""
+
+    async def select_files(self, indexes: Sequence[int]) -> None:
+        """Download only these files (1-based aria2 indexes); the rest are skipped."""
+        await self._rpc.call("aria2.changeOption", self.gid, {"select-file": ",".join(map(str, sorted(indexes)))})
 
-    def remove(self, clean: bool = True) -> bool:
+    async def unpause(self) -> None:
+        await self._rpc.call("aria2.unpause", self.gid)
+
+    async def remove(self, clean: bool = True) -> bool:
         """Removes the download from aria2c.
         If clean is True, it also deletes the downloaded files.
         """
-        return self._download.remove(files=clean)
+        if self.status in ("active", "waiting", "paused"):
+            try:
+                await self._rpc.call("aria2.remove", self.gid)
+            except AriaError:
+                pass  # stopped since the last update()
+        try:
+            await self._rpc.call("aria2.removeDownloadResult", self.gid)
+        except AriaError:
+            pass  # removal of an active download finishes asynchronously in aria2c
+        if clean:
+            await asyncio.to_thread(self._remove_files)
+        return True
+
+    def _remove_files(self) -> None:
+        """Delete the files aria2 lists for this download and its .aria2 control file, then the folders they leave empty.
+
+        Nothing outside the download dir is touched, and a folder is only ever
+        removed once empty, so a torrent whose top folder shares a name with
+        something else under the download dir cannot take it along.
+        """
+        root = Path(self._struct.get("dir", ".")).resolve()
+        keep = {root} | {Path(p).resolve() for p in protected_dirs}
+        folders = set()
+        paths = [Path(f.path).resolve() for f in self.files if f.path and not f.path.startswith("[METADATA]")]
+        info = self._struct.get("bittorrent", {}).get("info") or {}
+        if info.get("name"):
+            paths.append((root / (info["name"] + ".aria2")).resolve())
+        else:
+            paths.extend(path.with_name(path.name + ".aria2") for path in list(paths))
+        for path in paths:
+            if root not in path.parents or path in keep:
+                logger.warning("Not deleting %s for %s: not a file of this download under %s", path, self.gid, root)
+                continue
+            try:
+                path.unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning("Could not delete %s: %s", path, e)
+                continue
+            folders.update(parent for parent in path.parents if root in parent.parents)
+        for folder in sorted(folders, key=lambda p: len(p.parts), reverse=True):
+            if folder in keep:
+                continue
+            try:
+                folder.rmdir()
+            except OSError:
+                pass  # not empty: other files live there
+
+async def add_magnet(magnet_uri: str, options: Optional[Dict[str, str]] = None) -> Optional[AriaDownload]:
+    """Adds a magnet link to aria2c for downloading, with optional per-download aria2 options."""
+    try:
+        gid = await client.call("aria2.addUri", [magnet_uri], options or {})
+        return AriaDownload(await client.call("aria2.tellStatus", gid))
+    except AriaError as e:
+        logger.warning("Failed to add magnet link to aria2c: %s", e)
+        return None
+
+async def get_status(gid: str, keys: Sequence[str] = STATUS_KEYS) -> Optional[AriaStatus]:
+    """One-call status snapshot of a download by its GID."""
+    try:
+        return AriaStatus.from_struct(await client.call("aria2.tellStatus", gid, list(keys)))
+    except AriaError as e:
+        logger.warning("Failed to get status of %s from aria2c: %s", gid, e)
+        return None
+
+async def get_statuses(gids: Sequence[str], keys: Sequence[str] = STATUS_KEYS) -> Optional[Dict[str, Optional[AriaStatus]]]:
+    """Snapshots of many downloads in one ``system.multicall`` round-trip.
 
-def add_magnet(magnet_uri: str) -> Optional[AriaDownload]:
-    """Adds a magnet link to aria2c for downloading."""
+    GIDs aria2c no longer knows map to None; None overall if the call itself failed.
+    """
+    if not gids:
+        return {}
+    calls = [{"methodName": "aria2.tellStatus", "params": [gid, list(keys)]} for gid in gids]
     try:
-        download = api.add_magnet(magnet_uri)
-        return AriaDownload(download)
-    except Exception as e:
-        print(f"Failed to add magnet link to aria2c: {e}")
+        replies = await client.call("system.multicall", calls)
+    except AriaError as e:
+        logger.warning("Failed to get status of %d downloads from aria2c: %s", len(gids), e)
         return None
+    # Each reply is a one-item list on success or a fault struct on failure
+    return {
+        gid: AriaStatus.from_struct(reply[0]) if isinstance(reply, list) else None
+        for gid, reply in zip(gids, replies)
+    }
 
-def get_download(gid: str) -> Optional[AriaDownload]:
+async def get_download(gid: str) -> Optional[AriaDownload]:
     """Gets a download by its GID (Group ID)."""
     try:
-        download = api.get_download(gid)
-        return AriaDownload(download)
-    except Exception as e:
-        print(f"Failed to get download {gid} from aria2c: {e}")
+        return AriaDownload(await client.call("aria2.tellStatus", gid))
+    except AriaError as e:
+        logger.warning("Failed to get download %s from aria2c: %s", gid, e)
         return None
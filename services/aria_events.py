@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Callable, Optional
+
+import websockets
+
+from config import ARIA2_HOST, ARIA2_PORT
+
+logger = logging.getLogger(__name__)
+
+ARIA2_WS_URL = f"{ARIA2_HOST.replace('http', 'ws', 1)}:{ARIA2_PORT}/jsonrpc"
+RECONNECT_DELAY = 1.0
+RECONNECT_MAX_DELAY = 30.0
+
+COMPLETE = "complete"
+ERROR = "error"
+
+# aria2 notification method -> event passed to the handler
+NOTIFICATION_EVENTS = {
+    "aria2.onDownloadComplete": COMPLETE,
+    "aria2.onBtDownloadComplete": COMPLETE,
+    "aria2.onDownloadError": ERROR,
+}
+
+EventHandler = Callable[[str, str], None]
+
+
+class AriaEventListener:
+    """One WebSocket to aria2c that turns download notifications into handler calls.
+
+    ``on_event(gid, event)`` runs on the event loop for every complete/error
+    notification. The socket is re-opened with backoff when it drops;
+    notifications sent while it is down are lost, so callers should still
+    check status now and then.
+    """
+
+    def __init__(self, on_event: EventHandler, url: str = ARIA2_WS_URL) -> None:
+        self.url = url
+        self._on_event = on_event
+        self._task: Optional[asyncio.Task] = None
+        self.connected = asyncio.Event()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="aria2-events")
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def dispatch(self, raw: str | bytes) -> None:
+        """Handle one message from the socket; anything but a known notification is ignored."""
+        try:
+            message = json.loads(raw)
+            event = NOTIFICATION_EVENTS.get(message.get("method"))
+            gid = message["params"][0]["gid"] if event else None
+        except (ValueError, AttributeError, LookupError, TypeError):
+            logger.debug("Ignoring malformed aria2 message: %r", raw)
+            return
+        if not gid:
+            return
+        try:
+            self._on_event(gid, event)
+        except Exception:
+            logger.exception("aria2 %s handler failed for GID %s", event, gid)
+
+    async def _run(self) -> None:
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                async with websockets.connect(self.url, ping_interval=20, ping_timeout=20) as ws:
+                    logger.info("Listening for aria2 notifications on %s", self.url)
+                    delay = RECONNECT_DELAY
+                    self.connected.set()
+                    async for raw in ws:
+                        self.dispatch(raw)
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+                logger.warning("aria2 notification socket unavailable (%s), retrying in %.1fs", e, delay)
+            finally:
+                self.connected.clear()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
@@ -0,0 +1,134 @@
+from __future__ import annotations
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Tuple
+import httpx
+from config import NYAA_BACKEND
+from services.nyaa_html import HtmlTorrent, SearchPage, search_nyaa_html
+from services.nyaa_rss import search_nyaa_rss
+from utils.cache import TTLCache
+
+# A search backend fetches one result page: (client, query, category, filters, page) -> SearchPage
+SearchBackend = Callable[[httpx.AsyncClient, str, str, str, int], Awaitable[SearchPage]]
+
+BACKENDS: Dict[str, SearchBackend] = {
+    "html": search_nyaa_html,
+    "rss": search_nyaa_rss,
+}
+# Nyaa's RSS view always returns the newest items and ignores the page number
+PAGINATED_BACKENDS = {"html"}
+
+NYAA_PAGE_SIZE = 75
+# Multi-page crawl: pages 2..CRAWL_MAX_PAGES are fetched CRAWL_CONCURRENCY at a time
+CRAWL_MAX_PAGES = 5
+CRAWL_CONCURRENCY = 2
+
+# Search result cache: fresh for SEARCH_CACHE_TTL, then served stale for up to
+# SEARCH_CACHE_STALE_TTL more seconds while a background refresh runs.
+SEARCH_CACHE_TTL = 300
+SEARCH_CACHE_STALE_TTL = 1800
+SEARCH_CACHE_MAX_ENTRIES = 512
+SEARCH_CACHE_MAX_BYTES = 32 * 1024**2
+
+logger = logging.getLogger(__name__)
+
+def get_backend(name: str | None = None) -> str:
+    """Resolve a backend name, falling back to HTML for unknown config values."""
+    name = (name or NYAA_BACKEND).lower()
+    if name not in BACKENDS:
+        logger.warning("Unknown NYAA_BACKEND %r, using html", name)
+        return "html"
+    return name
+
+def _estimate_page_size(page: SearchPage) -> int:
+    # Rough per-entry footprint used for the cache byte budget
+    return 64 + sum(96 + len(r.title) + len(r.magnet) + len(r.size_str or "") for r in page.torrents)
+
+search_cache: TTLCache[tuple, SearchPage] = TTLCache(
+    SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_TTL, stale_ttl=SEARCH_CACHE_STALE_TTL,
+    max_bytes=SEARCH_CACHE_MAX_BYTES, sizeof=_estimate_page_size
+)
+
+def search_cache_stats() -> Dict[str, int]:
+    return search_cache.stats()
+
+async def search_nyaa_page(
+    client: httpx.AsyncClient, query: str, category: str = "1_2",
+    filters: str = "2", page: int = 1, backend: str | None = None
+) -> SearchPage:
+    """Cached Nyaa search through the configured backend."""
+    name = get_backend(backend)
+    fetch = BACKENDS[name]
+    key = (name, " ".join(query.lower().split()), category, filters, page)
+    result = await search_cache.fetch(key, lambda: fetch(client, query, category, filters, page))
+    # Cached pages are shared between chats, hand out a copy of the list
+    return SearchPage(list(result.torrents), result.row_count)
+
+async def search_nyaa(
+    client: httpx.AsyncClient, query: str, category: str = "1_2",
+    filters: str = "2", page: int = 1, backend: str | None = None
+) -> List[HtmlTorrent]:
+    return (await search_nyaa_page(client, query, category, filters, page, backend)).torrents
+
+async def crawl_nyaa(
+    client: httpx.AsyncClient, query: str, category: str = "1_2", filters: str = "2",
+    max_pages: int = CRAWL_MAX_PAGES, target: int | None = None,
+    concurrency: int = CRAWL_CONCURRENCY, backend: str | None = None
+) -> AsyncIterator[Tuple[int, List[HtmlTorrent]]]:
+    """Yield ``(page number, torrents)`` as pages land, page 1 first.
+
+    Page 1 tells whether there is more to fetch; pages 2..max_pages are then
+    requested concurrently. Crawling stops at the first short page or once
+    ``target`` torrents have been yielded.
+    """
+    name = get_backend(backend)
+    first = await search_nyaa_page(client, query, category, filters, 1, name)
+    yield 1, first.torrents
+    found = len(first.torrents)
+    if name not in PAGINATED_BACKENDS or max_pages <= 1:
+        return
+    if first.row_count < NYAA_PAGE_SIZE or (target is not None and found >= target):
+        return
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    last_page = max_pages  # lowered by a short page: nothing exists past it
+
+    async def fetch(page: int) -> tuple[int, SearchPage | None]:
+        nonlocal last_page
+        async with semaphore:
+            # A page that got its slot after a short one landed is not requested at all
+            if page > last_page:
+                return page, None
+            result = await search_nyaa_page(client, query, category, filters, page, name)
+            if result.row_count < NYAA_PAGE_SIZE:
+                last_page = min(last_page, page)
+            return page, result
+
+    # tasks[i] fetches page i + 2
+    tasks = [asyncio.create_task(fetch(page)) for page in range(2, max_pages + 1)]
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.cancelled():
+                    continue
+                if task.exception() is not None:
+                    logger.warning("Nyaa page fetch for %r failed: %s", query, task.exception())
+                    continue
+                page, result = task.result()
+                if result is None:
+                    continue
+                yield page, result.torrents
+                found += len(result.torrents)
+                if result.row_count < NYAA_PAGE_SIZE:
+                    # Nothing exists past a short page
+                    beyond = tasks[page - 1:]
+                    for later in beyond:
+                        later.cancel()
+                    pending.difference_update(beyond)
+                if target is not None and found >= target:
+                    return
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -1,22 +1,59 @@
 from __future__ import annotations
-import re
-from typing import List, Dict
+from typing import List, Dict, NamedTuple
 import httpx
 from lxml import html
-from pydantic import BaseModel
 from collections import defaultdict
+from config import NYAA_BASE_URL, TELEGRAM_FILE_LIMIT_BYTES
+from utils.release_title import ReleaseInfo, parse_release_title
 
-TELEGRAM_FILE_LIMIT_BYTES = 2147483648
-_RES_RE = re.compile(r"(?i)(2160p|1440p|1080p|720p|480p)")
+NO_EPISODE = 9999  # sort key for releases without an episode number
 
-class HtmlTorrent(BaseModel):
-    title: str
-    magnet: str
-    size_str: str | None = None
-    size_bytes: int | None = None
-    resolution: str | None = None
-    is_too_large: bool = False
-    seeders: int = 0 # New field for seeder count
+class HtmlTorrent:
+    """One Nyaa result. Title-derived features are computed once, at parse time."""
+
+    __slots__ = (
+        "title", "magnet", "size_str", "size_bytes", "resolution", "is_too_large", "seeders",
+        "info", "release_group", "episode", "is_dub", "dedupe_key",
+    )
+
+    def __init__(
+        self, title: str, magnet: str, size_str: str | None = None, size_bytes: int | None = None,
+        resolution: str | None = None, is_too_large: bool = False, seeders: int = 0
+    ) -> None:
+        info: ReleaseInfo = parse_release_title(title)
+        self.title = title
+        self.magnet = magnet
+        self.size_str = size_str
+        self.size_bytes = size_bytes
+        self.resolution = resolution if resolution is not None else info.resolution
+        self.is_too_large = is_too_large
+        self.seeders = seeders
+        self.info = info
+        self.release_group = info.group or "Unknown"
+        self.episode = info.episode if info.episode is not None else NO_EPISODE
+        self.is_dub = info.is_dub
+        # Same group, show, episode span, quality and audio means the same release
+        self.dedupe_key = (
+            (info.group or "").lower(), info.title.lower(), info.season,
+            info.episode, info.episode_end, info.resolution, info.is_dub
+        )
+
+    def as_dict(self) -> Dict[str, object]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, HtmlTorrent) and self.as_dict() == other.as_dict()
+
+    def __hash__(self) -> int:
+        # Everything else is derived from the title, so equal torrents hash alike
+        return hash((self.title, self.magnet, self.size_str, self.size_bytes, self.resolution, self.is_too_large, self.seeders))
+
+    def __repr__(self) -> str:
+        return f"HtmlTorrent(title={self.title!r}, size_str={self.size_str!r}, seeders={self.seeders})"
+
+class SearchPage(NamedTuple):
+    torrents: List[HtmlTorrent]
+    row_count: int  # rows on the page before filtering, used to spot the last page
 
 def _parse_size_to_bytes(s: str) -> int | None:
     s = s.strip().upper()
@@ -29,60 +66,70 @@ def _parse_size_to_bytes(s: str) -> int | None:
     return None
 
 def _extract_resolution(title: str) -> str | None:
-    match = _RES_RE.search(title)
-    return match.group(1) if match else None
+    return parse_release_title(title).resolution
 
 def is_likely_bundle(title: str) -> bool:
-    lower_title = title.lower()
-    if any(keyword in lower_title for keyword in ["batch", "season", "complete", "s0", "episodes"]):
-        return True
-    if re.search(r'\d{1,4}\s*[-~]\s*\d{1,4}', lower_title):
-        return True
-    if "movie" in lower_title:
-        return False
-    return False
+    return parse_release_title(title).is_batch
+
+def build_torrent(title: str, magnet: str, size_str: str, seeders: int) -> HtmlTorrent:
+    """Shared row -> HtmlTorrent step for every search backend.
+
+    Oversized single files are kept: they are uploaded in parts.
+    """
+    size_bytes = _parse_size_to_bytes(size_str)
+    is_too_large = (size_bytes is None) or (size_bytes > TELEGRAM_FILE_LIMIT_BYTES)
+
+    return HtmlTorrent(
+        title=title, magnet=magnet, size_str=size_str,
+        size_bytes=size_bytes, resolution=_extract_resolution(title),
+        is_too_large=is_too_large, seeders=seeders
+    )
 
 async def search_nyaa_html(
     client: httpx.AsyncClient, query: str, category: str = "1_2",
     filters: str = "2", page: int = 1
-) -> List[HtmlTorrent]:
+) -> SearchPage:
     params = {"q": query, "c": category, "f": filters, "p": page}
     headers = {"User-Agent": "animedlbot/1.0"}
     
-    resp = await client.get("https://nyaa.si/", params=params, timeout=20, headers=headers)
+    resp = await client.get(NYAA_BASE_URL, params=params, timeout=20, headers=headers)
     resp.raise_for_status()
+    return parse_nyaa_html(resp.text)
 
-    doc = html.fromstring(resp.text)
-    results: List[HtmlTorrent] = []
+def _parse_row(cells: list) -> HtmlTorrent | None:
+    # Nyaa columns: category, name, links, size, date, seeders, leechers, downloads
+    if len(cells) < 6: return None
 
-    for tr in doc.xpath("//table[contains(@class,'torrent-list')]//tbody//tr"):
-        title_links = tr.xpath(".//td[2]//a[not(contains(@class,'comments'))]")
-        if not title_links: continue
-        title_text = title_links[-1].text_content().strip()
-
-        magnet_link = tr.xpath(".//a[starts-with(@href,'magnet:')]/@href")
-        if not magnet_link: continue
-        
-        size_str = tr.xpath(".//td[4]/text()")[0].strip() if tr.xpath(".//td[4]/text()") else "Unknown"
-        
-        # Scrape seeder count
-        seeders_text = tr.xpath(".//td[6]/text()")
-        seeders = int(seeders_text[0].strip()) if seeders_text else 0
-
-        size_bytes = _parse_size_to_bytes(size_str)
-        is_too_large = (size_bytes is None) or (size_bytes > TELEGRAM_FILE_LIMIT_BYTES)
-
-        if is_too_large and not is_likely_bundle(title_text):
-            continue
-
-        results.append(
-            HtmlTorrent(
-                title=title_text, magnet=magnet_link[0], size_str=size_str,
-                size_bytes=size_bytes, resolution=_extract_resolution(title_text),
-                is_too_large=is_too_large, seeders=seeders
-            )
-        )
-    return results
+    title_text = None
+    for a in cells[1].iter("a"):
+        if "comments" not in (a.get("class") or ""):
+            title_text = a.text_content()
+    if not title_text: return None
+    title_text = title_text.strip()
+
+    magnet = None
+    for a in cells[2].iter("a"):
+        href = a.get("href") or ""
+        if href.startswith("magnet:"):
+            magnet = href
+            break
+    if not magnet: return None
+
+    size_str = (cells[3].text or "").strip() or "Unknown"
+    seeders_text = (cells[5].text or "").strip()
+    seeders = int(seeders_text) if seeders_text.isdigit() else 0
+    return build_torrent(title_text, magnet, size_str, seeders)
+
+def parse_nyaa_html(text: str) -> SearchPage:
+    """Parse a Nyaa listing page, reading each row's cells exactly once."""
+    doc = html.fromstring(text)
+    results: List[HtmlTorrent] = []
+    rows = doc.xpath("//table[contains(@class,'torrent-list')]//tbody//tr")
+    for tr in rows:
+        torrent = _parse_row(tr.findall("td"))
+        if torrent is not None:
+            results.append(torrent)
+    return SearchPage(results, len(rows))
 
 def group_by_resolution(torrents: list[HtmlTorrent]) -> Dict[str, list[HtmlTorrent]]:
     groups: Dict[str, list[HtmlTorrent]] = defaultdict(list)
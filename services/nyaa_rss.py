@@ -0,0 +1,77 @@
+from __future__ import annotations
+from typing import List
+from urllib.parse import quote
+import httpx
+from lxml import etree
+from config import NYAA_BASE_URL
+from services.nyaa_html import HtmlTorrent, SearchPage, build_torrent
+
+_NYAA_NS = "{https://nyaa.si/xmlns/nyaa}"
+# Trackers Nyaa puts in its own magnet links; the feed only carries the infohash
+NYAA_TRACKERS = (
+    "http://nyaa.tracker.wf:7777/announce",
+    "udp://open.stealth.si:80/announce",
+    "udp://tracker.opentrackr.org:1337/announce",
+    "udp://exodus.desync.com:6969/announce",
+    "udp://tracker.torrent.eu.org:451/announce",
+)
+
+def build_magnet(info_hash: str, title: str) -> str:
+    trackers = "".join(f"&tr={quote(tr, safe='')}" for tr in NYAA_TRACKERS)
+    return f"magnet:?xt=urn:btih:{info_hash.lower()}&dn={quote(title, safe='')}{trackers}"
+
+def _parse_item(item: etree._Element) -> HtmlTorrent | None:
+    title = (item.findtext("title") or "").strip()
+    info_hash = (item.findtext(f"{_NYAA_NS}infoHash") or "").strip()
+    if not title or not info_hash: return None
+    size_str = (item.findtext(f"{_NYAA_NS}size") or "").strip() or "Unknown"
+    seeders_text = (item.findtext(f"{_NYAA_NS}seeders") or "").strip()
+    seeders = int(seeders_text) if seeders_text.isdigit() else 0
+    return build_torrent(title, build_magnet(info_hash, title), size_str, seeders)
+
+class RssFeedParser:
+    """Incremental Nyaa RSS parser: feed it chunks, collect items as they close."""
+
+    def __init__(self) -> None:
+        self._parser = etree.XMLPullParser(events=("end",), tag="item", resolve_entities=False, no_network=True)
+        self.results: List[HtmlTorrent] = []
+        self.item_count = 0
+
+    def feed(self, chunk: bytes) -> None:
+        self._parser.feed(chunk)
+        self._drain()
+
+    def close(self) -> SearchPage:
+        self._parser.close()
+        self._drain()
+        return SearchPage(self.results, self.item_count)
+
+    def _drain(self) -> None:
+        for _, item in self._parser.read_events():
+            self.item_count += 1
+            torrent = _parse_item(item)
+            if torrent is not None:
+                self.results.append(torrent)
+            # Drop parsed items so the tree never holds the whole feed
+            item.clear()
+            parent = item.getparent()
+            if parent is not None:
+                parent.remove(item)
+
+def parse_nyaa_rss(data: bytes) -> SearchPage:
+    parser = RssFeedParser()
+    parser.feed(data)
+    return parser.close()
+
+async def search_nyaa_rss(
+    client: httpx.AsyncClient, query: str, category: str = "1_2",
+    filters: str = "2", page: int = 1
+) -> SearchPage:
+    params = {"page": "rss", "q": query, "c": category, "f": filters, "p": page}
+    headers = {"User-Agent": "animedlbot/1.0"}
+    parser = RssFeedParser()
+    async with client.stream("GET", NYAA_BASE_URL, params=params, timeout=20, headers=headers) as resp:
+        resp.raise_for_status()
+        async for chunk in resp.aiter_bytes():
+            parser.feed(chunk)
+    return parser.close()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import List, Tuple
+
+import pandas as pd
+
+try:
+    from rapidfuzz import fuzz, process
+    _HAS_RAPIDFUZZ = True
+except ImportError:  # pure-Python fallback, same scorer
+    from fuzzywuzzy import fuzz, process
+    _HAS_RAPIDFUZZ = False
+
+SEADEX_INDEX_PATH = "nyaabag/index_seadex.csv"
+
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+def normalize_title(text: str) -> str:
+    """Lowercase, replace punctuation with spaces and collapse whitespace."""
+    return " ".join(_NON_WORD_RE.sub(" ", text.lower()).split())
+
+
+class SeadexIndex:
+    """SeaDex titles preprocessed once for repeated fuzzy matching."""
+
+    def __init__(self, titles: List[str]) -> None:
+        self.titles: List[str] = []
+        self.choices: List[str] = []
+        seen = set()
+        for title in titles:
+            normalized = normalize_title(title)
+            if not normalized or normalized in seen:
+                continue
+            seen.add(normalized)
+            self.titles.append(title.strip())
+            self.choices.append(normalized)
+
+    @classmethod
+    def from_csv(cls, csv_path: str) -> "SeadexIndex":
+        try:
+            df = pd.read_csv(csv_path, header=1, usecols=["Title", "Alternate Title"])
+        except FileNotFoundError:
+            return cls([])
+        titles = pd.concat([df["Title"], df["Alternate Title"]]).dropna().astype(str).tolist()
+        return cls(titles)
+
+    def __len__(self) -> int:
+        return len(self.choices)
+
+    def suggest(self, query: str, limit: int = 3, score_cutoff: int = 0) -> List[Tuple[str, int]]:
+        """Top ``limit`` ``(title, score)`` pairs for ``query``, best first."""
+        normalized = normalize_title(query)
+        if not normalized or not self.choices:
+            return []
+        if _HAS_RAPIDFUZZ:
+            matches = process.extract(
+                normalized, self.choices, scorer=fuzz.WRatio, processor=None,
+                limit=limit, score_cutoff=score_cutoff
+            )
+            return [(self.titles[idx], int(round(score))) for _, score, idx in matches]
+        matches = process.extract(
+            normalized, dict(enumerate(self.choices)), scorer=fuzz.WRatio,
+            processor=lambda choice: choice, limit=limit
+        )
+        return [(self.titles[idx], score) for _, score, idx in matches if score >= score_cutoff]
+
+
+@lru_cache(maxsize=1)
+def get_index(csv_path: str = SEADEX_INDEX_PATH) -> SeadexIndex:
+    """The process-wide index, parsed on first use."""
+    return SeadexIndex.from_csv(csv_path)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The bot runs from the repository root; import its modules the same way
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,26 @@
+"""The release-title corpus: Nyaa names and the fields ``parse_release_title`` must extract.
+
+Shared by test_release_title.py and benchmarks/bench_release_title.py.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+
+CORPUS = Path(__file__).resolve().parents[1] / "benchmarks" / "fixtures" / "release_titles.tsv"
+FIELDS = ("group", "title", "season", "episode", "episode_end", "resolution", "is_batch", "is_dub", "version")
+
+
+def load_corpus() -> list[tuple[str, dict[str, str]]]:
+    rows = []
+    for line in CORPUS.read_text(encoding="utf-8").splitlines():
+        if not line.strip() or line.startswith("#"):
+            continue
+        title, *expected = line.split("\t")
+        rows.append((title, dict(zip(FIELDS, expected))))
+    return rows
+
+
+def render(value: object) -> str:
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    return "-" if value is None else str(value)
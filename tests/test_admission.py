@@ -0,0 +1,161 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from handlers import download
+from utils import admission
+from utils.admission import ACTIVE, DONE, QUEUED, REJECTED, AdmissionScheduler
+
+
+@pytest.fixture
+def disk(monkeypatch):
+    """The free space ``shutil.disk_usage`` reports; set ``disk.free`` to change it."""
+    state = SimpleNamespace(free=10_000)
+    monkeypatch.setattr(admission.shutil, "disk_usage", lambda path: SimpleNamespace(free=state.free))
+    return state
+
+
+def make(tmp_path, max_active=1, max_per_user=5, **kwargs) -> AdmissionScheduler:
+    return AdmissionScheduler(max_active, max_per_user, tmp_path, **kwargs)
+
+
+def test_priority_then_user_load_then_arrival(tmp_path, disk):
+    scheduler = make(tmp_path)
+    running = scheduler.submit(1, 100)
+    second_of_user_1 = scheduler.submit(1, 100)
+    user_2 = scheduler.submit(2, 100)
+    later_user_2 = scheduler.submit(2, 100)
+    urgent = scheduler.submit(3, 100, priority=-1)
+    assert running.state == ACTIVE
+    assert [t.position for t in (urgent, user_2, second_of_user_1, later_user_2)] == [1, 2, 3, 4]
+
+    order = []
+    for _ in range(4):
+        scheduler.release(running)
+        running = next(t for t in (urgent, user_2, second_of_user_1, later_user_2) if t.state == ACTIVE)
+        order.append(running)
+    assert order == [urgent, user_2, second_of_user_1, later_user_2]
+
+
+def test_user_at_their_cap_is_skipped_not_waited_on(tmp_path, disk):
+    scheduler = make(tmp_path, max_active=3, max_per_user=1)
+    first = scheduler.submit(1, 100)
+    blocked = scheduler.submit(1, 100)
+    other = scheduler.submit(2, 100)
+    assert (first.state, blocked.state, other.state) == (ACTIVE, QUEUED, ACTIVE)
+    assert blocked.position == 1
+    scheduler.release(first)
+    assert blocked.state == ACTIVE
+
+
+def test_head_of_the_queue_keeps_its_claim_on_space(tmp_path, disk):
+    disk.free = 1_000
+    scheduler = make(tmp_path, max_active=3, min_free_bytes=100)
+    big = scheduler.submit(1, 500)
+    waiting = scheduler.submit(2, 500)  # 400 left: waits for space, not rejected
+    small = scheduler.submit(3, 100)  # would fit, but must not overtake
+    assert (big.state, waiting.state, small.state) == (ACTIVE, QUEUED, QUEUED)
+    scheduler.release(big)
+    assert (waiting.state, small.state) == (ACTIVE, ACTIVE)
+
+
+def test_too_big_even_alone_is_rejected(tmp_path, disk):
+    disk.free = 1_000
+    scheduler = make(tmp_path, min_free_bytes=100)
+    ticket = scheduler.submit(1, 901)
+    assert ticket.state == REJECTED and ticket.changed.is_set()
+    assert scheduler.stats() == {"active": 0, "queued": 0}
+    assert scheduler.submit(1, 900).state == ACTIVE
+
+
+def test_reclaimable_space_counts_and_shortfall_says_how_much_to_free(tmp_path, disk):
+    disk.free = 300
+    scheduler = make(tmp_path, max_active=2, min_free_bytes=100, reclaimable=lambda: 1_000)
+    assert scheduler.shortfall() == -200
+    assert scheduler.submit(1, 700).state == ACTIVE
+    assert scheduler.shortfall() == 500  # 100 + 700 - 300
+    assert scheduler.free_bytes() == 500
+    assert scheduler.submit(2, 600).state == QUEUED
+
+
+def test_resize_admits_a_ticket_that_now_fits(tmp_path, disk):
+    disk.free = 1_000
+    scheduler = make(tmp_path, max_active=2)
+    scheduler.submit(1, 600)
+    ticket = scheduler.submit(2, 600)
+    assert ticket.state == QUEUED
+    scheduler.resize(ticket, 300)
+    assert ticket.state == ACTIVE
+
+
+def test_release_is_idempotent(tmp_path, disk):
+    scheduler = make(tmp_path, max_active=1)
+    first = scheduler.submit(1, 100)
+    queued = scheduler.submit(2, 100)
+    third = scheduler.submit(3, 100)
+    scheduler.release(queued)  # abandoned while waiting
+    assert queued.state == DONE and third.position == 1
+    scheduler.release(first)
+    scheduler.release(first)
+    scheduler.release(queued)
+    assert third.state == ACTIVE
+    assert scheduler.stats() == {"active": 1, "queued": 0}
+
+
+def test_requeued_download_goes_ahead_of_the_queue(tmp_path, disk):
+    # download.py re-submits a torrent at priority -1 once its real size is known
+    scheduler = make(tmp_path, max_active=1)
+    metadata = scheduler.submit(1, 100)
+    others = [scheduler.submit(user, 100) for user in (2, 3)]
+    scheduler.release(metadata)
+    assert others[0].state == ACTIVE
+    resumed = scheduler.submit(1, 100, priority=-1)
+    assert resumed.position == 1 and others[1].position == 2
+    scheduler.release(others[0])
+    assert resumed.state == ACTIVE
+
+
+class FakeBot:
+    def __init__(self) -> None:
+        self.edits: list[str] = []
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append(text)
+
+
+def test_metadata_timeout_frees_the_slot(tmp_path, disk, monkeypatch):
+    scheduler = make(tmp_path, max_active=1)
+    stuck = scheduler.submit(1, 100)
+    waiting = scheduler.submit(2, 100)
+    removed = []
+
+    async def get_statuses(gids, keys):
+        return {gid: SimpleNamespace(gid=gid, status="waiting") for gid in gids}
+
+    async def get_download(gid):
+        return SimpleNamespace(remove=lambda clean: removed.append((gid, clean)) or asyncio.sleep(0))
+
+    monkeypatch.setattr(download.aria, "get_statuses", get_statuses)
+    monkeypatch.setattr(download.aria, "get_download", get_download)
+    job_context = {
+        "ticket": stuck, "gid": "g1", "chat_id": 1, "message_id": 1, "torrent_name": "Show",
+        "started": download.time.monotonic() - download.METADATA_TIMEOUT - 1,
+    }
+    bot = FakeBot()
+
+    async def run():
+        tasks = []
+        application = SimpleNamespace(
+            bot=bot, bot_data={"admission": scheduler, "active_downloads": {"g1": job_context}},
+            create_task=lambda coro: tasks.append(asyncio.ensure_future(coro)),
+        )
+        await download._poll_progress(SimpleNamespace(application=application, bot=bot, job=None))
+        await asyncio.gather(*tasks)
+        return application
+
+    application = asyncio.run(run())
+    assert application.bot_data["active_downloads"] == {}
+    assert stuck.state == DONE and waiting.state == ACTIVE
+    assert "No metadata" in bot.edits[0]
+    assert removed == [("g1", True)]
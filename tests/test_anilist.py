@@ -0,0 +1,80 @@
+import asyncio
+import json
+import re
+
+import httpx
+import pytest
+
+from services import anilist
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    anilist.details_cache.clear()
+    anilist.search_cache.clear()
+    yield
+    anilist.details_cache.clear()
+    anilist.search_cache.clear()
+
+
+def media(media_id: int) -> dict:
+    return {"id": media_id, "title": {"romaji": f"Show {media_id}"}, "genres": []}
+
+
+class FakeAniList:
+    """Answers aliased Media(id:) documents; ids in ``missing`` have no media."""
+
+    def __init__(self, missing=()) -> None:
+        self.missing = set(missing)
+        self.queries: list[str] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        query = json.loads(request.content)["query"]
+        self.queries.append(query)
+        data = {
+            alias: None if int(media_id) in self.missing else media(int(media_id))
+            for alias, media_id in re.findall(r"(\w+): Media\(id: (\d+)", query)
+        }
+        return httpx.Response(200, json={"data": data})
+
+
+def fetch_all(server: FakeAniList, media_ids: list[int]) -> list:
+    async def run() -> list:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(server)) as client:
+            return await asyncio.gather(*(anilist.fetch_details(client, media_id) for media_id in media_ids))
+    return asyncio.run(run())
+
+
+def test_concurrent_misses_share_one_aliased_query():
+    server = FakeAniList()
+    ids = [101, 7, 5114, 21]
+    results = fetch_all(server, ids)
+    assert len(server.queries) == 1
+    assert [details.id for details in results] == ids
+    for media_id in ids:
+        assert f"{anilist.details_alias(media_id)}: Media(id: {media_id}, type: ANIME)" in server.queries[0]
+
+
+def test_duplicate_ids_are_asked_once_and_cached():
+    server = FakeAniList()
+    first = fetch_all(server, [9, 9, 12])
+    assert [d.id for d in first] == [9, 9, 12]
+    assert server.queries[0].count("Media(id: 9,") == 1
+    fetch_all(server, [9, 12])
+    assert len(server.queries) == 1  # the second round came from details_cache
+
+
+def test_missing_media_is_none_and_not_cached():
+    server = FakeAniList(missing={2})
+    assert [d and d.id for d in fetch_all(server, [1, 2])] == [1, None]
+    assert 2 not in anilist.details_cache
+    fetch_all(server, [2])
+    assert len(server.queries) == 2
+
+
+def test_large_batches_are_split(monkeypatch):
+    monkeypatch.setattr(anilist.details_batcher, "batch_size", 3)
+    server = FakeAniList()
+    results = fetch_all(server, list(range(1, 8)))
+    assert [d.id for d in results] == list(range(1, 8))
+    assert [q.count("Media(id:") for q in server.queries] == [3, 3, 1]
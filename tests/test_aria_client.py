@@ -0,0 +1,148 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from services import aria
+from services.aria import AriaClient, AriaDownload, AriaError
+
+
+class FakeRpc:
+    """aria2c's JSON-RPC endpoint: records each POST body and answers from ``methods``."""
+
+    def __init__(self, methods: dict) -> None:
+        self.methods = methods
+        self.posts: list = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        self.posts.append(body)
+        replies = [self._reply(call) for call in (body if isinstance(body, list) else [body])]
+        return httpx.Response(200, json=replies if isinstance(body, list) else replies[0])
+
+    def _reply(self, call: dict) -> dict:
+        handler = self.methods.get(call["method"])
+        if handler is None:
+            return {"jsonrpc": "2.0", "id": call["id"], "error": {"code": 1, "message": f"No such method: {call['method']}"}}
+        return {"jsonrpc": "2.0", "id": call["id"], "result": handler(*call["params"])}
+
+
+def make_client(rpc, secret: str = "") -> AriaClient:
+    client = AriaClient("http://aria2.test/jsonrpc", secret)
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(rpc))
+    return client
+
+
+def test_concurrent_calls_share_one_batch():
+    rpc = FakeRpc({"aria2.getVersion": lambda: {"version": "1.37.0"}, "aria2.tellStatus": lambda gid, *keys: {"gid": gid}})
+    client = make_client(rpc)
+
+    async def run():
+        return await asyncio.gather(
+            client.call("aria2.getVersion"), client.call("aria2.tellStatus", "g1"), client.call("aria2.tellStatus", "g2")
+        )
+
+    assert asyncio.run(run()) == [{"version": "1.37.0"}, {"gid": "g1"}, {"gid": "g2"}]
+    assert len(rpc.posts) == 1
+    assert [call["method"] for call in rpc.posts[0]] == ["aria2.getVersion", "aria2.tellStatus", "aria2.tellStatus"]
+
+
+def test_single_call_is_not_wrapped_in_a_batch():
+    rpc = FakeRpc({"aria2.getVersion": lambda: {"version": "1.37.0"}})
+    asyncio.run(make_client(rpc).call("aria2.getVersion"))
+    assert isinstance(rpc.posts[0], dict)
+
+
+def test_errors_fail_only_their_own_call():
+    rpc = FakeRpc({"aria2.getVersion": lambda: {"version": "1.37.0"}})
+    client = make_client(rpc)
+
+    async def run():
+        return await asyncio.gather(client.call("aria2.getVersion"), client.call("aria2.bogus"), return_exceptions=True)
+
+    ok, failed = asyncio.run(run())
+    assert ok == {"version": "1.37.0"}
+    assert isinstance(failed, AriaError) and failed.code == 1
+
+
+def test_transport_failure_fails_every_waiting_call():
+    def refuse(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    client = make_client(refuse)
+
+    async def run():
+        return await asyncio.gather(client.call("aria2.getVersion"), client.call("aria2.getVersion"), return_exceptions=True)
+
+    assert all(isinstance(result, AriaError) for result in asyncio.run(run()))
+
+
+def test_secret_is_injected():
+    rpc = FakeRpc({
+        "aria2.tellStatus": lambda *params: list(params),
+        "system.multicall": lambda calls: [[call["params"]] for call in calls],
+        "system.listMethods": lambda *params: list(params),
+    })
+    client = make_client(rpc, secret="s3cret")
+
+    async def run():
+        return await asyncio.gather(
+            client.call("aria2.tellStatus", "g1"),
+            client.call("system.multicall", [{"methodName": "aria2.tellStatus", "params": ["g2"]}]),
+            client.call("system.listMethods"),
+        )
+
+    status, multicall, methods = asyncio.run(run())
+    assert status == ["token:s3cret", "g1"]
+    assert multicall == [[["token:s3cret", "g2"]]]
+    assert methods == []  # system.* methods take no token
+
+
+def test_get_statuses_unpacks_multicall(monkeypatch):
+    def multicall(calls):
+        replies = []
+        for call in calls:
+            gid = call["params"][0]
+            if gid == "gone":
+                replies.append({"code": 1, "faultString": f"GID {gid} is not found"})
+            else:
+                replies.append([{"gid": gid, "status": "active", "totalLength": "100", "completedLength": "25"}])
+        return replies
+
+    rpc = FakeRpc({"system.multicall": multicall})
+    monkeypatch.setattr(aria, "client", make_client(rpc))
+    statuses = asyncio.run(aria.get_statuses(["g1", "gone", "g2"]))
+    assert statuses["g1"].progress == 25.0
+    assert statuses["gone"] is None
+    assert statuses["g2"].gid == "g2"
+    assert len(rpc.posts) == 1
+
+
+def test_remove_files_deletes_only_this_download(tmp_path, monkeypatch):
+    root = tmp_path / "downloads"
+    cache = root / "cache"
+    (cache / ("a" * 40)).mkdir(parents=True)
+    (cache / ("a" * 40) / "e01.mkv").write_bytes(b"cached")
+    monkeypatch.setattr(aria, "protected_dirs", {cache})
+    # A torrent whose top folder is also called "cache", next to another torrent's folder
+    own = [cache / "Show" / "e01.mkv", cache / "Show" / "Extras" / "nc.mkv"]
+    for path in own:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x")
+    (root / "cache.aria2").write_bytes(b"control")
+    (root / "Other").mkdir()
+    (root / "Other" / "e01.mkv").write_bytes(b"other")
+    outside = tmp_path / "elsewhere.mkv"
+    outside.write_bytes(b"keep")
+
+    files = [{"index": str(i), "path": str(p), "length": "1"} for i, p in enumerate(own + [outside], 1)]
+    download = AriaDownload({"gid": "g1", "dir": str(root), "files": files, "bittorrent": {"info": {"name": "cache"}}})
+    download._remove_files()
+
+    assert not any(path.exists() for path in own)
+    assert not (cache / "Show").exists()
+    assert not (root / "cache.aria2").exists()
+    assert (cache / ("a" * 40) / "e01.mkv").read_bytes() == b"cached"
+    assert (root / "Other" / "e01.mkv").exists()
+    assert outside.exists()
@@ -0,0 +1,121 @@
+import asyncio
+import json
+
+import pytest
+from websockets.asyncio.server import serve
+
+from services import aria_events
+from services.aria_events import COMPLETE, ERROR, AriaEventListener
+
+
+def notification(method: str, gid: str) -> str:
+    return json.dumps({"jsonrpc": "2.0", "method": method, "params": [{"gid": gid}]})
+
+
+class FakeAria2:
+    """Stands in for aria2c's WebSocket endpoint: pushes whatever the test queues."""
+
+    def __init__(self) -> None:
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        self.connections = 0
+        self._server = None
+
+    async def _handler(self, ws) -> None:
+        self.connections += 1
+        while True:
+            message = await self.outbox.get()
+            if message is None:
+                return  # drop the connection
+            await ws.send(message)
+
+    async def __aenter__(self) -> "FakeAria2":
+        self._server = await serve(self._handler, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        self.url = f"ws://127.0.0.1:{port}/jsonrpc"
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.outbox.put_nowait(None)  # let a handler still waiting for messages return
+        self._server.close()
+        await self._server.wait_closed()
+
+
+async def collect(listener_events: list, count: int) -> None:
+    while len(listener_events) < count:
+        await asyncio.sleep(0.01)
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+
+def test_notifications_reach_the_handler():
+    async def scenario():
+        events = []
+        async with FakeAria2() as fake:
+            listener = AriaEventListener(lambda gid, event: events.append((gid, event)), fake.url)
+            listener.start()
+            await listener.connected.wait()
+            for message in (
+                notification("aria2.onDownloadStart", "0001"),
+                notification("aria2.onDownloadComplete", "0001"),
+                "not json",
+                json.dumps({"jsonrpc": "2.0", "id": 1, "result": "OK"}),
+                notification("aria2.onBtDownloadComplete", "0002"),
+                notification("aria2.onDownloadError", "0003"),
+            ):
+                fake.outbox.put_nowait(message)
+            await collect(events, 3)
+            await listener.stop()
+        return events
+
+    assert run(scenario()) == [("0001", COMPLETE), ("0002", COMPLETE), ("0003", ERROR)]
+
+
+def test_reconnects_after_the_socket_drops(monkeypatch):
+    monkeypatch.setattr(aria_events, "RECONNECT_DELAY", 0.01)
+
+    async def scenario():
+        events = []
+        async with FakeAria2() as fake:
+            listener = AriaEventListener(lambda gid, event: events.append(gid), fake.url)
+            listener.start()
+            await listener.connected.wait()
+            fake.outbox.put_nowait(None)
+            fake.outbox.put_nowait(notification("aria2.onDownloadComplete", "0004"))
+            await collect(events, 1)
+            await listener.stop()
+            return events, fake.connections
+
+    events, connections = run(scenario())
+    assert events == ["0004"]
+    assert connections == 2
+
+
+def test_handler_errors_do_not_stop_the_listener():
+    async def scenario():
+        events = []
+
+        def handler(gid, event):
+            if gid == "bad":
+                raise RuntimeError("handler bug")
+            events.append(gid)
+
+        async with FakeAria2() as fake:
+            listener = AriaEventListener(handler, fake.url)
+            listener.start()
+            await listener.connected.wait()
+            fake.outbox.put_nowait(notification("aria2.onDownloadComplete", "bad"))
+            fake.outbox.put_nowait(notification("aria2.onDownloadComplete", "0005"))
+            await collect(events, 1)
+            await listener.stop()
+        return events
+
+    assert run(scenario()) == ["0005"]
+
+
+@pytest.mark.parametrize("raw", [b"{}", "[]", '{"method": "aria2.onDownloadComplete", "params": []}', "null"])
+def test_dispatch_ignores_malformed_messages(raw):
+    events = []
+    AriaEventListener(lambda gid, event: events.append(gid), "ws://unused").dispatch(raw)
+    assert events == []
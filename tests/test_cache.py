@@ -0,0 +1,132 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from utils import cache
+from utils.cache import FRESH, STALE, TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """``time.monotonic`` for the cache; advance with ``clock.now += seconds``."""
+    state = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=lambda: state.now))
+    return state
+
+
+class Loader:
+    """Counts calls; returns ``value`` (or raises it) after yielding to the loop ``ticks`` times."""
+
+    def __init__(self, value, ticks: int = 3) -> None:
+        self.value = value
+        self.ticks = ticks
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        for _ in range(self.ticks):
+            await asyncio.sleep(0)
+        if isinstance(self.value, Exception):
+            raise self.value
+        return self.value
+
+
+def test_fresh_stale_and_expired(clock):
+    ttl_cache = TTLCache(10, ttl=60, stale_ttl=30)
+    ttl_cache.set("k", "v")
+    assert ttl_cache.lookup("k") == ("v", FRESH)
+    clock.now += 61
+    assert ttl_cache.lookup("k") == ("v", STALE)
+    assert ttl_cache.get("k") is None  # get only returns fresh values
+    clock.now += 30
+    assert ttl_cache.lookup("k") == (None, None)
+    assert "k" not in ttl_cache
+    assert ttl_cache.stats()["expirations"] == 1
+
+
+def test_stale_value_is_served_while_it_refreshes(clock):
+    ttl_cache = TTLCache(10, ttl=60, stale_ttl=30)
+    ttl_cache.set("k", "old")
+    clock.now += 61
+    loader = Loader("new")
+
+    async def run():
+        first = await ttl_cache.fetch("k", loader)
+        second = await ttl_cache.fetch("k", loader)  # the refresh is still running
+        await asyncio.gather(*ttl_cache._background)
+        return first, second, await ttl_cache.fetch("k", loader)
+
+    assert asyncio.run(run()) == ("old", "old", "new")
+    assert loader.calls == 1
+    assert ttl_cache.lookup("k") == ("new", FRESH)
+
+
+def test_failed_refresh_keeps_the_stale_value(clock):
+    ttl_cache = TTLCache(10, ttl=60, stale_ttl=30)
+    ttl_cache.set("k", "old")
+    clock.now += 61
+
+    async def run():
+        value = await ttl_cache.fetch("k", Loader(RuntimeError("AniList is down")))
+        await asyncio.gather(*ttl_cache._background, return_exceptions=True)
+        return value
+
+    assert asyncio.run(run()) == "old"
+    assert ttl_cache.stats()["refresh_errors"] == 1
+    assert ttl_cache.lookup("k") == ("old", STALE)
+
+
+def test_concurrent_misses_share_one_load(clock):
+    ttl_cache = TTLCache(10, ttl=60)
+    loader = Loader("v")
+
+    async def run():
+        return await asyncio.gather(*(ttl_cache.fetch("k", loader) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["v"] * 5
+    assert loader.calls == 1
+    assert ttl_cache._inflight == {}
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_load(clock):
+    ttl_cache = TTLCache(10, ttl=60)
+    loader = Loader("v", ticks=5)
+
+    async def run():
+        impatient = asyncio.ensure_future(ttl_cache.fetch("k", loader))
+        patient = asyncio.ensure_future(ttl_cache.fetch("k", loader))
+        await asyncio.sleep(0)
+        impatient.cancel()
+        return await patient
+
+    assert asyncio.run(run()) == "v"
+    assert loader.calls == 1 and "k" in ttl_cache
+
+
+def test_failed_load_is_not_cached(clock):
+    ttl_cache = TTLCache(10, ttl=60)
+    failing = Loader(RuntimeError("nyaa is down"))
+
+    async def run():
+        results = await asyncio.gather(*(ttl_cache.fetch("k", failing) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert failing.calls == 1  # the waiters shared the failure too
+        assert "k" not in ttl_cache and ttl_cache._inflight == {}
+        return await ttl_cache.fetch("k", Loader("v"))
+
+    assert asyncio.run(run()) == "v"
+
+
+def test_lru_and_byte_budget_eviction(clock):
+    ttl_cache = TTLCache(3, ttl=60, max_bytes=10, sizeof=len)
+    for key in "abc":
+        ttl_cache.set(key, "xx")
+    ttl_cache.lookup("a")
+    ttl_cache.set("d", "xx")
+    assert list(ttl_cache._entries) == ["c", "a", "d"]
+    ttl_cache.set("e", "x" * 7)  # over the byte budget: the oldest go until it fits
+    assert list(ttl_cache._entries) == ["d", "e"]
+    ttl_cache.set("f", "x" * 11)  # bigger than the whole budget: not stored
+    assert "f" not in ttl_cache
+    assert ttl_cache.stats()["bytes"] == 9 and ttl_cache.stats()["evictions"] == 3
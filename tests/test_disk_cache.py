@@ -0,0 +1,129 @@
+import asyncio
+import os
+
+from utils.disk_cache import MANIFEST_NAME, DiskCache
+
+H1 = "a" * 40
+H2 = "b" * 40
+
+
+def make_source(tmp_path, name: str, size: int):
+    path = tmp_path / "incoming" / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    return path
+
+
+def store(cache: DiskCache, tmp_path, info_hash: str, file_key: str, size: int) -> None:
+    asyncio.run(cache.store(info_hash, file_key, make_source(tmp_path, file_key, size)))
+
+
+def cached_keys(cache: DiskCache) -> list:
+    return [key for _, key in cache._files]  # least recently used first
+
+
+def test_store_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(tmp_path / "cache", budget=300)
+    for name in ("e01.mkv", "e02.mkv", "e03.mkv"):
+        store(cache, tmp_path, H1, name, 100)
+    assert asyncio.run(cache.get(H1, "e01.mkv")) is not None  # now the most recent
+    store(cache, tmp_path, H1, "e04.mkv", 100)
+    assert cached_keys(cache) == ["e03.mkv", "e01.mkv", "e04.mkv"]
+    assert cache.size == 300
+    assert not cache.path(H1, "e02.mkv").exists()
+    assert cache.path(H1, "e01.mkv").exists()
+
+
+def test_pinned_files_are_not_evicted(tmp_path):
+    cache = DiskCache(tmp_path / "cache", budget=200)
+    store(cache, tmp_path, H1, "e01.mkv", 100)
+    store(cache, tmp_path, H1, "e02.mkv", 100)
+    with cache.pinned(H1, ["e01.mkv"]):
+        store(cache, tmp_path, H1, "e03.mkv", 100)
+        assert cached_keys(cache) == ["e01.mkv", "e03.mkv"]
+        assert cache.reclaimable() == 100
+    assert cache.reclaimable() == 200
+    store(cache, tmp_path, H1, "e04.mkv", 100)
+    assert cached_keys(cache) == ["e03.mkv", "e04.mkv"]
+
+
+def test_pins_are_counted(tmp_path):
+    cache = DiskCache(tmp_path / "cache", budget=1000)
+    store(cache, tmp_path, H1, "e01.mkv", 100)
+    cache.pin(H1, ["e01.mkv"])
+    cache.pin(H1, ["e01.mkv"])
+    cache.unpin(H1, ["e01.mkv"])
+    assert cache.reclaimable() == 0
+    cache.unpin(H1, ["e01.mkv"])
+    assert cache.reclaimable() == 100
+
+
+def test_reclaim_frees_what_was_asked(tmp_path):
+    cache = DiskCache(tmp_path / "cache", budget=1000)
+    for name in ("e01.mkv", "e02.mkv", "e03.mkv"):
+        store(cache, tmp_path, H1, name, 100)
+    cache.pin(H1, ["e01.mkv"])
+    assert asyncio.run(cache.reclaim(0)) == 0
+    assert asyncio.run(cache.reclaim(150)) == 200  # whole files, skipping the pinned one
+    assert cached_keys(cache) == ["e01.mkv"]
+    assert asyncio.run(cache.reclaim(100)) == 0
+
+
+def test_evicting_a_torrents_last_file_drops_its_folder(tmp_path):
+    cache = DiskCache(tmp_path / "cache", budget=1000)
+    store(cache, tmp_path, H1, "Show/e01.mkv", 100)
+    asyncio.run(cache.put_manifest(H1, [("Show/e01.mkv", 100)]))
+    store(cache, tmp_path, H2, "e01.mkv", 100)
+    asyncio.run(cache.reclaim(100))
+    assert not (tmp_path / "cache" / H1).exists()
+    assert cache.path(H2, "e01.mkv").exists()
+
+
+def test_store_racing_an_eviction_of_the_same_torrent(tmp_path):
+    cache = DiskCache(tmp_path / "cache", budget=1000)
+    store(cache, tmp_path, H1, "e01.mkv", 100)
+    source = make_source(tmp_path, "e02.mkv", 100)
+
+    async def run() -> None:
+        # The eviction empties H1 just as the next episode of H1 is stored
+        await asyncio.gather(cache.reclaim(100), cache.store(H1, "e02.mkv", source))
+
+    asyncio.run(run())
+    for key in cached_keys(cache):
+        assert cache.path(H1, key).exists()
+    assert cache.size == sum(cache._files.values())
+
+
+def test_complete_needs_every_manifest_file(tmp_path):
+    cache = DiskCache(tmp_path / "cache", budget=1000)
+    manifest = [("e01.mkv", 100), ("e02.mkv", 50)]
+    asyncio.run(cache.put_manifest(H1, manifest))
+    store(cache, tmp_path, H1, "e01.mkv", 100)
+    assert asyncio.run(cache.complete(H1)) is None
+    store(cache, tmp_path, H1, "e02.mkv", 50)
+    files = asyncio.run(cache.complete(H1))
+    assert [(f.file_key, f.size) for f in files] == manifest
+    cache.path(H1, "e02.mkv").unlink()  # removed behind the cache's back
+    assert asyncio.run(cache.complete(H1)) is None
+    assert cached_keys(cache) == ["e01.mkv"]
+
+
+def test_scan_on_start_restores_lru_order(tmp_path):
+    root = tmp_path / "cache"
+    for age, name in enumerate(["new.mkv", "mid.mkv", "old.mkv"]):
+        path = root / H1 / "Show" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * 10)
+        os.utime(path, (1_000_000 - age, 1_000_000 - age))
+    (root / H1 / MANIFEST_NAME).write_text('{"files": []}')
+    cache = DiskCache(root, budget=1000)
+    assert cached_keys(cache) == ["Show/old.mkv", "Show/mid.mkv", "Show/new.mkv"]
+    assert cache.size == 30
+
+
+def test_disabled_cache_deletes_instead(tmp_path):
+    cache = DiskCache(tmp_path / "cache", budget=0)
+    source = make_source(tmp_path, "e01.mkv", 10)
+    asyncio.run(cache.store(H1, "e01.mkv", source))
+    assert not source.exists()
+    assert cache.stats()["files"] == 0
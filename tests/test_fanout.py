@@ -0,0 +1,90 @@
+import asyncio
+
+from utils.fanout import fan_out
+
+
+class Workers:
+    """Fake per-key coroutines: ``delays[key]`` seconds each, ``errors`` raise instead."""
+
+    def __init__(self, delays: dict, errors: dict | None = None) -> None:
+        self.delays = delays
+        self.errors = errors or {}
+        self.active = 0
+        self.max_active = 0
+        self.started: list = []
+        self.cancelled: list = []
+
+    async def __call__(self, key):
+        self.started.append(key)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delays[key])
+        except asyncio.CancelledError:
+            self.cancelled.append(key)
+            raise
+        finally:
+            self.active -= 1
+        if key in self.errors:
+            raise self.errors[key]
+        return key.upper()
+
+
+def run(keys, workers, **kwargs):
+    return asyncio.run(fan_out(keys, workers, **kwargs))
+
+
+def test_all_results_keyed_by_input():
+    outcome = run(["a", "b", "c"], Workers({"a": 0.01, "b": 0.0, "c": 0.02}))
+    assert outcome.results == {"a": "A", "b": "B", "c": "C"}
+    assert outcome.timed_out == [] and outcome.failed == {}
+
+
+def test_concurrency_is_bounded():
+    workers = Workers({key: 0.01 for key in "abcdef"})
+    outcome = run(list("abcdef"), workers, limit=2)
+    assert workers.max_active == 2
+    assert len(outcome.results) == 6
+
+
+def test_duplicate_keys_run_once():
+    workers = Workers({"a": 0.0, "b": 0.0})
+    outcome = run(["a", "b", "a"], workers)
+    assert sorted(workers.started) == ["a", "b"]
+    assert list(outcome.results) == ["a", "b"]
+
+
+def test_per_key_timeout_keeps_the_rest():
+    workers = Workers({"fast": 0.01, "slow": 5})
+    outcome = run(["fast", "slow"], workers, timeout=0.2)
+    assert outcome.results == {"fast": "FAST"}
+    assert outcome.timed_out == ["slow"]
+    assert workers.cancelled == ["slow"]
+
+
+def test_timeout_starts_once_a_slot_is_free():
+    # With one slot, "b" waits 0.3s for "a" but still gets its own 0.5s
+    workers = Workers({"a": 0.3, "b": 0.3})
+    outcome = run(["a", "b"], workers, limit=1, timeout=0.5)
+    assert outcome.results == {"a": "A", "b": "B"}
+
+
+def test_budget_returns_partial_results():
+    workers = Workers({"a": 0.01, "b": 5, "c": 5})
+    outcome = run(["a", "b", "c"], workers, limit=1, budget=0.3)
+    assert outcome.results == {"a": "A"}
+    assert outcome.timed_out == ["b", "c"]  # "c" never got a slot
+    assert workers.started == ["a", "b"]
+    assert workers.active == 0  # nothing is left running
+
+
+def test_failures_are_reported_not_raised():
+    error = ValueError("nyaa is down")
+    outcome = run(["a", "b"], Workers({"a": 0.0, "b": 0.0}, errors={"b": error}))
+    assert outcome.results == {"a": "A"}
+    assert outcome.failed == {"b": error}
+
+
+def test_no_keys():
+    outcome = run([], Workers({}))
+    assert outcome.results == {} and outcome.timed_out == [] and outcome.failed == {}
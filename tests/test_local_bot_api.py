@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs
+
+import pytest
+from telegram.ext import ApplicationBuilder
+
+import handlers.download as download
+from services.aria import AriaFile
+from utils.file_id_cache import FileIdCache
+
+INFO_HASH = "ab" * 20
+
+
+class BotApiHandler(BaseHTTPRequestHandler):
+    """Answers every Bot API method with a plausible result and records the requests."""
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        method = self.path.rsplit("/", 1)[1]
+        self.server.requests.append((method, dict(self.headers), body))
+        message = {"message_id": 7, "date": int(time.time()), "chat": {"id": 1, "type": "private"}}
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bot", "username": "bot"}
+        elif method == "sendDocument":
+            result = dict(message, document={"file_id": "DOC-ID", "file_unique_id": "doc"})
+        elif method == "deleteMessage":
+            result = True
+        else:
+            result = message
+        reply = json.dumps({"ok": True, "result": result}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+
+@pytest.fixture
+def bot_api():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), BotApiHandler)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def video(tmp_path) -> Path:
+    path = tmp_path / "torrent" / "[Grp] Show - 01 (1080p).mkv"
+    path.parent.mkdir()
+    path.write_bytes(os.urandom(300_000))
+    return path
+
+
+def upload(bot_api, video: Path, local_mode: bool, file_ids: FileIdCache) -> bool:
+    async def run() -> bool:
+        base = f"http://127.0.0.1:{bot_api.server_address[1]}/bot"
+        app = ApplicationBuilder().token("123:abc").base_url(base).local_mode(local_mode).build()
+        await app.initialize()
+        try:
+            size = video.stat().st_size
+            return await download._upload_file(
+                app, {"chat_id": 1, "info_hash": INFO_HASH}, AriaFile(1, str(video), size, size, True),
+                1, 1, file_ids, str(video.parent.parent),
+            )
+        finally:
+            await app.shutdown()
+    return asyncio.run(run())
+
+
+def sent_documents(bot_api) -> list:
+    return [(headers, body) for method, headers, body in bot_api.requests if method == "sendDocument"]
+
+
+def test_local_mode_sends_only_the_file_uri(bot_api, video, tmp_path):
+    file_ids = FileIdCache(str(tmp_path / "ids.sqlite"))
+    assert upload(bot_api, video, True, file_ids)
+
+    [(headers, body)] = sent_documents(bot_api)
+    assert len(body) < 1000  # no file contents, just the form fields
+    assert not headers.get("Content-Type", "").startswith("multipart/")
+    fields = parse_qs(body.decode())
+    assert fields["document"] == [video.resolve().as_uri()]
+    assert [f.file_id for f in file_ids.files(INFO_HASH)] == ["DOC-ID"]
+    file_ids.close()
+
+
+def test_remote_mode_streams_the_file(bot_api, video, tmp_path):
+    file_ids = FileIdCache(str(tmp_path / "ids.sqlite"))
+    assert upload(bot_api, video, False, file_ids)
+
+    [(headers, body)] = sent_documents(bot_api)
+    assert headers["Content-Type"].startswith("multipart/form-data")
+    assert "Transfer-Encoding" not in headers  # sized up front, not chunked
+    assert video.read_bytes() in body
+    file_ids.close()
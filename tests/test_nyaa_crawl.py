@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from handlers.nyaa_search import _TorrentMerger
+from services import nyaa
+from services.nyaa_html import HtmlTorrent, SearchPage
+
+
+def torrent(title: str, seeders: int = 1, magnet: str | None = None) -> HtmlTorrent:
+    return HtmlTorrent(title, magnet or f"magnet:?xt=urn:btih:{abs(hash((title, seeders))):040d}", seeders=seeders)
+
+
+class FakeNyaa:
+    """A paginated backend: ``pages[n]`` rows for page n, answered after ``delays[n]`` seconds."""
+
+    def __init__(self, pages: dict[int, int], delays: dict[int, float] | None = None) -> None:
+        self.pages = pages
+        self.delays = delays or {}
+        self.started: list[int] = []
+        self.active = 0
+        self.max_active = 0
+
+    async def __call__(self, client, query, category, filters, page) -> SearchPage:
+        self.started.append(page)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delays.get(page, 0.01))
+        finally:
+            self.active -= 1
+        rows = self.pages.get(page, 0)
+        return SearchPage([torrent(f"[G] {query} p{page} r{i}") for i in range(rows)], rows)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    nyaa.search_cache.clear()
+
+    def install(fake: FakeNyaa) -> FakeNyaa:
+        monkeypatch.setitem(nyaa.BACKENDS, "html", fake)
+        return fake
+
+    yield install
+    nyaa.search_cache.clear()
+
+
+def crawl(**kwargs) -> list[tuple[int, int]]:
+    async def run():
+        return [(page, len(torrents)) async for page, torrents in nyaa.crawl_nyaa(None, "show", backend="html", **kwargs)]
+    return asyncio.run(run())
+
+
+def test_short_first_page_stops_the_crawl(backend):
+    fake = backend(FakeNyaa({1: 20}))
+    assert crawl() == [(1, 20)]
+    assert fake.started == [1]
+
+
+def test_pages_fetched_concurrently_within_the_limit(backend):
+    full = nyaa.NYAA_PAGE_SIZE
+    fake = backend(FakeNyaa({1: full, 2: full, 3: full, 4: full, 5: full}))
+    assert sorted(crawl(max_pages=5, concurrency=2)) == [(page, full) for page in range(1, 6)]
+    assert fake.max_active == 2
+
+
+def test_short_page_cancels_the_pages_after_it(backend):
+    full = nyaa.NYAA_PAGE_SIZE
+    # Page 3 is short and lands first; pages 4 and 5 cannot exist
+    fake = backend(FakeNyaa({1: full, 2: full, 3: 10, 4: full, 5: full}, delays={2: 0.05, 3: 0.01}))
+    assert crawl(max_pages=5, concurrency=2) == [(1, full), (3, 10), (2, full)]
+    assert sorted(fake.started) == [1, 2, 3]
+
+
+def test_target_ends_the_crawl(backend):
+    full = nyaa.NYAA_PAGE_SIZE
+    backend(FakeNyaa({page: full for page in range(1, 6)}))
+    assert len(crawl(max_pages=5, concurrency=1, target=2 * full)) == 2
+
+
+def test_unpaginated_backend_yields_one_page(backend, monkeypatch):
+    fake = FakeNyaa({1: nyaa.NYAA_PAGE_SIZE})
+    monkeypatch.setitem(nyaa.BACKENDS, "rss", fake)
+    async def run():
+        return [page async for page, _ in nyaa.crawl_nyaa(None, "show", backend="rss")]
+    assert asyncio.run(run()) == [1]
+
+
+def test_merger_prefers_earlier_queries_and_pages_whatever_the_arrival_order():
+    merger = _TorrentMerger()
+    first = torrent("[G] Show - 01 (1080p)", seeders=5, magnet="magnet:a")
+    tie = torrent("[G] Show - 01 (1080p)", seeders=5, magnet="magnet:b")
+    later_page = torrent("[G] Show - 01 (1080p)", seeders=5, magnet="magnet:c")
+    more = torrent("[G] Show - 02 (1080p)", seeders=9, magnet="magnet:d")
+    # Query 1's page and query 0's page 2 land before query 0's page 1
+    merger.add(1, 1, [tie])
+    merger.add(0, 2, [later_page, more])
+    merger.add(0, 1, [first, more])
+    assert len(merger) == 2
+    assert [t.magnet for t in merger.results()] == ["magnet:a", "magnet:d"]
+
+
+def test_merger_keeps_the_best_seeded_copy():
+    merger = _TorrentMerger()
+    merger.add(0, 1, [torrent("[G] Show - 01 (1080p)", seeders=1, magnet="magnet:a")])
+    merger.add(1, 1, [torrent("[G] Show - 01 (1080p)", seeders=8, magnet="magnet:b")])
+    assert [t.magnet for t in merger.results()] == ["magnet:b"]
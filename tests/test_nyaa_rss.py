@@ -0,0 +1,117 @@
+import asyncio
+from pathlib import Path
+
+import httpx
+import pytest
+
+from config import NYAA_BASE_URL
+from services import nyaa
+from services.nyaa_html import parse_nyaa_html
+from services.nyaa_rss import RssFeedParser, build_magnet, parse_nyaa_rss, search_nyaa_rss
+from utils.file_id_cache import info_hash_from_magnet
+
+FIXTURES = Path(__file__).resolve().parents[1] / "benchmarks" / "fixtures" / "nyaa"
+
+
+def comparable(torrent) -> dict:
+    # The feed carries only the infohash, so its magnets list our own trackers instead of the page's
+    fields = torrent.as_dict()
+    fields["magnet"] = info_hash_from_magnet(fields["magnet"])
+    return fields
+
+
+@pytest.fixture(scope="module")
+def html_page():
+    return parse_nyaa_html((FIXTURES / "search_page_full.html").read_text(encoding="utf-8"))
+
+
+@pytest.fixture(scope="module")
+def feed() -> bytes:
+    return (FIXTURES / "search_feed.xml").read_bytes()
+
+
+def test_feed_matches_html_listing(html_page, feed):
+    page = parse_nyaa_rss(feed)
+    assert page.row_count == html_page.row_count
+    assert [comparable(t) for t in page.torrents] == [comparable(t) for t in html_page.torrents]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 97, 4096])
+def test_chunked_feed_parses_the_same(feed, chunk_size):
+    parser = RssFeedParser()
+    for start in range(0, len(feed), chunk_size):
+        parser.feed(feed[start:start + chunk_size])
+    assert parser.close() == parse_nyaa_rss(feed)
+
+
+def test_empty_feed():
+    page = parse_nyaa_rss(b'<?xml version="1.0"?><rss version="2.0" xmlns:nyaa="https://nyaa.si/xmlns/nyaa"><channel></channel></rss>')
+    assert page.torrents == [] and page.row_count == 0
+
+
+def test_build_magnet_lowercases_hash():
+    magnet = build_magnet("ABCDEF0123456789ABCDEF0123456789ABCDEF01", "[Grp] Show - 01")
+    assert info_hash_from_magnet(magnet) == "abcdef0123456789abcdef0123456789abcdef01"
+    assert "dn=%5BGrp%5D%20Show%20-%2001" in magnet
+
+
+class FakeNyaaSite:
+    """Serves the fixtures at NYAA_BASE_URL: the feed for ``page=rss``, else the HTML listing.
+
+    The feed goes out in small chunks, as a slow connection would deliver it.
+    """
+
+    def __init__(self, chunk_size: int = 512) -> None:
+        self.chunk_size = chunk_size
+        self.requests: list[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        assert str(request.url).startswith(NYAA_BASE_URL)
+        if request.url.params.get("page") == "rss":
+            feed = (FIXTURES / "search_feed.xml").read_bytes()
+
+            async def chunks():
+                for start in range(0, len(feed), self.chunk_size):
+                    yield feed[start:start + self.chunk_size]
+
+            return httpx.Response(200, headers={"Content-Type": "application/rss+xml"}, content=chunks())
+        return httpx.Response(200, text=(FIXTURES / "search_page_full.html").read_text(encoding="utf-8"))
+
+
+def search(site: FakeNyaaSite, backend: str) -> list:
+    async def run() -> list:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(site)) as client:
+            return await nyaa.search_nyaa(client, "sousou no frieren", backend=backend)
+    nyaa.search_cache.clear()
+    try:
+        return asyncio.run(run())
+    finally:
+        nyaa.search_cache.clear()
+
+
+def test_search_nyaa_streams_the_served_feed(feed, html_page):
+    site = FakeNyaaSite()
+    results = search(site, "rss")
+    assert results == parse_nyaa_rss(feed).torrents
+    assert [comparable(t) for t in results] == [comparable(t) for t in html_page.torrents]
+    (request,) = site.requests
+    assert dict(request.url.params) == {"page": "rss", "q": "sousou no frieren", "c": "1_2", "f": "2", "p": "1"}
+
+
+def test_rss_and_html_backends_agree():
+    site = FakeNyaaSite()
+    assert [comparable(t) for t in search(site, "rss")] == [comparable(t) for t in search(site, "html")]
+    assert [r.url.params.get("page") for r in site.requests] == ["rss", None]
+
+
+def test_rss_http_error_propagates():
+    def down(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(503)
+
+    async def run() -> None:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(down)) as client:
+            await search_nyaa_rss(client, "frieren")
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(run())
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from services.anilist import GraphQLScheduler
+from utils import ratelimit
+from utils.ratelimit import TokenBucket, parse_retry_after
+
+_real_sleep = asyncio.sleep
+
+
+class FakeClock:
+    """Virtual time for the rate limiter: ``sleep`` advances the clock instead of waiting.
+
+    Every sleep moves it by at least a microsecond, as a real clock would; a
+    bucket a rounding error short of a token must not spin in place.
+    """
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.epoch = 1_700_000_000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.epoch + self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.now += max(1e-6, seconds)
+        await _real_sleep(0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", fake)
+    monkeypatch.setattr(asyncio, "sleep", fake.sleep)
+    return fake
+
+
+def acquire_times(clock: FakeClock, bucket: TokenBucket, count: int) -> list[float]:
+    async def run() -> list[float]:
+        start = clock.now
+        times = []
+        for _ in range(count):
+            await bucket.acquire()
+            times.append(clock.now - start)
+        return times
+    return asyncio.run(run())
+
+
+def test_burst_then_paced_at_rate(clock):
+    times = acquire_times(clock, TokenBucket(rate=20, capacity=3), 6)
+    assert times[:3] == [0, 0, 0]  # the full bucket is a burst
+    assert times[3:] == pytest.approx([0.05, 0.10, 0.15], abs=1e-4)  # then one token every 1/rate
+
+
+def test_concurrent_callers_share_the_rate(clock):
+    bucket = TokenBucket(rate=50, capacity=1)
+
+    async def run() -> None:
+        await asyncio.gather(*(bucket.acquire() for _ in range(6)))
+
+    asyncio.run(run())
+    assert clock.now - 1000.0 == pytest.approx(0.1, abs=1e-4)
+
+
+def test_block_for_empties_the_bucket(clock):
+    bucket = TokenBucket(rate=1000, capacity=5)
+    bucket.block_for(0.1)
+    assert acquire_times(clock, bucket, 1)[0] == pytest.approx(0.1, abs=1e-4)
+
+
+def test_observe_remaining_caps_tokens(clock):
+    bucket = TokenBucket(rate=20, capacity=10)
+    bucket.observe({"X-RateLimit-Remaining": "1"})
+    assert acquire_times(clock, bucket, 2) == pytest.approx([0, 0.05], abs=1e-4)
+
+
+def test_observe_exhausted_waits_for_reset(clock):
+    bucket = TokenBucket(rate=1000, capacity=10)
+    bucket.observe({"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(clock.time() + 30)})
+    assert acquire_times(clock, bucket, 1)[0] == pytest.approx(30 + ratelimit.RESET_MARGIN, abs=1e-4)
+
+
+def test_observe_ignores_missing_headers(clock):
+    bucket = TokenBucket(rate=1, capacity=2)
+    bucket.observe({})
+    assert acquire_times(clock, bucket, 2) == [0, 0]
+
+
+@pytest.mark.parametrize("value, expected", [(None, 7.0), ("", 7.0), ("3", 3.0), ("-2", 0.0), ("soon", 7.0)])
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value, 7.0) == expected
+
+
+def test_parse_retry_after_http_date():
+    from email.utils import formatdate
+    assert 8 <= parse_retry_after(formatdate(time.time() + 10, usegmt=True), 0.0) <= 10
+
+
+class LimitedServer:
+    """GraphQL endpoint allowing ``limit`` requests per fixed ``window``, like AniList.
+
+    Past the limit it answers 429 with ``Retry-After``; with ``headers`` it also
+    reports ``X-RateLimit-Remaining``/``X-RateLimit-Reset`` on every response.
+    """
+
+    def __init__(self, clock: FakeClock, limit: int, window: float = 60.0, headers: bool = True) -> None:
+        self.clock = clock
+        self.limit = limit
+        self.window = window
+        self.headers = headers
+        self.window_start = clock.now
+        self.used = 0
+        self.served = 0
+        self.rejected = 0
+        self.bodies: list[dict] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if self.clock.now - self.window_start >= self.window:
+            self.window_start, self.used = self.clock.now, 0
+        reset_in = self.window_start + self.window - self.clock.now
+        if self.used >= self.limit:
+            self.rejected += 1
+            return httpx.Response(429, headers={"Retry-After": str(int(reset_in) + 1)})
+        self.used += 1
+        self.served += 1
+        body = json.loads(request.content)
+        self.bodies.append(body)
+        headers = {}
+        if self.headers:
+            headers = {
+                "X-RateLimit-Remaining": str(self.limit - self.used),
+                "X-RateLimit-Reset": str(self.clock.time() + reset_in),
+            }
+        return httpx.Response(200, headers=headers, json={"data": body["variables"]})
+
+
+def run_queries(server: LimitedServer, scheduler: GraphQLScheduler, variables: list[dict]) -> list[dict]:
+    async def run() -> list[dict]:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(server)) as client:
+            return await asyncio.gather(*(scheduler.execute(client, "query", v) for v in variables))
+    return asyncio.run(run())
+
+
+def test_scheduler_stays_inside_the_server_limit(clock):
+    # The local estimate (90/min, burst 10) is looser than the server's 20/min;
+    # the rate-limit headers must hold it back before anything is refused
+    server = LimitedServer(clock, limit=20)
+    scheduler = GraphQLScheduler("https://graphql.test", rate_per_minute=90, burst=10)
+    results = run_queries(server, scheduler, [{"n": n} for n in range(50)])
+    assert results == [{"data": {"n": n}} for n in range(50)]
+    assert server.rejected == 0
+    assert server.served == 50
+    assert clock.now - 1000.0 >= 120  # 50 requests at 20 a window need three windows
+
+
+def test_scheduler_retries_after_429(clock):
+    server = LimitedServer(clock, limit=3, headers=False)
+    scheduler = GraphQLScheduler("https://graphql.test", rate_per_minute=600, burst=10)
+    results = run_queries(server, scheduler, [{"n": n} for n in range(5)])
+    assert results == [{"data": {"n": n}} for n in range(5)]
+    assert server.rejected == 1  # one refusal, then everybody waits out Retry-After
+    assert clock.now - 1000.0 >= 60
+
+
+def test_scheduler_gives_up_after_max_retries(clock):
+    server = LimitedServer(clock, limit=0, headers=False)
+    scheduler = GraphQLScheduler("https://graphql.test", max_retries=2)
+    with pytest.raises(httpx.HTTPStatusError):
+        run_queries(server, scheduler, [{"n": 1}])
+    assert server.rejected == 3
+
+
+def test_identical_inflight_queries_share_one_call(clock):
+    server = LimitedServer(clock, limit=100)
+    scheduler = GraphQLScheduler("https://graphql.test")
+    results = run_queries(server, scheduler, [{"search": "frieren"}] * 5 + [{"search": "dandadan"}])
+    assert results == [{"data": {"search": "frieren"}}] * 5 + [{"data": {"search": "dandadan"}}]
+    assert [body["variables"] for body in server.bodies] == [{"search": "frieren"}, {"search": "dandadan"}]
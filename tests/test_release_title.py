@@ -0,0 +1,28 @@
+import pytest
+
+from tests.release_titles import load_corpus, render
+from utils.release_title import parse_release_title
+
+CORPUS = load_corpus()
+
+
+@pytest.mark.parametrize("title, expected", CORPUS, ids=[title for title, _ in CORPUS])
+def test_corpus(title, expected):
+    info = parse_release_title(title)
+    assert {field: render(getattr(info, field)) for field in expected} == expected
+
+
+def test_results_are_memoised():
+    parse_release_title.cache_clear()
+    title = CORPUS[0][0]
+    assert parse_release_title(title) is parse_release_title(title)
+    assert parse_release_title.cache_info().hits == 1
+
+
+@pytest.mark.parametrize("title, episode, episode_end", [
+    ("[Grp] Show - 01 ~ 12 [1080p]", 1, 12),
+    ("Show.S02E05v2.1080p.WEB.x264-GRP", 5, None),
+])
+def test_episode_numbers(title, episode, episode_end):
+    info = parse_release_title(title)
+    assert (info.episode, info.episode_end) == (episode, episode_end)
@@ -0,0 +1,113 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from handlers import download, nyaa_search
+from utils import result_store
+from utils.result_store import RESULT_MAX_ITEMS, RESULT_MAX_VIEWS, PageCursor, ResultStore, get_result_store
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """``time.monotonic`` for the store; advance with ``clock.now += seconds``."""
+    state = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(result_store, "time", SimpleNamespace(monotonic=lambda: state.now))
+    return state
+
+
+def test_items_are_stored_once_per_key(clock):
+    store = ResultStore()
+    first = store.add("magnet:a", "A")
+    assert store.add("magnet:a", "A again") == first
+    assert store.add_all([("magnet:b", "B"), ("magnet:a", "A")]) == [first + 1, first]
+    assert store.get(first) == "A" and len(store) == 2
+
+
+def test_items_and_views_expire_after_ttl_without_use(clock):
+    store = ResultStore(ttl=60)
+    kept, dropped = store.add_all([("a", "A"), ("b", "B")])
+    store.put_view("group", "g", [kept, dropped])
+    store.put_cursor("p", PageCursor([("A", "rm::1")], 10))
+    clock.now += 50
+    assert store.get(kept) == "A"  # used: its ttl starts again
+    assert store.view_ids("group", "g") == (kept, dropped)
+    clock.now += 50
+    assert store.get(dropped) is None
+    assert store.view("group", "g") == ["A"]  # ids whose item is gone are skipped
+    assert store.cursor("p") is None
+    clock.now += 61
+    assert store.view_ids("group", "g") is None and store.get(kept) is None
+
+
+def test_item_cap_drops_least_recently_used(clock):
+    store = ResultStore()
+    ids = store.add_all((f"magnet:{n}", n) for n in range(RESULT_MAX_ITEMS))
+    store.get(ids[0])
+    store.add("magnet:new", "new")
+    assert len(store) == RESULT_MAX_ITEMS
+    assert store.get(ids[0]) == 0
+    assert store.get(ids[1]) is None
+
+
+def test_view_cap_drops_least_recently_used(clock):
+    store = ResultStore()
+    for n in range(RESULT_MAX_VIEWS):
+        store.put_view("group", str(n), [])
+    store.view_ids("group", "0")
+    store.put_cursor("page", PageCursor([], 10))
+    assert store.view_ids("group", "0") == ()
+    assert store.view_ids("group", "1") is None
+    assert store.cursor("page") is not None
+
+
+def test_stale_id_never_resolves_to_a_newer_item(clock):
+    store = ResultStore(ttl=60)
+    old = store.add("magnet:a", "A")
+    clock.now += 61
+    store.prune()
+    assert store.add("magnet:a", "A, fetched again") != old
+    assert store.get(old) is None
+
+
+def test_page_cursor_clamps_and_slices():
+    cursor = PageCursor(((f"row {n}", f"rm::{n}") for n in range(25)), 10)
+    assert len(cursor) == 25 and cursor.page_count == 3
+    assert cursor.page(1) == (1, cursor.rows[10:20])
+    assert cursor.page(7) == (2, cursor.rows[20:])
+    assert cursor.page(-1)[0] == 0
+    assert PageCursor([], 10).page(3) == (0, ())
+
+
+class FakeQuery:
+    def __init__(self, data: str) -> None:
+        self.data = data
+        self.edits: list[str] = []
+
+    async def answer(self, *args, **kwargs):
+        return None
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append(text)
+
+    async def edit_message_reply_markup(self, **kwargs):
+        self.edits.append("keyboard")
+
+
+@pytest.mark.parametrize("handler, data, reply", [
+    (nyaa_search.on_nyaa_pick, "rq::0123456789ab", "Selection expired or data is invalid."),
+    (nyaa_search.on_nyaa_pick, "rp::0123456789ab::1", "Selection expired. Please search again."),
+    (nyaa_search.on_nyaa_pick, "rm::1", "Selection expired or data is invalid."),
+    (download.on_download_request, "dl::1", "❓ Download selection has expired. Please search again."),
+])
+def test_stale_callbacks_say_the_selection_expired(clock, handler, data, reply):
+    chat_data: dict = {}
+    store = get_result_store(chat_data)
+    store.put_view("group", "0123456789ab", [store.add("magnet:a", "A")])
+    store.put_cursor("0123456789ab", PageCursor([("A", "rm::1")], 10))
+    clock.now += result_store.RESULT_TTL + 1
+
+    query = FakeQuery(data)
+    update = SimpleNamespace(callback_query=query, effective_chat=SimpleNamespace(id=1))
+    asyncio.run(handler(update, SimpleNamespace(chat_data=chat_data, application=SimpleNamespace(bot_data={}))))
+    assert query.edits == [reply]
@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import html
+import os
+import re
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import NetworkError
+
+from handlers import download
+from services.aria import AriaFile
+from utils import uploads
+from utils.split import hash_part, open_part, split_parts
+
+SIZE = 10_007  # odd, so the last part is short
+PART = 1_000
+
+
+@pytest.fixture
+def movie(tmp_path):
+    path = tmp_path / "Show - 01 (1080p).mkv"
+    path.write_bytes(os.urandom(SIZE))
+    return path
+
+
+def test_parts_cover_the_file_exactly():
+    parts = split_parts("a.mkv", SIZE, PART)
+    assert [p.number for p in parts] == list(range(1, 12))
+    assert parts[0].offset == 0
+    assert all(a.offset + a.length == b.offset for a, b in zip(parts, parts[1:]))  # no gap, no overlap
+    assert sum(p.length for p in parts) == SIZE
+    assert parts[-1].length == SIZE % PART
+    assert [p.name for p in parts[:2]] == ["a.mkv.001", "a.mkv.002"]
+
+
+@pytest.mark.parametrize("size, count", [(PART, 1), (PART + 1, 2), (0, 1)])
+def test_part_boundaries(size, count):
+    parts = split_parts("a.mkv", size, PART)
+    assert len(parts) == count
+    assert sum(p.length for p in parts) == size
+
+
+def test_names_widen_past_999_parts():
+    parts = split_parts("a.mkv", 1200, 1)
+    assert parts[0].name == "a.mkv.0001" and parts[-1].name == "a.mkv.1200"
+
+
+def test_parts_reassemble_and_hash(movie):
+    data = movie.read_bytes()
+    whole = hashlib.sha256()
+    joined = b""
+    for part in split_parts(movie.name, SIZE, PART):
+        with open_part(movie, part, (hashlib.sha256(), whole.copy())) as source:
+            chunk = source.read()
+            assert source.hashed
+            own, whole = source.hashers
+        joined += chunk
+        assert own.hexdigest() == hashlib.sha256(data[part.offset:part.offset + part.length]).hexdigest()
+    assert joined == data
+    assert whole.hexdigest() == hashlib.sha256(data).hexdigest()
+
+
+def test_rewound_slice_restarts_its_hashes(movie):
+    part = split_parts(movie.name, SIZE, PART)[3]
+    with open_part(movie, part, (hashlib.sha256(),)) as source:
+        source.read(100)
+        source.seek(0)  # httpx rewinds a body it has to resend
+        assert source.read() == movie.read_bytes()[part.offset:part.offset + part.length]
+        assert source.hashed
+        streamed = source.hashers[0].hexdigest()
+    assert streamed == hash_part(movie, part, (hashlib.sha256(),))[0].hexdigest()
+
+
+class FakeBot:
+    """Receives split uploads into ``received``; ``flaky`` part names fail once mid-stream."""
+
+    def __init__(self, flaky=()) -> None:
+        self.received: dict[str, bytes] = {}
+        self.messages: list[str] = []
+        self.flaky = set(flaky)
+        self._ids = iter(range(1, 1000))
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.messages.append(text)
+        return SimpleNamespace(message_id=next(self._ids), delete=_noop, edit_text=self._edit)
+
+    async def _edit(self, text, **kwargs):
+        self.messages.append(text)
+
+    async def send_document(self, chat_id, document, filename, **kwargs):
+        stream = document.input_file_content
+        if filename in self.flaky:
+            self.flaky.discard(filename)
+            stream.read(123)
+            raise NetworkError("connection reset")
+        self.received[filename] = stream.read()
+        return SimpleNamespace(document=None)
+
+
+async def _noop(*args, **kwargs):
+    return None
+
+
+def test_split_upload_rejoins_byte_for_byte(movie, tmp_path, monkeypatch):
+    monkeypatch.setattr(download, "SPLIT_PART_BYTES", PART)
+    monkeypatch.setattr(uploads, "UPLOAD_RETRY_DELAY", 0)
+    bot = FakeBot(flaky={f"{movie.name}.003"})
+    application = SimpleNamespace(bot=bot, bot_data={})
+    file = AriaFile(1, str(movie), SIZE, SIZE, True)
+
+    assert asyncio.run(download._upload_parts(application, {"chat_id": 1}, file, 1, 1))
+    assert len(bot.received) == 11
+
+    out = tmp_path / "received"
+    out.mkdir()
+    for name, data in bot.received.items():
+        (out / name).write_bytes(data)
+    manifest = html.unescape(re.sub(r"<[^>]+>", "", "\n".join(bot.messages)))
+    # The per-part and whole-file checksums in the manifest
+    for name, data in bot.received.items():
+        assert f"{name} · " in manifest
+        assert hashlib.sha256(data).hexdigest() in manifest
+    assert f"SHA-256: {hashlib.sha256(movie.read_bytes()).hexdigest()}" in manifest
+    # ...and its rejoin command, run as given
+    command = re.search(r"Rejoin: (.+)", manifest).group(1)
+    subprocess.run(command, shell=True, cwd=out, check=True)
+    assert (out / movie.name).read_bytes() == movie.read_bytes()
@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+from utils import uploads
+from utils.uploads import FileSlice, UploadScheduler
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Retry delays the scheduler asked for, without waiting them out."""
+    delays: list[float] = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay, *args):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(uploads.asyncio, "sleep", sleep)
+    return delays
+
+
+class Sender:
+    """A fake ``send(payload, timeout)``: raises ``outcomes`` one per call, then succeeds.
+
+    ``read`` bytes of a payload are consumed before the outcome, like httpx
+    streaming the body before the error.
+    """
+
+    def __init__(self, *outcomes, read: int = -1) -> None:
+        self.outcomes = list(outcomes)
+        self.read = read
+        self.calls = 0
+        self.payloads: list = []
+
+    async def __call__(self, payload, timeout):
+        self.calls += 1
+        self.payloads.append(payload)
+        if payload is not None:
+            payload.read(self.read)
+        if self.outcomes:
+            raise self.outcomes.pop(0)
+        return f"sent #{self.calls}"
+
+
+def upload(scheduler: UploadScheduler, send, read=None, chat_id: int = 1, name: str = "a.mkv"):
+    return scheduler.upload(chat_id, name, 100, send, read)
+
+
+@pytest.fixture
+def movie(tmp_path):
+    path = tmp_path / "a.mkv"
+    path.write_bytes(b"x" * 100)
+    return path
+
+
+def test_uploads_to_one_chat_run_in_submission_order():
+    events: list[str] = []
+
+    def sender(label: str, delay: float):
+        async def send(payload, timeout):
+            events.append(f"{label} start")
+            await asyncio.sleep(delay)
+            events.append(f"{label} end")
+        return send
+
+    async def run():
+        scheduler = UploadScheduler(max_active=3, retries=0)
+        await asyncio.gather(
+            upload(scheduler, sender("1a", 0.05)),
+            upload(scheduler, sender("1b", 0.0)),
+            upload(scheduler, sender("2a", 0.0), chat_id=2),
+        )
+
+    asyncio.run(run())
+    assert events.index("1a end") < events.index("1b start")
+    assert events.index("2a end") < events.index("1a end")  # other chats are not held up
+
+
+def test_global_limit_across_chats():
+    active = peak = 0
+
+    async def send(payload, timeout):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+
+    async def run():
+        scheduler = UploadScheduler(max_active=2, retries=0)
+        await asyncio.gather(*(upload(scheduler, send, chat_id=chat) for chat in range(5)))
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert peak == 2
+    assert scheduler.stats()["uploads"] == 5
+    assert scheduler._chats == {}
+
+
+def test_network_errors_are_retried_with_doubling_delays(sleeps, movie):
+    send = Sender(NetworkError("reset"), NetworkError("reset"), read=10)
+    scheduler = UploadScheduler(max_active=1, retries=3)
+    assert asyncio.run(upload(scheduler, send, lambda: FileSlice(movie))) == "sent #3"
+    assert sleeps == [uploads.UPLOAD_RETRY_DELAY, uploads.UPLOAD_RETRY_DELAY * 2]
+    assert len({id(p) for p in send.payloads}) == 3 and all(p.closed for p in send.payloads)  # a fresh payload each time
+    assert scheduler.stats()["retries"] == 2
+
+
+def test_retry_after_waits_as_told(sleeps):
+    scheduler = UploadScheduler(max_active=1, retries=1)
+    asyncio.run(upload(scheduler, Sender(RetryAfter(7))))
+    assert sleeps == [7.0]
+
+
+def test_bad_request_is_not_retried(sleeps):
+    send = Sender(BadRequest("File must be non-empty"))
+    scheduler = UploadScheduler(max_active=1, retries=3)
+    with pytest.raises(BadRequest):
+        asyncio.run(upload(scheduler, send))
+    assert send.calls == 1 and sleeps == []
+    assert scheduler.stats()["failures"] == 1
+
+
+def test_gives_up_after_the_last_retry(sleeps):
+    send = Sender(*[NetworkError("reset")] * 5)
+    scheduler = UploadScheduler(max_active=1, retries=2)
+    with pytest.raises(NetworkError):
+        asyncio.run(upload(scheduler, send))
+    assert send.calls == 3
+    assert scheduler.stats()["failures"] == 1 and scheduler.stats()["uploads"] == 0
+
+
+def test_timeout_after_the_body_went_out_is_not_retried(sleeps, movie):
+    # Telegram may have the whole file already; a retry would post it twice
+    send = Sender(TimedOut())
+    scheduler = UploadScheduler(max_active=1, retries=3)
+    with pytest.raises(TimedOut):
+        asyncio.run(upload(scheduler, send, lambda: FileSlice(movie)))
+    assert send.calls == 1 and sleeps == []
+
+
+def test_timeout_while_sending_is_retried(sleeps, movie):
+    send = Sender(TimedOut(), read=10)
+    scheduler = UploadScheduler(max_active=1, retries=3)
+    assert asyncio.run(upload(scheduler, send, lambda: FileSlice(movie))) == "sent #2"
+    assert sleeps == [uploads.UPLOAD_RETRY_DELAY]
+
+
+def test_timeout_without_a_stream_is_not_retried(sleeps):
+    send = Sender(TimedOut())
+    with pytest.raises(TimedOut):
+        asyncio.run(upload(UploadScheduler(max_active=1, retries=3), send))
+    assert send.calls == 1
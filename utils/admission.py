@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import itertools
+import shutil
+from collections import Counter
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+QUEUED = "queued"
+ACTIVE = "active"
+REJECTED = "rejected"
+DONE = "done"
+
+
+class Ticket:
+    """One download waiting for, or holding, an admission slot.
+
+    ``changed`` is set whenever the ticket is admitted, rejected or moves in
+    the queue; waiters clear it after reading ``state``/``position``.
+    """
+
+    __slots__ = ("user_id", "need", "state", "position", "changed", "_key")
+
+    def __init__(self, user_id: int, need: int, key: Tuple[int, int, int]) -> None:
+        self.user_id = user_id
+        self.need = need  # bytes of disk the download may occupy at once
+        self.state = QUEUED
+        self.position = 0
+        self.changed = asyncio.Event()
+        self._key = key
+
+    def __lt__(self, other: "Ticket") -> bool:
+        return self._key < other._key
+
+
+class AdmissionScheduler:
+    """Priority queue in front of aria2: global and per-user caps plus a disk budget.
+
+    Tickets are ordered by ``(priority, downloads the user already had, arrival)``,
+    so users take turns instead of one user's batch blocking everybody.
+    A user at ``max_per_user`` is skipped, not waited on. A ticket is admitted
+    only while the free space in ``disk_path``, less ``min_free_bytes`` and
+    what active tickets reserved, covers its ``need``; the head of the queue
+    keeps its claim on space so small downloads cannot starve it. A ticket
+    that cannot fit even with nothing else running is rejected.
+
+    ``reclaimable`` reports bytes a cache on the same disk would give up on
+    demand; they count as free, and ``shortfall`` tells the caller how much
+    of them the admitted downloads actually need freed.
+    """
+
+    def __init__(
+        self, max_active: int, max_per_user: int, disk_path: str | Path, min_free_bytes: int = 0,
+        reclaimable: Optional[Callable[[], int]] = None,
+    ) -> None:
+        self.max_active = max_active
+        self.max_per_user = max_per_user
+        self.disk_path = Path(disk_path)
+        self.min_free_bytes = min_free_bytes
+        self.reclaimable = reclaimable
+        self._queue: List[Ticket] = []  # kept sorted
+        self._active: List[Ticket] = []
+        self._seq = itertools.count()
+        self.disk_path.mkdir(parents=True, exist_ok=True)
+
+    def submit(self, user_id: int, need: int, priority: int = 0) -> Ticket:
+        load = sum(1 for t in itertools.chain(self._active, self._queue) if t.user_id == user_id)
+        ticket = Ticket(user_id, need, (priority, load, next(self._seq)))
+        bisect.insort(self._queue, ticket)
+        self._admit()
+        return ticket
+
+    def resize(self, ticket: Ticket, need: int) -> None:
+        """Correct a ticket's estimate, e.g. once the torrent's file list is known."""
+        ticket.need = need
+        self._admit()
+
+    def release(self, ticket: Ticket) -> None:
+        """The download is over (or abandoned while queued): free its slot and space. Safe to call twice."""
+        if ticket.state == DONE:
+            return
+        if ticket.state == ACTIVE:
+            self._active.remove(ticket)
+        elif ticket.state == QUEUED:
+            self._queue.remove(ticket)
+        ticket.state = DONE
+        self._admit()
+
+    def free_bytes(self) -> int:
+        return -self.shortfall() + (self.reclaimable() if self.reclaimable else 0)
+
+    def shortfall(self) -> int:
+        """Bytes the active reservations are short of on disk, before anything is reclaimed (negative: to spare)."""
+        reserved = sum(t.need for t in self._active)
+        return self.min_free_bytes + reserved - shutil.disk_usage(self.disk_path).free
+
+    def stats(self) -> dict:
+        return {"active": len(self._active), "queued": len(self._queue)}
+
+    def _admit(self) -> None:
+        per_user = Counter(t.user_id for t in self._active)
+        available: Optional[int] = None
+        settled = []
+        for ticket in self._queue:
+            if len(self._active) >= self.max_active:
+                break
+            if per_user[ticket.user_id] >= self.max_per_user:
+                continue
+            if available is None:
+                available = self.free_bytes()
+            if ticket.need > available:
+                if self._active:
+                    break
+                ticket.state = REJECTED
+            else:
+                ticket.state = ACTIVE
+                self._active.append(ticket)
+                per_user[ticket.user_id] += 1
+                available -= ticket.need
+            settled.append(ticket)
+
+        for ticket in settled:
+            self._queue.remove(ticket)
+            ticket.changed.set()
+        for position, ticket in enumerate(self._queue, 1):
+            if ticket.position != position:
+                ticket.position = position
+                ticket.changed.set()
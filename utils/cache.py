@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Optional, Set, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+logger = logging.getLogger(__name__)
+
+FRESH = "fresh"
+STALE = "stale"
+
+
+class TTLCache(Generic[K, V]):
+    """Bounded in-memory cache with TTL expiry, LRU eviction and a byte budget.
+
+    Entries younger than ``ttl`` are fresh. Entries between ``ttl`` and
+    ``ttl + stale_ttl`` are still returned by ``fetch`` (stale-while-revalidate)
+    while a background refresh replaces them; anything older is a miss.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        *,
+        stale_ttl: float = 0.0,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[V], int]] = None,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda _value: 1)
+        # key -> (stored_at, size, value), oldest use first
+        self._entries: "OrderedDict[K, Tuple[float, int, V]]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[K, asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.refresh_errors = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return self.lookup(key, count=False)[1] is not None
+
+    def lookup(self, key: K, *, count: bool = True) -> Tuple[Optional[V], Optional[str]]:
+        """Return ``(value, FRESH | STALE)`` or ``(None, None)`` on a miss."""
+        entry = self._entries.get(key)
+        if entry is None:
+            if count:
+                self.misses += 1
+            return None, None
+        stored_at, _, value = entry
+        age = time.monotonic() - stored_at
+        if age > self.ttl + self.stale_ttl:
+            self._remove(key)
+            self.expirations += 1
+            if count:
+                self.misses += 1
+            return None, None
+        self._entries.move_to_end(key)
+        if age > self.ttl:
+            if count:
+                self.stale_hits += 1
+            return value, STALE
+        if count:
+            self.hits += 1
+        return value, FRESH
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """Return a fresh value only; stale entries count as misses here."""
+        value, state = self.lookup(key, count=False)
+        if state == FRESH:
+            self.hits += 1
+            return value
+        self.misses += 1
+        return default
+
+    def set(self, key: K, value: V) -> None:
+        size = self._sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            self.pop(key)
+            return
+        self._remove(key)
+        self._entries[key] = (time.monotonic(), size, value)
+        self._bytes += size
+        while self._entries and (
+            len(self._entries) > self.maxsize
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def pop(self, key: K) -> Optional[V]:
+        entry = self._remove(key)
+        return entry[2] if entry else None
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key: K) -> Optional[Tuple[float, int, V]]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+        return entry
+
+    async def fetch(self, key: K, loader: Callable[[], Awaitable[V]]) -> V:
+        """Return the cached value for ``key``, calling ``loader`` on a miss.
+
+        Concurrent misses for the same key share one ``loader`` call. A stale
+        hit is returned immediately and refreshed in the background.
+        """
+        value, state = self.lookup(key)
+        if state == FRESH:
+            return value
+        if state == STALE:
+            if key not in self._inflight:
+                task = self._start_load(key, loader)
+                self._background.add(task)
+                task.add_done_callback(self._on_refresh_done)
+            return value
+        task = self._inflight.get(key) or self._start_load(key, loader)
+        return await asyncio.shield(task)
+
+    def _start_load(self, key: K, loader: Callable[[], Awaitable[V]]) -> asyncio.Task:
+        async def load() -> V:
+            try:
+                result = await loader()
+                self.set(key, result)
+                return result
+            finally:
+                self._inflight.pop(key, None)
+
+        task = asyncio.create_task(load())
+        self._inflight[key] = task
+        return task
+
+    def _on_refresh_done(self, task: asyncio.Task) -> None:
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.refresh_errors += 1
+            logger.warning("Background cache refresh failed: %s", task.exception())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "refresh_errors": self.refresh_errors,
+        }
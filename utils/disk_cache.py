@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".manifest.json"
+
+
+class DiskFile(NamedTuple):
+    file_key: str  # path inside the torrent, as in the file_id cache
+    path: Path
+    size: int
+
+
+class DiskCache:
+    """Completed torrent files kept under ``root/<infohash>/<path in torrent>``.
+
+    Each torrent directory also holds a manifest of the torrent's video files,
+    so a repeat request knows whether everything it needs is on disk without
+    asking aria2. Past ``budget`` bytes the least recently used files go
+    first; pinned files (a request is still sending them) are never evicted,
+    and the rest can be given up early to make room for downloads. The index
+    is rebuilt from the directory tree on start, oldest modification first,
+    and a hit refreshes a file's mtime so the order survives restarts.
+    Construct it in a thread: that scan walks the whole cache.
+
+    The index lives on the event loop; file work runs in threads, one at a
+    time under ``_io`` so an eviction never deletes what a concurrent
+    ``store`` or ``put_manifest`` is writing into the same torrent folder.
+    """
+
+    def __init__(self, root: str | Path, budget: int) -> None:
+        self.root = Path(root)
+        self.budget = budget
+        self.size = 0
+        self._files: "OrderedDict[Tuple[str, str], int]" = OrderedDict()  # LRU first
+        self._pins: Dict[Tuple[str, str], int] = {}
+        self._io = asyncio.Lock()
+        if self.enabled:
+            self._scan()
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    def _scan(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        found = []
+        for torrent_dir in self.root.iterdir():
+            if not torrent_dir.is_dir():
+                continue
+            for path in torrent_dir.rglob("*"):
+                if path.is_file() and path.name != MANIFEST_NAME:
+                    stat = path.stat()
+                    found.append((stat.st_mtime, torrent_dir.name, path.relative_to(torrent_dir).as_posix(), stat.st_size))
+        for _, info_hash, file_key, size in sorted(found):
+            self._files[(info_hash, file_key)] = size
+            self.size += size
+
+    def path(self, info_hash: str, file_key: str) -> Path:
+        return self.root / info_hash / file_key
+
+    async def get(self, info_hash: str, file_key: str) -> Optional[DiskFile]:
+        """The cached file, marked as just used, or None."""
+        return (await self.get_many(info_hash, [file_key])).get(file_key)
+
+    async def get_many(self, info_hash: str, file_keys: Iterable[str]) -> Dict[str, DiskFile]:
+        """Those of the torrent's files that are cached, by key, each marked as just used."""
+        keys = [file_key for file_key in file_keys if (info_hash, file_key) in self._files]
+        if not keys:
+            return {}
+        paths = [self.path(info_hash, file_key) for file_key in keys]
+        missing = await asyncio.to_thread(_utime, paths)
+        found = {}
+        for file_key, path in zip(keys, paths):
+            key = (info_hash, file_key)
+            if path in missing:
+                self._drop(key)  # deleted behind our back
+            elif key in self._files:  # not evicted while we were away
+                self._files.move_to_end(key)
+                found[file_key] = DiskFile(file_key, path, self._files[key])
+        return found
+
+    def manifest(self, info_hash: str) -> Optional[List[Tuple[str, int]]]:
+        try:
+            data = json.loads((self.root / info_hash / MANIFEST_NAME).read_text("utf-8"))
+            return [(key, int(size)) for key, size in data["files"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    async def put_manifest(self, info_hash: str, files: List[Tuple[str, int]]) -> None:
+        if not self.enabled:
+            return
+        async with self._io:
+            await asyncio.to_thread(_write_manifest, self.root / info_hash, files)
+
+    async def complete(self, info_hash: str) -> Optional[List[DiskFile]]:
+        """Every file in the torrent's manifest, if all of them are on disk."""
+        if not any(h == info_hash for h, _ in self._files):
+            return None
+        manifest = await asyncio.to_thread(self.manifest, info_hash)
+        if not manifest or any((info_hash, key) not in self._files for key, _ in manifest):
+            return None
+        found = await self.get_many(info_hash, [key for key, _ in manifest])
+        return [found[key] for key, _ in manifest] if len(found) == len(manifest) else None
+
+    def pin(self, info_hash: str, file_keys: Iterable[str]) -> None:
+        """Keep these files from eviction until a matching ``unpin``."""
+        for file_key in file_keys:
+            key = (info_hash, file_key)
+            self._pins[key] = self._pins.get(key, 0) + 1
+
+    def unpin(self, info_hash: str, file_keys: Iterable[str]) -> None:
+        for file_key in file_keys:
+            key = (info_hash, file_key)
+            self._pins[key] -= 1
+            if not self._pins[key]:
+                del self._pins[key]
+
+    @contextmanager
+    def pinned(self, info_hash: str, file_keys: Iterable[str]) -> Iterator[None]:
+        file_keys = list(file_keys)
+        self.pin(info_hash, file_keys)
+        try:
+            yield
+        finally:
+            self.unpin(info_hash, file_keys)
+
+    def reclaimable(self) -> int:
+        """Bytes that eviction could free right now."""
+        return sum(size for key, size in self._files.items() if key not in self._pins)
+
+    async def reclaim(self, nbytes: int) -> int:
+        """Evict least recently used files until ``nbytes`` are freed; returns the bytes freed."""
+        if nbytes <= 0:
+            return 0
+        return await self._evict(self.size - nbytes)
+
+    async def store(self, info_hash: str, file_key: str, source: Path) -> None:
+        """Move a finished download into the cache (or just delete it when disabled)."""
+        if not self.enabled or not info_hash:
+            await asyncio.to_thread(source.unlink, missing_ok=True)
+            return
+        target = self.path(info_hash, file_key)
+        async with self._io:
+            try:
+                size = await asyncio.to_thread(_move, source, target)
+            except OSError as e:
+                logger.warning("Could not cache %s: %s", source, e)
+                await asyncio.to_thread(source.unlink, missing_ok=True)
+                return
+            self._drop((info_hash, file_key))
+            self._files[(info_hash, file_key)] = size
+            self.size += size
+        await self._evict(self.budget)
+
+    async def _evict(self, target: int) -> int:
+        """Forget unpinned files, least recently used first, until the cache is down to ``target`` bytes, then delete them."""
+        async with self._io:
+            doomed = []
+            freed = 0
+            for key in list(self._files):
+                if self.size <= target:
+                    break
+                if key in self._pins:
+                    continue
+                freed += self._drop(key)
+                doomed.append(key)
+            if doomed:
+                # Decided under the lock, so no store into these folders can land before the delete
+                emptied = {h for h, _ in doomed} - {h for h, _ in self._files} - {h for h, _ in self._pins}
+                await asyncio.to_thread(self._delete, doomed, emptied)
+            return freed
+
+    def _drop(self, key: Tuple[str, str]) -> int:
+        size = self._files.pop(key, 0)
+        self.size -= size
+        return size
+
+    def _delete(self, keys: List[Tuple[str, str]], emptied: set) -> None:
+        for info_hash, file_key in keys:
+            if info_hash in emptied:
+                continue
+            path = self.path(info_hash, file_key)
+            path.unlink(missing_ok=True)
+            # Drop emptied folders inside the torrent
+            for parent in path.parents:
+                if parent == self.root / info_hash:
+                    break
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+        # A torrent with no files left loses its manifest too
+        for info_hash in emptied:
+            shutil.rmtree(self.root / info_hash, ignore_errors=True)
+
+    def stats(self) -> dict:
+        return {"files": len(self._files), "bytes": self.size, "budget": self.budget, "pinned": len(self._pins)}
+
+
+def _utime(paths: List[Path]) -> set:
+    """Touch each path; returns those that are gone."""
+    missing = set()
+    for path in paths:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            missing.add(path)
+    return missing
+
+
+def _write_manifest(torrent_dir: Path, files: List[Tuple[str, int]]) -> None:
+    torrent_dir.mkdir(parents=True, exist_ok=True)
+    (torrent_dir / MANIFEST_NAME).write_text(json.dumps({"files": files}), "utf-8")
+
+
+def _move(source: Path, target: Path) -> int:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    shutil.move(str(source), str(target))
+    return target.stat().st_size
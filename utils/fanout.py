@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Iterable, List, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass
+class FanOutResult(Generic[K, V]):
+    """Outcome of a fan-out run, keyed by the input that produced each value."""
+    results: Dict[K, V] = field(default_factory=dict)
+    timed_out: List[K] = field(default_factory=list)
+    failed: Dict[K, BaseException] = field(default_factory=dict)
+
+
+async def fan_out(
+    keys: Iterable[K],
+    worker: Callable[[K], Awaitable[V]],
+    *,
+    limit: int = 4,
+    timeout: float | None = None,
+    budget: float | None = None,
+) -> FanOutResult[K, V]:
+    """Run ``worker`` for every key with at most ``limit`` calls in flight.
+
+    ``timeout`` bounds each call once it gets a slot; ``budget`` bounds the
+    whole run. Keys that miss either deadline end up in ``timed_out`` and
+    everything that finished in time is returned in ``results``.
+    """
+    unique_keys = list(dict.fromkeys(keys))
+    outcome: FanOutResult[K, V] = FanOutResult()
+    if not unique_keys:
+        return outcome
+
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(key: K) -> V:
+        async with semaphore:
+            return await asyncio.wait_for(worker(key), timeout)
+
+    tasks = {key: asyncio.create_task(run(key)) for key in unique_keys}
+    _, pending = await asyncio.wait(tasks.values(), timeout=budget)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    for key, task in tasks.items():
+        if task in pending or task.cancelled():
+            outcome.timed_out.append(key)
+            continue
+        exc = task.exception()
+        if isinstance(exc, asyncio.TimeoutError):
+            outcome.timed_out.append(key)
+        elif exc is not None:
+            outcome.failed[key] = exc
+        else:
+            outcome.results[key] = task.result()
+    return outcome
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+from urllib.parse import parse_qs, urlsplit
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    info_hash   TEXT NOT NULL,
+    file_key    TEXT NOT NULL,
+    file_name   TEXT NOT NULL,
+    file_size   INTEGER NOT NULL,
+    file_id     TEXT NOT NULL,
+    uploaded_at REAL NOT NULL,
+    PRIMARY KEY (info_hash, file_key)
+);
+CREATE TABLE IF NOT EXISTS torrents (
+    info_hash    TEXT PRIMARY KEY,
+    file_count   INTEGER NOT NULL,
+    completed_at REAL NOT NULL
+);
+"""
+
+
+def info_hash_from_magnet(magnet: str) -> Optional[str]:
+    """Lowercase hex BTIH of a magnet link; base32 hashes are converted."""
+    for xt in parse_qs(urlsplit(magnet).query).get("xt", []):
+        if not xt.lower().startswith("urn:btih:"):
+            continue
+        value = xt[9:]
+        if len(value) == 40:
+            return value.lower()
+        if len(value) == 32:
+            try:
+                return base64.b32decode(value.upper()).hex()
+            except (binascii.Error, ValueError):
+                return None
+    return None
+
+
+class CachedFile(NamedTuple):
+    file_key: str  # path inside the torrent, e.g. "Show S01/Show - 01.mkv"
+    file_name: str
+    file_size: int
+    file_id: str
+
+
+class FileIdCache:
+    """SQLite map of (infohash, file path in torrent) -> Telegram ``file_id``.
+
+    A torrent counts as cached once every file of one upload run was recorded
+    with ``mark_complete``; dropping any of its files makes it a miss again.
+    Every call is blocking; the bot runs them through ``asyncio.to_thread``,
+    so the connection is shared across threads behind a lock.
+    """
+
+    def __init__(self, path: str) -> None:
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def lookup(self, info_hash: str) -> Optional[List[CachedFile]]:
+        """Every cached file of a completely uploaded torrent, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT file_count FROM torrents WHERE info_hash = ?", (info_hash,)).fetchone()
+            if row is None:
+                return None
+            files = self._files(info_hash)
+        return files if len(files) == row[0] else None
+
+    def files(self, info_hash: str) -> List[CachedFile]:
+        """Whatever is cached for ``info_hash``, complete or not."""
+        with self._lock:
+            return self._files(info_hash)
+
+    def _files(self, info_hash: str) -> List[CachedFile]:
+        return [
+            CachedFile(*file_row)
+            for file_row in self._db.execute(
+                "SELECT file_key, file_name, file_size, file_id FROM files WHERE info_hash = ? ORDER BY file_key",
+                (info_hash,),
+            )
+        ]
+
+    def put(self, info_hash: str, file_key: str, file_name: str, file_size: int, file_id: str) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                (info_hash, file_key, file_name, file_size, file_id, time.time()),
+            )
+
+    def mark_complete(self, info_hash: str, file_count: int) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO torrents VALUES (?, ?, ?)", (info_hash, file_count, time.time())
+            )
+
+    def invalidate(self, info_hash: str, file_key: Optional[str] = None) -> None:
+        """Forget one file (Telegram rejected its id) or a whole torrent."""
+        with self._lock, self._db:
+            if file_key is None:
+                self._db.execute("DELETE FROM files WHERE info_hash = ?", (info_hash,))
+            else:
+                self._db.execute("DELETE FROM files WHERE info_hash = ? AND file_key = ?", (info_hash, file_key))
+            self._db.execute("DELETE FROM torrents WHERE info_hash = ?", (info_hash,))
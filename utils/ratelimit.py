@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import time
+from typing import Mapping, Optional
+
+# Our clock and the server's are never exactly in step; wait this long past its reset time
+RESET_MARGIN = 1.0
+
+
+class TokenBucket:
+    """Async token bucket; callers queue in FIFO order until a token is free.
+
+    ``block_for``/``observe`` let the server's own view of the budget
+    (``Retry-After``, ``X-RateLimit-*`` headers) override the local estimate.
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                await asyncio.sleep(wait)
+
+    def block_for(self, seconds: float) -> None:
+        """Hand out no tokens for ``seconds`` and restart from an empty bucket."""
+        now = time.monotonic()
+        self._blocked_until = max(self._blocked_until, now + max(0.0, seconds))
+        self._tokens = 0.0
+        self._updated = now
+
+    def observe(self, headers: Mapping[str, str]) -> None:
+        """Sync the bucket with ``X-RateLimit-Remaining``/``X-RateLimit-Reset``."""
+        remaining = _to_float(headers.get("X-RateLimit-Remaining"))
+        if remaining is None:
+            return
+        self._refill(time.monotonic())
+        self._tokens = min(self._tokens, remaining)
+        if remaining <= 0:
+            reset_at = _to_float(headers.get("X-RateLimit-Reset"))
+            if reset_at is not None:
+                self.block_for(reset_at - time.time() + RESET_MARGIN)
+
+
+def parse_retry_after(value: Optional[str], default: float) -> float:
+    """Return the ``Retry-After`` delay in seconds (delta-seconds or HTTP date)."""
+    if not value:
+        return default
+    seconds = _to_float(value)
+    if seconds is not None:
+        return max(0.0, seconds)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _to_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
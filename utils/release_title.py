@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+RELEASE_TITLE_CACHE_SIZE = 8192
+
+
+class ReleaseInfo(NamedTuple):
+    group: Optional[str]
+    title: str
+    season: Optional[int]
+    episode: Optional[int]
+    episode_end: Optional[int]  # last episode of a range such as "01-12"
+    resolution: Optional[str]
+    codec: Optional[str]
+    audio: Tuple[str, ...]
+    version: Optional[int]
+    is_batch: bool
+    is_dub: bool
+
+
+# One alternation scanned left to right; at a given position the first
+# alternative wins, so the more specific forms are listed first. Each
+# alternative is wrapped in a named group so ``match.lastgroup`` says which
+# one matched. The leading lookahead lists every character a token can start
+# with: most positions fail on it at once instead of trying each alternative.
+_TOKEN_RE = re.compile(
+    r"""
+    (?=[\[(\-\#0-9abcdefhmostvx])
+    (?:
+      (?P<bracket>\[(?P<bracket_text>[^\]]*)\])
+    | (?P<paren>\((?P<paren_text>[^)]*)\))
+    | (?P<dash>(?<=\s)-\s+(?P<dash_ep>\d{1,4})(?:v(?P<dash_version>\d))?(?:\s*[-~]\s*(?P<dash_end>\d{1,4}))?(?![0-9]))
+    | (?P<version>(?<=\d)v(?P<version_num>\d)(?![a-z0-9]))
+    | (?P<res>(?<!\d)(?P<res_num>\d{3,4})p(?![a-z0-9]))
+    | (?<![a-z0-9])(?:
+          (?P<se>s(?P<se_season>\d{1,2})\s?e(?P<se_episode>\d{1,4})(?:\s*-\s*e?(?P<se_end>\d{1,4}))?(?:v(?P<se_version>\d))?)
+        | (?P<season>(?:s|season\s?)(?P<season_num>\d{1,2}))
+        | (?P<season_ord>(?P<season_ord_num>\d)(?:st|nd|rd|th)\s+season)
+        | (?P<res_wxh>\d{3,4}x(?P<res_h>\d{3,4}))
+        | (?P<uhd>4k)
+        | (?P<codec>x\.?26[45]|h\.?\s?26[45]|hevc|avc|av1|xvid|vp9)
+        | (?P<dual>dual[\s.-]?audio|multi[\s.-]?audio)
+        | (?P<dub>dub(?:bed)?|dual)
+        | (?P<audio>aac(?:\s?[0-9.]+)?|flac|opus|e-?ac-?3|ac-?3|dts(?:-hd)?(?:\s?ma)?|truehd|ddp?(?:\s?[0-9.]+)?)
+        | (?P<batch>batch|complete|episodes)
+        | (?P<year>(?:19|20)\d{2})
+        | (?P<range>(?P<range_start>\d{1,4})(?:v\d)?(?P<range_sep>\s*[-~]\s*)(?P<range_end>\d{1,4})(?:v\d)?)
+        | (?P<bare>(?P<bare_ep>\d{1,4})v(?P<bare_version>\d))
+        | (?P<ep>(?:ep?|episode\s?|\#)(?P<ep_num>\d{1,4})(?:v(?P<ep_version>\d))?)
+      )(?![a-z0-9])
+    )
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+_EXTENSION_RE = re.compile(r"\.(mkv|mp4|avi|mov|webm|ts)$", re.IGNORECASE)
+_SCENE_GROUP_RE = re.compile(r"-([A-Za-z0-9][\w.]*)$")
+_TITLE_TRIM = " -_|~:"
+_SPACED_DASH_RE = re.compile(r"\s+-\s+")
+
+
+class _Tokens:
+    __slots__ = ("season", "episode", "episode_end", "resolution", "codec", "audio", "version", "is_batch", "is_dub", "first_meta")
+
+    def __init__(self) -> None:
+        self.season = self.episode = self.episode_end = self.resolution = None
+        self.codec = self.version = None
+        self.audio: list = []
+        self.is_batch = self.is_dub = False
+        self.first_meta: Optional[int] = None
+
+
+def _scan(text: str, tokens: _Tokens, offset: int, nested: bool) -> None:
+    pos = 0
+    while True:
+        match = _TOKEN_RE.search(text, pos)
+        if match is None:
+            return
+        pos = match.end()
+        kind = match.lastgroup
+        group = match.group
+        meta = True
+        if kind == "bracket" or kind == "paren":
+            _scan(group(kind + "_text"), tokens, offset + match.start() + 1, True)
+        elif kind == "se":
+            tokens.season = int(group("se_season"))
+            tokens.episode = int(group("se_episode"))
+            if group("se_end"):
+                tokens.episode_end = int(group("se_end"))
+            if group("se_version"):
+                tokens.version = int(group("se_version"))
+        elif kind == "season":
+            tokens.season = int(group("season_num"))
+        elif kind == "season_ord":
+            tokens.season = int(group("season_ord_num"))
+        elif kind == "res":
+            tokens.resolution = f"{int(group('res_num'))}p"
+        elif kind == "res_wxh":
+            tokens.resolution = f"{int(group('res_h'))}p"
+        elif kind == "uhd":
+            tokens.resolution = "2160p"
+        elif kind == "codec":
+            tokens.codec = group(kind).replace(" ", "").replace(".", "").upper()
+        elif kind == "dual":
+            tokens.is_dub = True
+            tokens.audio.append("Dual Audio")
+        elif kind == "dub":
+            tokens.is_dub = True
+        elif kind == "audio":
+            tokens.audio.append(group(kind).upper())
+        elif kind == "batch":
+            tokens.is_batch = True
+        elif kind == "dash":
+            if tokens.episode is None:
+                tokens.episode = int(group("dash_ep"))
+                if group("dash_end"):
+                    tokens.episode_end = int(group("dash_end"))
+            if group("dash_version"):
+                tokens.version = int(group("dash_version"))
+        elif kind == "range":
+            first, last = int(group("range_start")), int(group("range_end"))
+            # In "Steins;Gate 0 - 05" or "Mob Psycho 100 - 03" the number ends the
+            # series name and " - NN" is the episode: after title text a spaced
+            # hyphen is read as the dash form. Episode ranges also go upwards.
+            after_title = not nested and tokens.first_meta is None and text[:match.start()].strip()
+            if first < last and tokens.episode is None and not (after_title and _SPACED_DASH_RE.fullmatch(group("range_sep"))):
+                tokens.episode, tokens.episode_end = first, last
+            else:
+                # Scan on from just after the first number, where the dash form can match
+                pos = match.end("range_start")
+                meta = False
+        elif kind == "bare":
+            if tokens.episode is None:
+                tokens.episode = int(group("bare_ep"))
+            tokens.version = int(group("bare_version"))
+        elif kind == "ep":
+            if tokens.episode is None:
+                tokens.episode = int(group("ep_num"))
+            if group("ep_version"):
+                tokens.version = int(group("ep_version"))
+        elif kind == "version":
+            tokens.version = int(group("version_num"))
+        # The series title runs up to the first top-level token
+        if meta and not nested and tokens.first_meta is None:
+            tokens.first_meta = offset + match.start()
+
+
+@lru_cache(maxsize=RELEASE_TITLE_CACHE_SIZE)
+def parse_release_title(raw_title: str) -> ReleaseInfo:
+    """Split an anime release name into its parts in one scan over the title.
+
+    ``"[SubsPlease] Sousou no Frieren - 05 (1080p) [0A1B2C3D].mkv"`` gives group
+    ``SubsPlease``, title ``Sousou no Frieren``, episode 5 and resolution
+    ``1080p``. Results are memoised because the same names come back in every
+    search.
+    """
+    text = _EXTENSION_RE.sub("", raw_title.strip())
+    group = None
+    body_start = 0
+    if text.startswith("["):
+        end = text.find("]")
+        if end > 0:
+            group = text[1:end].strip() or None
+            body_start = end + 1
+
+    tokens = _Tokens()
+    body = text[body_start:]
+    _scan(body, tokens, 0, False)
+
+    if group is None:
+        scene = _SCENE_GROUP_RE.search(body)
+        if scene and " " not in scene.group(1):
+            group = scene.group(1)
+
+    title_end = tokens.first_meta if tokens.first_meta is not None else len(body)
+    title = body[:title_end]
+    if " " not in title.strip():
+        title = title.replace(".", " ").replace("_", " ")
+    title = " ".join(title.split()).strip(_TITLE_TRIM)
+
+    is_batch = tokens.is_batch or tokens.episode_end is not None or (tokens.season is not None and tokens.episode is None)
+    return ReleaseInfo(
+        group=group,
+        title=title,
+        season=tokens.season,
+        episode=tokens.episode,
+        episode_end=tokens.episode_end,
+        resolution=tokens.resolution,
+        codec=tokens.codec,
+        audio=tuple(dict.fromkeys(tokens.audio)),
+        version=tokens.version,
+        is_batch=is_batch,
+        is_dub=tokens.is_dub,
+    )
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Hashable, Iterable, List, MutableMapping, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+RESULT_TTL = 3600
+RESULT_MAX_ITEMS = 2000
+RESULT_MAX_VIEWS = 500
+
+
+class PageCursor:
+    """A list prepared once for paging: presorted rows of ``(label, callback_data)``.
+
+    Turning a page is a slice of ``rows``; nothing is re-sorted or re-labelled.
+    """
+
+    __slots__ = ("rows", "page_size")
+
+    def __init__(self, rows: Iterable[Tuple[str, str]], page_size: int) -> None:
+        self.rows: Tuple[Tuple[str, str], ...] = tuple(rows)
+        self.page_size = page_size
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def page_count(self) -> int:
+        return max(1, -(-len(self.rows) // self.page_size))
+
+    def page(self, page: int) -> Tuple[int, Sequence[Tuple[str, str]]]:
+        """Clamp ``page`` into range and return it with its rows."""
+        page = min(max(0, page), self.page_count - 1)
+        start = page * self.page_size
+        return page, self.rows[start:start + self.page_size]
+
+
+class ResultStore(Generic[T]):
+    """Per-chat result table: every item is stored once under a small integer id.
+
+    Views (a release group, a quality, a page list...) are kept as tuples of
+    ids under ``(kind, token)``. Items and views expire after ``ttl`` seconds
+    without use; past ``max_items``/``max_views`` the least recently used are
+    dropped first. Ids whose item is gone are skipped when a view is read.
+    Paged lists are kept as ``PageCursor`` objects with the same expiry.
+    """
+
+    def __init__(self, ttl: float = RESULT_TTL, max_items: int = RESULT_MAX_ITEMS, max_views: int = RESULT_MAX_VIEWS) -> None:
+        self.ttl = ttl
+        self.max_items = max_items
+        self.max_views = max_views
+        self._next_id = 1
+        # id -> (last_used, key, item), least recently used first
+        self._items: "OrderedDict[int, Tuple[float, Hashable, T]]" = OrderedDict()
+        self._ids_by_key: Dict[Hashable, int] = {}
+        # (kind, token) -> (last_used, ids or PageCursor)
+        self._views: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, key: Hashable, item: T) -> int:
+        """Store ``item`` under its dedupe ``key`` and return its id."""
+        now = time.monotonic()
+        item_id = self._ids_by_key.get(key)
+        if item_id is None or item_id not in self._items:
+            item_id = self._next_id
+            self._next_id += 1
+            self._ids_by_key[key] = item_id
+        self._items[item_id] = (now, key, item)
+        self._items.move_to_end(item_id)
+        self.prune(now)
+        return item_id
+
+    def add_all(self, keyed_items: Iterable[Tuple[Hashable, T]]) -> List[int]:
+        return [self.add(key, item) for key, item in keyed_items]
+
+    def get(self, item_id: int) -> Optional[T]:
+        entry = self._items.get(item_id)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now - entry[0] > self.ttl:
+            self._drop_item(item_id)
+            return None
+        self._items[item_id] = (now, entry[1], entry[2])
+        self._items.move_to_end(item_id)
+        return entry[2]
+
+    def put_view(self, kind: str, token: str, ids: Iterable[int]) -> str:
+        return self._put_view((kind, token), tuple(ids))
+
+    def view_ids(self, kind: str, token: str) -> Optional[Tuple[int, ...]]:
+        """Ids of a live view, or None once it has expired."""
+        ids = self._touch_view((kind, token))
+        if ids is None:
+            return None
+        return tuple(item_id for item_id in ids if item_id in self._items)
+
+    def put_cursor(self, token: str, cursor: PageCursor) -> str:
+        return self._put_view(("cursor", token), cursor)
+
+    def cursor(self, token: str) -> Optional[PageCursor]:
+        """A live cursor, or None once it has expired."""
+        return self._touch_view(("cursor", token))
+
+    def view(self, kind: str, token: str) -> Optional[List[T]]:
+        ids = self.view_ids(kind, token)
+        if ids is None:
+            return None
+        return [item for item in (self.get(item_id) for item_id in ids) if item is not None]
+
+    def prune(self, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        while self._items:
+            item_id, (last_used, _, _) = next(iter(self._items.items()))
+            if len(self._items) <= self.max_items and now - last_used <= self.ttl:
+                break
+            self._drop_item(item_id)
+        while self._views:
+            view_key, (last_used, _) = next(iter(self._views.items()))
+            if len(self._views) <= self.max_views and now - last_used <= self.ttl:
+                break
+            del self._views[view_key]
+
+    def _put_view(self, view_key: Tuple[str, str], payload: Any) -> str:
+        now = time.monotonic()
+        self._views[view_key] = (now, payload)
+        self._views.move_to_end(view_key)
+        self.prune(now)
+        return view_key[1]
+
+    def _touch_view(self, view_key: Tuple[str, str]) -> Any:
+        entry = self._views.get(view_key)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now - entry[0] > self.ttl:
+            del self._views[view_key]
+            return None
+        self._views[view_key] = (now, entry[1])
+        self._views.move_to_end(view_key)
+        return entry[1]
+
+    def _drop_item(self, item_id: int) -> None:
+        _, key, _ = self._items.pop(item_id)
+        if self._ids_by_key.get(key) == item_id:
+            del self._ids_by_key[key]
+
+
+def get_result_store(chat_data: MutableMapping[str, Any], name: str = "nyaa_results") -> ResultStore:
+    """The chat's result store, created on first use."""
+    store = chat_data.get(name)
+    if not isinstance(store, ResultStore):
+        store = chat_data[name] = ResultStore()
+    return store
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, List, NamedTuple, Sequence, Tuple
+
+from utils.uploads import FileSlice
+
+HASH_CHUNK = 1024 * 1024
+
+
+class Part(NamedTuple):
+    number: int  # 1-based
+    offset: int
+    length: int
+    name: str  # "<file>.001", the numbering `cat`/`copy /b` and 7-Zip join in order
+
+
+def split_parts(file_name: str, size: int, part_size: int) -> List[Part]:
+    """Cut ``size`` bytes into consecutive ranges of at most ``part_size``."""
+    count = max(1, -(-size // part_size))
+    digits = max(3, len(str(count)))
+    return [
+        Part(n, offset, min(part_size, size - offset), f"{file_name}.{n:0{digits}d}")
+        for n, offset in enumerate(range(0, max(size, 1), part_size), 1)
+    ]
+
+
+def open_part(path: str | Path, part: Part, hashers: Sequence[Any] = ()) -> FileSlice:
+    """A stream over the part, read in place from the original file; nothing is copied to disk."""
+    return FileSlice(path, part.offset, part.length, hashers)
+
+
+def hash_part(path: str | Path, part: Part, hashers: Sequence[Any]) -> Tuple[Any, ...]:
+    """Run the part through ``hashers`` when its upload did not stream it in one pass."""
+    with open_part(path, part, hashers) as source:
+        while source.read(HASH_CHUNK):
+            pass
+        return source.hashers
@@ -33,6 +33,29 @@ def normalize_query(raw: str) -> str:
     return " ".join(filtered)
 
 
+_BYTE_UNITS = ("B", "KiB", "MiB", "GiB", "TiB")
+
+
+def format_bytes(num: float, postfix: str = "") -> str:
+    """``1048576`` -> ``"1.00 MiB"`` (binary units, two decimals)."""
+    for unit in _BYTE_UNITS[:-1]:
+        if abs(num) < 1024:
+            return f"{num:.2f} {unit}{postfix}"
+        num /= 1024
+    return f"{num:.2f} {_BYTE_UNITS[-1]}{postfix}"
+
+
+def format_duration(seconds: int) -> str:
+    """``3725`` -> ``"1h2m5s"``; leading zero units are dropped."""
+    days, rest = divmod(int(seconds), 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes, secs = divmod(rest, 60)
+    parts = [(days, "d"), (hours, "h"), (minutes, "m"), (secs, "s")]
+    while len(parts) > 1 and parts[0][0] == 0:
+        parts.pop(0)
+    return "".join(f"{value}{unit}" for value, unit in parts)
+
+
 def escape_html(text: Optional[str]) -> str:
     if not text:
         return ""
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Sequence, TypeVar
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+from utils.text import format_bytes, format_duration
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Timeout for one attempt: a fixed allowance plus the file at the slowest rate we still accept
+UPLOAD_BASE_TIMEOUT = 60.0
+UPLOAD_MIN_RATE = 512 * 1024  # bytes/s
+UPLOAD_RETRY_DELAY = 5.0  # doubled after every failed attempt
+UPLOAD_HISTORY = 200
+
+
+def upload_timeout(size: int) -> float:
+    return UPLOAD_BASE_TIMEOUT + size / UPLOAD_MIN_RATE
+
+
+class FileSlice(io.RawIOBase):
+    """Read-only stream over ``length`` bytes at ``offset`` of a file.
+
+    httpx reads it chunk by chunk while sending, so the file never sits in
+    memory whole. Positions are relative to ``offset``, which is what httpx's
+    seek/tell sizing of the multipart body expects. Time spent in reads is
+    summed in ``read_time``.
+
+    ``hashers`` (hashlib objects) are fed the bytes as they stream past;
+    seeking back to the start restores them, so ``hashed`` is true only once
+    the whole slice went through them in order.
+    """
+
+    def __init__(self, path: str | os.PathLike, offset: int = 0, length: Optional[int] = None, hashers: Sequence[Any] = ()) -> None:
+        super().__init__()
+        self._file = open(path, "rb")
+        self.offset = offset
+        self.length = os.fstat(self._file.fileno()).st_size - offset if length is None else length
+        self._pos = 0
+        self._file.seek(offset)
+        self.read_time = 0.0
+        self._hash_start = tuple(h.copy() for h in hashers)
+        self.hashers = tuple(hashers)
+        self._hashed = 0
+
+    @property
+    def hashed(self) -> bool:
+        return self._hashed == self.length
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, pos: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            pos += self._pos
+        elif whence == os.SEEK_END:
+            pos += self.length
+        self._pos = min(max(0, pos), self.length)
+        self._file.seek(self.offset + self._pos)
+        if self._pos == 0 and self._hashed:
+            self.hashers = tuple(h.copy() for h in self._hash_start)
+            self._hashed = 0
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self.length - self._pos)
+        if size <= 0:
+            return 0
+        started = time.perf_counter()
+        view = memoryview(buffer)[:size]
+        got = self._file.readinto(view) or 0
+        self.read_time += time.perf_counter() - started
+        if self.hashers and self._hashed == self._pos:
+            for hasher in self.hashers:
+                hasher.update(view[:got])
+            self._hashed += got
+        self._pos += got
+        return got
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
+
+
+def _body_sent(payload: Any) -> bool:
+    """Whether a request that timed out got its whole body out: a ``FileSlice`` read to the end, or no stream at all."""
+    if isinstance(payload, FileSlice):
+        return payload.tell() >= payload.length
+    return True
+
+
+class UploadStats(NamedTuple):
+    """Where one upload's time went.
+
+    ``disk`` is opening and reading the file as the request streams it, ``cpu``
+    the process CPU time used while sending (request encoding, TLS) and
+    ``network`` the rest of the send. CPU time is process-wide, so it is
+    approximate while uploads overlap.
+    """
+
+    name: str
+    size: int
+    attempts: int
+    disk: float
+    cpu: float
+    network: float
+
+    @property
+    def elapsed(self) -> float:
+        return self.disk + self.cpu + self.network
+
+    @property
+    def bottleneck(self) -> str:
+        return max(("disk", self.disk), ("cpu", self.cpu), ("network", self.network), key=lambda p: p[1])[0]
+
+    def __str__(self) -> str:
+        rate = format_bytes(self.size / self.elapsed, "/s") if self.elapsed else "n/a"
+        return (
+            f"{self.name} ({format_bytes(self.size)}) in {format_duration(self.elapsed)} at {rate}, "
+            f"attempts {self.attempts}: disk {self.disk:.1f}s, cpu {self.cpu:.1f}s, "
+            f"network {self.network:.1f}s ({self.bottleneck}-bound)"
+        )
+
+
+class UploadScheduler:
+    """Runs Telegram uploads with at most ``max_active`` in flight across all chats.
+
+    Uploads to one chat start in the order they were submitted. A failed
+    attempt is retried with doubling delays, except for ``BadRequest``
+    (Telegram refused the file, retrying will not help) and a timeout after
+    the whole file went out (Telegram may have it already, and a retry would
+    post it twice); the slot is given up while waiting so other chats can go
+    ahead.
+    """
+
+    def __init__(self, max_active: int, retries: int) -> None:
+        self.retries = retries
+        self._slots = asyncio.Semaphore(max_active)
+        self._chats: Dict[int, List[Any]] = {}  # chat_id -> [lock, users]
+        self.history: Deque[UploadStats] = deque(maxlen=UPLOAD_HISTORY)
+        self.failures = 0
+
+    async def upload(
+        self,
+        chat_id: int,
+        name: str,
+        size: int,
+        send: Callable[[Any, float], Awaitable[T]],
+        read: Optional[Callable[[], Any]] = None,
+    ) -> T:
+        """``send(payload, timeout)`` in this chat's turn.
+
+        ``read`` (run in a thread) makes a fresh payload for every attempt,
+        typically a ``FileSlice``; it is closed when the attempt ends and its
+        ``read_time`` is counted as disk time.
+        """
+        entry = self._chats.setdefault(chat_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                return await self._attempts(name, size, send, read)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[chat_id]
+
+    async def _attempts(self, name: str, size: int, send: Callable[[Any, float], Awaitable[T]], read: Optional[Callable[[], Any]]) -> T:
+        timeout = upload_timeout(size)
+        attempt = 0
+        while True:
+            attempt += 1
+            payload = None
+            try:
+                async with self._slots:
+                    started = time.perf_counter()
+                    payload = await asyncio.to_thread(read) if read else None
+                    opened = time.perf_counter() - started
+                    try:
+                        started, cpu_started = time.perf_counter(), time.process_time()
+                        result = await send(payload, timeout)
+                        elapsed = time.perf_counter() - started
+                        cpu = time.process_time() - cpu_started
+                    finally:
+                        if hasattr(payload, "close"):
+                            payload.close()
+                    read_time = getattr(payload, "read_time", 0.0)
+                    disk = opened + read_time
+                    network = max(0.0, elapsed - read_time - cpu)
+            except BadRequest:
+                self.failures += 1
+                raise
+            except TimedOut as e:
+                if _body_sent(payload):
+                    self.failures += 1
+                    logger.warning("Upload of %s timed out after it was sent (%s), not retrying: it may still arrive", name, e)
+                    raise
+                if attempt > self.retries:
+                    self.failures += 1
+                    raise
+                delay = UPLOAD_RETRY_DELAY * 2 ** (attempt - 1)
+                logger.warning("Upload of %s timed out while sending, retry %d/%d in %.0fs", name, attempt, self.retries, delay)
+                await asyncio.sleep(delay)
+                continue
+            except (NetworkError, RetryAfter, OSError) as e:
+                if attempt > self.retries:
+                    self.failures += 1
+                    raise
+                delay = e.retry_after if isinstance(e, RetryAfter) else UPLOAD_RETRY_DELAY * 2 ** (attempt - 1)
+                delay = delay.total_seconds() if hasattr(delay, "total_seconds") else float(delay)
+                logger.warning("Upload of %s failed (%s), retry %d/%d in %.0fs", name, e, attempt, self.retries, delay)
+                await asyncio.sleep(delay)
+                continue
+
+            stats = UploadStats(name, size, attempt, disk, cpu, network)
+            self.history.append(stats)
+            logger.info("Uploaded %s", stats)
+            return result
+
+    def stats(self) -> dict:
+        """Totals over the recent uploads, with each phase's share of the time."""
+        done = list(self.history)
+        total = sum(s.elapsed for s in done) or 1.0
+        return {
+            "uploads": len(done),
+            "failures": self.failures,
+            "bytes": sum(s.size for s in done),
+            "retries": sum(s.attempts - 1 for s in done),
+            "disk_share": round(sum(s.disk for s in done) / total, 3),
+            "cpu_share": round(sum(s.cpu for s in done) / total, 3),
+            "network_share": round(sum(s.network for s in done) / total, 3),
+        }